@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Load test offline cho các handler: /vouch -> bấm sao -> gửi feedback.
+
+Gọi thẳng ``vouch``, ``StarButton.callback`` và ``FeedbackModal.on_submit``
+với Interaction/Member/TextChannel giả. Mỗi lời gọi REST giả có độ trễ cấu
+hình được, và một tỉ lệ bị 429 (chờ ``retry_after`` rồi thử lại như HTTP
+client của discord.py). Không cần mạng; database là file tạm.
+
+Chạy: python bench_load.py [--buyers 2000] [--concurrency 500] [--latency 0.05] [--jitter 0.02] [--rate-429 0.02]
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import logging
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+
+class Stats:
+    """Counters shared by every fake object of one run"""
+
+    def __init__(self):
+        self.rest_calls = 0
+        self.rate_limited = 0
+        self.acks: Dict[str, List[float]] = {}
+        self.interactions = 0
+
+
+class FakeREST:
+    """Simulated Discord REST latency with occasional 429s"""
+
+    def __init__(self, stats: Stats, latency: float, jitter: float, rate_429: float, retry_after: float):
+        self.stats = stats
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+
+    async def call(self) -> None:
+        self.stats.rest_calls += 1
+        # 429: discord.py tự chờ retry_after rồi gửi lại, handler chỉ thấy độ trễ tăng
+        while random.random() < self.rate_429:
+            self.stats.rate_limited += 1
+            await asyncio.sleep(self.retry_after)
+        await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+
+class FakeAsset:
+    def __init__(self, url: str):
+        self.url = url
+
+
+class FakeMessage:
+    _next_id = 10_000_000
+
+    def __init__(self, rest: FakeREST):
+        FakeMessage._next_id += 1
+        self.id = FakeMessage._next_id
+        self.rest = rest
+
+    async def edit(self, **kwargs) -> "FakeMessage":
+        await self.rest.call()
+        return self
+
+
+class FakeMember:
+    def __init__(self, rest: FakeREST, user_id: int, bot: bool = False):
+        self.rest = rest
+        self.id = user_id
+        self.bot = bot
+        self.mention = f"<@{user_id}>"
+        self.display_avatar = FakeAsset(f"https://cdn.discordapp.com/embed/avatars/{user_id % 5}.png")
+
+    async def send(self, content: str = None, **kwargs) -> FakeMessage:
+        await self.rest.call()
+        return FakeMessage(self.rest)
+
+
+class FakeTextChannel:
+    def __init__(self, rest: FakeREST, channel_id: int):
+        self.rest = rest
+        self.id = channel_id
+        self.mention = f"<#{channel_id}>"
+
+    async def send(self, content: str = None, **kwargs) -> FakeMessage:
+        await self.rest.call()
+        return FakeMessage(self.rest)
+
+    def get_partial_message(self, message_id: int) -> FakeMessage:
+        return FakeMessage(self.rest)
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int, channel: FakeTextChannel):
+        self.id = guild_id
+        self.icon = None
+        self.channel = channel
+
+    def get_channel(self, channel_id: int) -> Optional[FakeTextChannel]:
+        return self.channel if channel_id == self.channel.id else None
+
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self.interaction = interaction
+        self._done = False
+        self.modal = None
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def _respond(self) -> None:
+        if self._done:
+            raise RuntimeError("interaction already acknowledged")
+        self._done = True
+        await self.interaction.rest.call()
+        self.interaction.record_ack()
+
+    async def send_message(self, content: str = None, **kwargs) -> None:
+        await self._respond()
+
+    async def send_modal(self, modal) -> None:
+        self.modal = modal
+        await self._respond()
+
+    async def defer(self, **kwargs) -> None:
+        await self._respond()
+
+
+class FakeFollowup:
+    def __init__(self, rest: FakeREST):
+        self.rest = rest
+
+    async def send(self, content: str = None, **kwargs) -> FakeMessage:
+        await self.rest.call()
+        return FakeMessage(self.rest)
+
+
+class FakeInteraction:
+    """Just enough of discord.Interaction for VouchBot's handlers"""
+
+    def __init__(self, kind: str, rest: FakeREST, stats: Stats, guild: FakeGuild, user: FakeMember):
+        self.kind = kind
+        self.rest = rest
+        self.stats = stats
+        self.guild = guild
+        self.guild_id = guild.id
+        self.channel = guild.channel
+        self.channel_id = guild.channel.id
+        self.user = user
+        self.message = None
+        self.created_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(rest)
+        self._original: Optional[FakeMessage] = None
+        stats.interactions += 1
+
+    def record_ack(self) -> None:
+        self.stats.acks.setdefault(self.kind, []).append(time.perf_counter() - self.started)
+
+    async def original_response(self) -> FakeMessage:
+        if self._original is None:
+            await self.rest.call()
+            self._original = FakeMessage(self.rest)
+        return self._original
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] if ordered else 0.0
+
+
+async def run_load(buyers: int, concurrency: int, latency: float, jitter: float, rate_429: float, retry_after: float) -> dict:
+    """Drive ``buyers`` full vouch -> star -> feedback flows, at most ``concurrency`` at a time"""
+    import vouch_bot1
+    from bench_memory import rss_bytes
+
+    stats = Stats()
+    rest = FakeREST(stats, latency, jitter, rate_429, retry_after)
+    channel = FakeTextChannel(rest, 2)
+    guild = FakeGuild(1, channel)
+    staff = FakeMember(rest, 99)
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def buyer_flow(index: int) -> None:
+        nonlocal failures
+        buyer = FakeMember(rest, 100_000 + index)
+        async with semaphore:
+            await vouch_bot1.vouch.callback(FakeInteraction("vouch", rest, stats, guild, staff), buyer, 1, "Nitro 1 tháng", "50k")
+            vouch_id = ids.get(buyer.id)
+            if vouch_id is None:
+                failures += 1
+                return
+            star = FakeInteraction("star_button", rest, stats, guild, buyer)
+            await vouch_bot1.StarButton(vouch_id, 5).callback(star)
+            modal = star.response.modal
+            if modal is None:
+                failures += 1
+                return
+            modal.feedback._value = "Shop uy tín, giao hàng nhanh"
+            await modal.on_submit(FakeInteraction("feedback_modal", rest, stats, guild, buyer))
+
+    # vouch_store.add trả id; ghi lại theo buyer để bước bấm sao dùng đúng custom_id
+    ids: Dict[int, int] = {}
+    original_add = vouch_bot1.vouch_store.add
+
+    def add(guild_id, buyer_id, *args, **kwargs):
+        vouch_id = original_add(guild_id, buyer_id, *args, **kwargs)
+        ids[buyer_id] = vouch_id
+        return vouch_id
+
+    vouch_bot1.vouch_store.add = add
+    # Mỗi lần chạy là một loạt vouch mới, không bị coi là gửi trùng với lần trước
+    vouch_bot1.recent_vouches.clear()
+    original_partial = vouch_bot1.bot.get_partial_messageable
+    vouch_bot1.bot.get_partial_messageable = lambda channel_id, **kwargs: channel
+    vouch_bot1.dm_dispatcher.start()
+
+    tracemalloc.start()
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(buyer_flow(index) for index in range(buyers)))
+        # Chờ các tác vụ nền (post feedback, sửa tin nhắn gốc) và hàng đợi DM
+        while vouch_bot1.background_tasks:
+            await asyncio.wait(set(vouch_bot1.background_tasks))
+        handlers_done = time.perf_counter() - started
+        await vouch_bot1.dm_dispatcher.stop(timeout=60)
+        elapsed = time.perf_counter() - started
+    finally:
+        vouch_bot1.vouch_store.add = original_add
+        vouch_bot1.bot.get_partial_messageable = original_partial
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = rss_bytes()
+
+    return {
+        "buyers": buyers,
+        "interactions": stats.interactions,
+        "failures": failures,
+        "handlers_seconds": handlers_done,
+        "elapsed": elapsed,
+        "interactions_per_second": stats.interactions / handlers_done if handlers_done else 0.0,
+        "ack": {
+            kind: {q: percentile(values, q) for q in (0.5, 0.95, 0.99)}
+            for kind, values in stats.acks.items()
+        },
+        "acked": sum(len(values) for values in stats.acks.values()),
+        "rest_calls": stats.rest_calls,
+        "rate_limited": stats.rate_limited,
+        "dm": vouch_bot1.dm_dispatcher.stats(),
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "rss_growth_bytes": rss_after - rss_before,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline load test for the VouchBot interaction handlers")
+    parser.add_argument("--buyers", type=int, default=2000, help="simulated buyers (3 interactions each)")
+    parser.add_argument("--concurrency", type=int, default=500, help="buyers in flight at once")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean REST latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="REST latency standard deviation")
+    parser.add_argument("--rate-429", type=float, default=0.02, help="probability that a REST call is rate-limited")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="retry_after of simulated 429s")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="vouchbot-load-")
+    # Cấu hình phải có trước khi import vouch_bot1
+    os.environ["DATABASE_FILE"] = os.path.join(tmp_dir, "load.db")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("LOG_FILE", os.path.join(tmp_dir, "bot.log"))
+    os.environ["DM_QUEUE_SIZE"] = str(max(1000, args.buyers * 2))
+    logging.getLogger("discord").setLevel(logging.ERROR)
+
+    result = asyncio.run(run_load(args.buyers, args.concurrency, args.latency, args.jitter, args.rate_429, args.retry_after))
+
+    print(f"📊 Load test: {result['buyers']} buyer, {args.concurrency} song song, REST {args.latency * 1000:.0f}±{args.jitter * 1000:.0f}ms, 429 {args.rate_429:.0%}")
+    print(f"   - Interactions: {result['interactions']} ({result['acked']} đã ack, {result['failures']} luồng lỗi) trong {result['handlers_seconds']:.2f}s")
+    print(f"   - Throughput:   {result['interactions_per_second']:,.0f} interactions/s")
+    for kind, quantiles in result["ack"].items():
+        print(f"   - Ack {kind:<15} p50 {quantiles[0.5] * 1000:6.0f}ms  p95 {quantiles[0.95] * 1000:6.0f}ms  p99 {quantiles[0.99] * 1000:6.0f}ms")
+    print(f"   - REST calls:   {result['rest_calls']} ({result['rate_limited']} lần 429)")
+    print(f"   - DM:           {result['dm']['delivered']} gửi, {result['dm']['failed']} lỗi, chờ tối đa {result['dm']['max_queue_seconds']:.2f}s (xong sau {result['elapsed']:.2f}s)")
+    print(f"   - Bộ nhớ:       Python còn giữ {result['traced_bytes'] / 2**20:.1f}MB (đỉnh {result['traced_peak_bytes'] / 2**20:.1f}MB), RSS tăng {result['rss_growth_bytes'] / 2**20:.1f}MB")
+    return 0 if result["failures"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Đo RSS của bot theo số guild/member giả lập, cho từng MEMORY_PROFILE.
+
+Mỗi cấu hình chạy trong một process riêng: dựng bot với các option của
+profile, nạp payload GUILD_CREATE giả (channel, role, member) và các
+MESSAGE_CREATE mà gateway sẽ gửi với intents của profile, rồi đọc RSS.
+
+Chạy: python bench_memory.py [--guilds 100,1000] [--members 50,500] [--messages 20]
+"""
+
+import gc
+import os
+import sys
+import json
+import asyncio
+import argparse
+import logging
+import resource
+import subprocess
+
+
+def rss_bytes() -> int:
+    """Current resident set size (falls back to peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def guild_payload(guild_id: int, members: int, channels: int = 5) -> dict:
+    user_base = guild_id * 1_000_000
+    return {
+        "id": str(guild_id),
+        "name": f"Guild {guild_id}",
+        "member_count": members,
+        "large": members > 250,
+        "roles": [{"id": str(guild_id), "name": "@everyone", "permissions": "0", "position": 0,
+                   "color": 0, "hoist": False, "managed": False, "mentionable": False}],
+        "channels": [
+            {"id": str(guild_id * 100 + index), "name": f"channel-{index}", "type": 0, "position": index}
+            for index in range(channels)
+        ],
+        "members": [
+            {"user": {"id": str(user_base + index), "username": f"user{index}", "discriminator": "0",
+                      "avatar": None, "global_name": None},
+             "roles": [], "joined_at": None, "deaf": False, "mute": False, "flags": 0}
+            for index in range(members)
+        ],
+        "voice_states": [],
+        "emojis": [],
+        "stickers": [],
+        "features": [],
+    }
+
+
+def message_payload(guild_id: int, message_id: int) -> dict:
+    author = {"id": str(guild_id * 1_000_000), "username": "user0", "discriminator": "0", "avatar": None, "global_name": None}
+    return {
+        "id": str(message_id), "channel_id": str(guild_id * 100), "guild_id": str(guild_id), "author": author,
+        "member": {"roles": [], "joined_at": None, "deaf": False, "mute": False, "flags": 0},
+        "content": "+vouch <@1> x1 Nitro 50k vnd legit", "timestamp": "2024-01-01T00:00:00+00:00",
+        "edited_timestamp": None, "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [],
+        "attachments": [], "embeds": [], "pinned": False, "type": 0, "components": [],
+    }
+
+
+async def run_worker(profile: str, guilds: int, members: int, messages: int) -> dict:
+    """Measure one configuration in this process and return the numbers"""
+    import discord
+    from discord.ext import commands
+    from memory_profile import client_options
+
+    options = client_options(profile)
+    bot = commands.Bot(command_prefix="/", **options)
+    # Gắn event loop như khi login, để state có thể dispatch event
+    await bot._async_setup_hook()
+    state = bot._connection
+    # Không login nên chưa có bot user: on_message cần bot.user để xử lý tin nhắn
+    state.user = discord.ClientUser(state=state, data={
+        "id": "1", "username": "vouchbot", "discriminator": "0", "avatar": None, "global_name": None, "bot": True
+    })
+    gc.collect()
+    baseline = rss_bytes()
+
+    message_id = 1
+    for guild_id in range(1, guilds + 1):
+        state._add_guild_from_data(guild_payload(guild_id, members))
+        # Gateway chỉ gửi MESSAGE_CREATE khi có intent guild_messages
+        if options["intents"].guild_messages:
+            for _ in range(messages):
+                state.parse_message_create(message_payload(guild_id, message_id))
+                message_id += 1
+    # Để các event đã dispatch chạy xong trước khi đo
+    pending = asyncio.all_tasks() - {asyncio.current_task()}
+    if pending:
+        await asyncio.wait(pending)
+    gc.collect()
+    loaded = rss_bytes()
+
+    return {
+        "profile": profile,
+        "guilds": guilds,
+        "members": members,
+        "baseline": baseline,
+        "rss": loaded,
+        "cached_members": sum(len(guild._members) for guild in bot.guilds),
+        "cached_messages": len(state._messages or ()),
+    }
+
+
+def main() -> int:
+    logging.disable(logging.CRITICAL)
+    parser = argparse.ArgumentParser(description="Resident memory per MEMORY_PROFILE against mocked guilds/members")
+    parser.add_argument("--guilds", default="100,1000", help="comma separated guild counts")
+    parser.add_argument("--members", default="50,500", help="comma separated member counts per guild")
+    parser.add_argument("--messages", type=int, default=20, help="messages received per guild")
+    parser.add_argument("--profiles", default="default,low")
+    parser.add_argument("--worker", nargs=4, metavar=("PROFILE", "GUILDS", "MEMBERS", "MESSAGES"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        profile, guilds, members, messages = args.worker
+        print(json.dumps(asyncio.run(run_worker(profile, int(guilds), int(members), int(messages)))))
+        return 0
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    print(f"📊 RSS theo MEMORY_PROFILE ({args.messages} tin nhắn/guild):")
+    print(f"   {'profile':<8} {'guilds':>6} {'members':>8} {'RSS (MB)':>9} {'tăng (MB)':>10} {'KB/guild':>9} {'member cache':>13} {'msg cache':>10}")
+    for guilds in (int(value) for value in args.guilds.split(",")):
+        for members in (int(value) for value in args.members.split(",")):
+            for profile in args.profiles.split(","):
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--worker", profile, str(guilds), str(members), str(args.messages)],
+                    capture_output=True, text=True, check=True, cwd=here
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                grown = result["rss"] - result["baseline"]
+                print(
+                    f"   {profile:<8} {guilds:>6} {members:>8} {result['rss'] / 2**20:>9.1f} {grown / 2**20:>10.1f}"
+                    f" {grown / guilds / 1024:>9.1f} {result['cached_members']:>13} {result['cached_messages']:>10}"
+                )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark chi phí render cho mỗi vouch: f-string + embed dựng lại mỗi lần
+(kiểu cũ) so với template đã biên dịch theo guild trong templates.py.
+
+Chạy: python bench_templates.py [số lần lặp]
+"""
+
+import sys
+import timeit
+
+import discord
+
+from templates import TemplateCache
+
+BUYER = "<@123456789012345678>"
+CHANNEL = "<#223456789012345678>"
+AVATAR = "https://cdn.discordapp.com/embed/avatars/0.png"
+GUILD_CFG = {"thankyou": "Cảm ơn bạn đã mua hàng tại shop"}
+
+
+# --- Bản sao cách dựng tin nhắn trước khi có templates.py ---
+def legacy_vouch_text(guild_cfg, buyer, quantity, product, price):
+    thankyou = guild_cfg.get("thankyou", "Cảm ơn")
+    return (
+        f"<:giveaway1:1388824182237958155> **Giao dịch thành công!**\n\n"
+        f"{thankyou} {buyer}\n\n"
+        f"<:Shop1:1388824257748013181>**LewLewStore** xin bạn một ít phút để đánh giá dịch vụ tại đây nhé !!! chúng mình luôn muốn lắng nghe góp ý của các bạn và cải thiện dịch vụ tại **LewLewStore**\n\n"
+        f"```+vouch {buyer} x{quantity} {product} {price} vnd legit```\n"
+        f"- Mình xin chút ít thời gian của bạn để ủng hộ mình 1 vouch bằng cách sao chép nội dung ở trên và dán ở <#1294909151515774999> hoặc 1 feedback bằng nút bên dưới (có thể cả vừa vouch và feeddback nếu bạn muốn)"
+    )
+
+
+def legacy_dm_text(product, channel):
+    return (
+        f"<:giveaway1:1388824182237958155>Đơn hàng **{product}** của bạn đã hoàn thành\n\n"
+        f"Bạn hãy vào {channel} để xác nhận đơn hàng và dành chút ít thời gian để đánh giá, góp ý dịch vụ bên mình bạn nhé !!!"
+    )
+
+
+def legacy_feedback_embed(product, feedback, stars, avatar_url, server_icon):
+    embed = discord.Embed(title=f"Đã mua: {product}", description=f"> • {feedback}", color=0xfc44c2)
+    embed.set_author(name="Cảm ơn quý khách đã ủng hộ !!!", icon_url=avatar_url)
+    embed.set_thumbnail(url=avatar_url)
+    embed.add_field(name="Đánh giá", value="<a:TwinklingStar:1388826311346356226>" * stars, inline=False)
+    embed.set_footer(text="LewLewStore • discord.gg/lewlewstore", icon_url=server_icon)
+    return embed
+
+
+def per_call_us(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1_000_000
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    cache = TemplateCache(lambda guild_id: GUILD_CFG)
+    compiled = cache.get(1)
+
+    # Kết quả phải giống hệt cách cũ
+    assert compiled.vouch.render(buyer=BUYER, quantity=1, product="Nitro", price="50k") == legacy_vouch_text(GUILD_CFG, BUYER, 1, "Nitro", "50k")
+    assert compiled.dm.render(product="Nitro", channel=CHANNEL) == legacy_dm_text("Nitro", CHANNEL)
+    assert compiled.feedback_embed("Nitro", "ok", 5, AVATAR, None).to_dict() == legacy_feedback_embed("Nitro", "ok", 5, AVATAR, None).to_dict()
+
+    rows = [
+        ("vouch_text",
+         lambda: legacy_vouch_text(GUILD_CFG, BUYER, 1, "Nitro 1 tháng", "50k"),
+         lambda: cache.get(1).vouch.render(buyer=BUYER, quantity=1, product="Nitro 1 tháng", price="50k")),
+        ("dm_text",
+         lambda: legacy_dm_text("Nitro 1 tháng", CHANNEL),
+         lambda: cache.get(1).dm.render(product="Nitro 1 tháng", channel=CHANNEL)),
+        ("feedback embed",
+         lambda: legacy_feedback_embed("Nitro 1 tháng", "Shop uy tín", 5, AVATAR, AVATAR),
+         lambda: cache.get(1).feedback_embed("Nitro 1 tháng", "Shop uy tín", 5, AVATAR, AVATAR)),
+    ]
+
+    print(f"📊 Chi phí render mỗi vouch ({number} lần lặp, lấy lần nhanh nhất trong 5):")
+    for name, legacy, templated in rows:
+        before = per_call_us(legacy, number)
+        after = per_call_us(templated, number)
+        print(f"   - {name:<15} cũ {before:6.2f}µs   template {after:6.2f}µs")
+    compile_us = per_call_us(lambda: (cache.invalidate(1), cache.get(1)), number // 10)
+    print(f"   - biên dịch lại template của một guild (sau invalidate): {compile_us:.2f}µs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark bộ nhớ cho mỗi vouch đang chờ đánh giá: VouchView kiểu cũ
+(một object graph sống mãi cho mỗi vouch) so với dispatcher dynamic + VouchStore.
+
+Chạy: python bench_vouch_memory.py [số vouch]
+"""
+
+import os
+import sys
+import gc
+import asyncio
+import logging
+import tempfile
+import tracemalloc
+
+logging.disable(logging.CRITICAL)
+
+import discord
+from discord.ext import commands
+from discord.ui.view import ViewStore
+
+
+# --- Bản sao VouchView trước khi có dispatcher dynamic ---
+class LegacyStarButton(discord.ui.Button):
+    def __init__(self, stars: int):
+        super().__init__(label=f"{stars} sao", style=discord.ButtonStyle.primary, custom_id=f"star_{stars}")
+        self.stars = stars
+
+
+class LegacyVouchView(discord.ui.View):
+    def __init__(self, buyer, quantity, product, price, origin_channel):
+        super().__init__(timeout=None)
+        self.buyer = buyer
+        self.quantity = quantity
+        self.product = product
+        self.price = price
+        self.origin_channel = origin_channel
+        self.original_message = None
+        for i in range(1, 6):
+            self.add_item(LegacyStarButton(i))
+
+
+def make_fixtures():
+    """Build a connection state, guild and channel to attach fake members/messages to"""
+    bot = commands.Bot(command_prefix="/", intents=discord.Intents.default())
+    state = bot._connection
+    guild = discord.Guild(data={'id': '1', 'name': 'LewLewStore'}, state=state)
+    channel = discord.TextChannel(state=state, guild=guild, data={'id': '2', 'name': 'vouch', 'type': 0, 'position': 0, 'guild_id': '1'})
+    return state, guild, channel
+
+
+def make_member(state, guild, user_id: int):
+    user = {'id': str(user_id), 'username': f'buyer{user_id}', 'discriminator': '0', 'avatar': None, 'global_name': None}
+    return discord.Member(
+        data={'user': user, 'roles': [], 'joined_at': None, 'deaf': False, 'mute': False, 'flags': 0},
+        guild=guild,
+        state=state
+    )
+
+
+def make_message(state, channel, message_id: int, content: str):
+    author = {'id': '99', 'username': 'VouchBot', 'discriminator': '0', 'avatar': None, 'global_name': None, 'bot': True}
+    return discord.Message(state=state, channel=channel, data={
+        'id': str(message_id), 'channel_id': str(channel.id), 'author': author, 'content': content,
+        'timestamp': '2024-01-01T00:00:00+00:00', 'edited_timestamp': None, 'tts': False,
+        'mention_everyone': False, 'mentions': [], 'mention_roles': [], 'attachments': [],
+        'embeds': [], 'pinned': False, 'type': 0, 'components': []
+    })
+
+
+def measure(build) -> int:
+    """Return the bytes still allocated after ``build()`` runs (its return value is kept alive)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = build()
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del kept
+    return size
+
+
+async def bench(count: int) -> None:
+    import vouch_bot1
+    from storage import VouchStore
+
+    state, guild, channel = make_fixtures()
+    content = "x" * 600  # cỡ tin nhắn vouch thực tế
+
+    def build_legacy():
+        store = ViewStore(state)
+        for i in range(count):
+            view = LegacyVouchView(make_member(state, guild, 1000 + i), 1, "Nitro 1 tháng", "50k", channel)
+            view.original_message = make_message(state, channel, 10_000 + i, content)
+            store.add_view(view, 10_000 + i)
+        return store
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vouch_store = VouchStore(os.path.join(tmp_dir, 'bench.db'))
+
+        def build_dynamic():
+            store = ViewStore(state)
+            for i in range(count):
+                vouch_id = vouch_store.add(1, 1000 + i, 1, "Nitro 1 tháng", "50k", channel.id)
+                store.add_view(vouch_bot1.VouchView(vouch_id), 10_000 + i)
+                vouch_store.set_message(vouch_id, 10_000 + i)
+            return store
+
+        legacy_bytes = measure(build_legacy)
+        dynamic_bytes = measure(build_dynamic)
+
+        record = vouch_store.get(1)
+        record_bytes = sys.getsizeof(record) + sum(
+            sys.getsizeof(getattr(record, name)) for name in record.__slots__
+        )
+        vouch_store._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        page_size, page_count = (
+            vouch_store._conn.execute("PRAGMA page_size").fetchone()[0],
+            vouch_store._conn.execute("PRAGMA page_count").fetchone()[0],
+        )
+        vouch_store.close()
+
+    print(f"📊 Bộ nhớ cho {count} vouch đang chờ đánh giá:")
+    print(f"   - Trước (VouchView + Member + Message sống mãi): {legacy_bytes / count:,.0f} bytes/vouch")
+    print(f"   - Sau (dispatcher dynamic, state trong SQLite):  {dynamic_bytes / count:,.0f} bytes/vouch trong RAM")
+    print(f"   - PendingVouch khi đang xử lý click:             {record_bytes:,} bytes (tạm thời)")
+    print(f"   - SQLite trên đĩa:                               {page_size * page_count / count:,.0f} bytes/vouch")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    asyncio.run(bench(count))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
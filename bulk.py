@@ -0,0 +1,144 @@
+import io
+import csv
+import json
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BULK_COLUMNS = ("buyer", "quantity", "product", "price")
+
+
+class BulkRowError(Exception):
+    """A row that cannot be turned into a vouch (message is shown to staff)"""
+
+
+class BulkRow:
+    """One raw row of a /vouchbulk file"""
+
+    __slots__ = ("line", "buyer", "quantity", "product", "price")
+
+    def __init__(self, line: int, buyer: str, quantity: str, product: str, price: str):
+        self.line = line
+        self.buyer = buyer
+        self.quantity = quantity
+        self.product = product
+        self.price = price
+
+
+def _row_from_mapping(line: int, data: Dict[str, object]) -> BulkRow:
+    values = {key.strip().lower(): value for key, value in data.items() if isinstance(key, str)}
+    return BulkRow(line, *(str(values.get(column) or "").strip() for column in BULK_COLUMNS))
+
+
+def iter_rows(data: bytes, filename: str) -> Iterator[BulkRow]:
+    """Lazily parse a CSV (with header) or JSONL upload into rows.
+
+    Malformed JSON lines are yielded as rows with empty fields so they are
+    reported as errors for that line instead of aborting the whole file.
+    """
+    text = io.StringIO(data.decode("utf-8-sig"))
+    if filename.lower().endswith((".jsonl", ".ndjson")):
+        for line_no, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                item = None
+            yield _row_from_mapping(line_no, item if isinstance(item, dict) else {})
+        return
+
+    reader = csv.DictReader(text)
+    header = [name.strip().lower() for name in reader.fieldnames or []]
+    missing = [column for column in BULK_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f"thiếu cột: {', '.join(missing)}")
+    for row in reader:
+        yield _row_from_mapping(reader.line_num, row)
+
+
+class TokenBucket:
+    """Allow at most ``rate`` operations per ``per`` seconds"""
+
+    def __init__(self, rate: int, per: float):
+        self.rate = rate
+        self.per = per
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.per)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.per / self.rate)
+
+
+class BulkProgress:
+    """Counters shared between the pipeline workers and the progress reporter"""
+
+    def __init__(self):
+        self.parsed = 0
+        self.created = 0
+        self.failed = 0
+        self.errors: List[str] = []
+        self.done = False
+
+    def add_error(self, line: int, message: str) -> None:
+        self.failed += 1
+        # Chỉ giữ vài lỗi đầu để tin nhắn tiến độ không quá dài
+        if len(self.errors) < 10:
+            self.errors.append(f"Dòng {line}: {message}")
+
+
+async def run_pipeline(
+    rows: Iterator[BulkRow],
+    handle: Callable[[BulkRow], Awaitable[None]],
+    progress: BulkProgress,
+    concurrency: int = 3,
+    max_rows: Optional[int] = None,
+) -> BulkProgress:
+    """Feed rows through ``handle`` with at most ``concurrency`` rows in flight"""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def worker():
+        while True:
+            row = await queue.get()
+            try:
+                if row is None:
+                    return
+                await handle(row)
+                progress.created += 1
+            except BulkRowError as e:
+                progress.add_error(row.line, str(e))
+            except Exception as e:
+                logger.error(f"Error creating bulk vouch from line {row.line}: {e}")
+                progress.add_error(row.line, "lỗi khi gửi vouch")
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        for row in rows:
+            if max_rows is not None and progress.parsed >= max_rows:
+                progress.add_error(row.line, f"vượt quá giới hạn {max_rows} dòng, bỏ qua phần còn lại")
+                break
+            progress.parsed += 1
+            # Queue có giới hạn: parser không chạy quá xa so với các worker
+            await queue.put(row)
+            # Nhường event loop giữa các dòng khi file lớn
+            await asyncio.sleep(0)
+    finally:
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers, return_exceptions=True)
+        progress.done = True
+    return progress
@@ -0,0 +1,63 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+
+VouchKey = Tuple[int, int, str, int, str]
+
+
+def vouch_key(guild_id: int, buyer_id: int, product: str, quantity: int, price: str) -> VouchKey:
+    """Dedupe key of a vouch; product and price ignore case and surrounding spaces"""
+    return guild_id, buyer_id, " ".join(product.split()).casefold(), quantity, " ".join(price.split()).casefold()
+
+
+class DedupeIndex:
+    """Remember recently seen keys for ``ttl`` seconds, at most ``max_size`` of them.
+
+    ``claim`` is called before doing the work: the first caller within the
+    window gets None and goes ahead, a repeat gets the time the key was
+    claimed. Entries are kept in claim order, so expiry and eviction of the
+    oldest entry are O(1); when the index is full the oldest claim is
+    dropped early. ``release`` forgets a key whose work failed, so a retry
+    is not reported as a duplicate.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_size: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, float]" = OrderedDict()
+        # Số liệu thống kê
+        self.hits = 0
+        self.evicted = 0
+
+    def _expire(self, now: float) -> None:
+        while self._entries:
+            key, claimed_at = next(iter(self._entries.items()))
+            if now - claimed_at < self.ttl:
+                break
+            del self._entries[key]
+
+    def claim(self, key: Hashable) -> Optional[float]:
+        """None if ``key`` is new (and now claimed), else the monotonic time of the earlier claim"""
+        if self.ttl <= 0:
+            return None
+        now = self.clock()
+        self._expire(now)
+        claimed_at = self._entries.get(key)
+        if claimed_at is not None:
+            self.hits += 1
+            return claimed_at
+        self._entries[key] = now
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+        return None
+
+    def release(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,228 @@
+import time
+import random
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import discord
+
+from logging_setup import SAMPLED
+from metrics import DM_MESSAGES, DM_QUEUE_SECONDS
+from outbound import scheduled
+
+logger = logging.getLogger(__name__)
+
+FailureCallback = Callable[[Exception], Awaitable[None]]
+
+
+class DMJob:
+    """One queued direct message"""
+
+    __slots__ = ("target", "content", "on_failure", "enqueued_at", "attempts")
+
+    def __init__(self, target: discord.abc.Messageable, content: str, on_failure: Optional[FailureCallback]):
+        self.target = target
+        self.content = content
+        self.on_failure = on_failure
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+    @property
+    def route(self) -> int:
+        # Mỗi user có một DM channel riêng, tương ứng một route rate-limit
+        return getattr(self.target, "id", 0)
+
+
+class UserDM:
+    """DM target known only by user id: the DM channel is opened when the message is sent"""
+
+    __slots__ = ("client", "id")
+
+    def __init__(self, client: discord.Client, user_id: int):
+        self.client = client
+        self.id = user_id
+
+    async def send(self, content: str) -> discord.Message:
+        # Đã nằm trong lời gọi "dm" của scheduler: không xếp hàng lần nữa
+        channel = await self.client.create_dm(discord.Object(id=self.id))
+        return await channel.send(content)
+
+
+class DMDispatcher:
+    """Deliver DMs from a bounded queue with a small worker pool.
+
+    Handlers call ``enqueue`` and return immediately. Workers honour the
+    ``retry_after`` of 429 responses per route (and globally when Discord says
+    so), retry transient failures with exponential backoff up to
+    ``max_retries`` and report permanent failures through ``on_failure``.
+    """
+
+    def __init__(self, maxsize: int = 1000, workers: int = 3, max_retries: int = 3, base_delay: float = 1.0):
+        self.maxsize = maxsize
+        self.worker_count = workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._route_until: Dict[int, float] = {}
+        self._global_until = 0.0
+        self._delayed = 0
+        # Số liệu thống kê
+        self.delivered = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+
+    # --- Vòng đời ---
+    def start(self) -> None:
+        """Spawn the workers on the running loop"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"dm-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+        logger.info(f"DM dispatcher started with {self.worker_count} workers")
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Give queued DMs up to ``timeout`` seconds to drain, then cancel the workers"""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        if self.depth:
+            logger.warning(f"DM dispatcher stopped with {self.depth} DM(s) still queued")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    # --- API cho handler ---
+    def enqueue(self, target: discord.abc.Messageable, content: str, on_failure: Optional[FailureCallback] = None) -> bool:
+        """Queue a DM; returns False when the queue is full or not running"""
+        if self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait(DMJob(target, content, on_failure))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"DM queue full, dropped DM to {getattr(target, 'id', '?')}")
+            return False
+
+    @property
+    def depth(self) -> int:
+        return (self._queue.qsize() if self._queue is not None else 0) + self._delayed
+
+    def stats(self) -> dict:
+        attempted = self.delivered + self.failed
+        return {
+            "depth": self.depth,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "avg_queue_seconds": self.queue_time_total / attempted if attempted else 0.0,
+            "max_queue_seconds": self.queue_time_max,
+        }
+
+    # --- Worker ---
+    def _requeue_later(self, job: DMJob, delay: float) -> None:
+        self._delayed += 1
+
+        def put_back():
+            self._delayed -= 1
+            try:
+                self._queue.put_nowait(job)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                logger.warning(f"DM queue full, dropped retry for {job.route}")
+
+        asyncio.get_running_loop().call_later(delay, put_back)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+            except Exception as e:
+                logger.error(f"Unexpected error in DM worker: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job: DMJob) -> None:
+        # Route (hoặc toàn cục) đang bị rate-limit: hẹn lại, không chặn worker
+        now = time.monotonic()
+        wait = max(self._route_until.get(job.route, 0.0), self._global_until) - now
+        if wait > 0:
+            self._requeue_later(job, wait)
+            return
+        self._route_until.pop(job.route, None)
+
+        job.attempts += 1
+        try:
+            await scheduled("dm", job.target.send(job.content))
+        except discord.Forbidden as e:
+            # DM bị tắt: không retry
+            await self._fail(job, e)
+            return
+        except (discord.RateLimited, discord.HTTPException) as e:
+            retry_after = self._retry_after(e)
+            if retry_after is None and isinstance(e, discord.HTTPException) and e.status < 500:
+                await self._fail(job, e)
+                return
+            if job.attempts > self.max_retries:
+                await self._fail(job, e)
+                return
+            if retry_after is None:
+                retry_after = self.base_delay * (2 ** (job.attempts - 1)) * (1 + random.random() * 0.25)
+            self._route_until[job.route] = time.monotonic() + retry_after
+            self.retried += 1
+            logger.warning(f"DM to {job.route} rate-limited/failed, retrying in {retry_after:.1f}s (attempt {job.attempts})")
+            self._requeue_later(job, retry_after)
+            return
+        except Exception as e:
+            await self._fail(job, e)
+            return
+
+        self._record_queue_time(job)
+        self.delivered += 1
+        DM_MESSAGES.inc(status="delivered")
+        logger.info(f"DM sent successfully to {job.route}", extra=SAMPLED)
+
+    def _retry_after(self, error: Exception) -> Optional[float]:
+        """Extract the retry delay from a 429, marking a global limit when flagged"""
+        if isinstance(error, discord.RateLimited):
+            return error.retry_after
+        if isinstance(error, discord.HTTPException) and error.status == 429:
+            headers = getattr(error.response, "headers", {}) or {}
+            retry_after = float(headers.get("Retry-After", self.base_delay))
+            if headers.get("X-RateLimit-Global"):
+                self._global_until = time.monotonic() + retry_after
+            return retry_after
+        return None
+
+    def _record_queue_time(self, job: DMJob) -> None:
+        waited = time.monotonic() - job.enqueued_at
+        self.queue_time_total += waited
+        self.queue_time_max = max(self.queue_time_max, waited)
+        DM_QUEUE_SECONDS.observe(waited)
+
+    async def _fail(self, job: DMJob, error: Exception) -> None:
+        self._record_queue_time(job)
+        self.failed += 1
+        DM_MESSAGES.inc(status="failed")
+        if isinstance(error, discord.Forbidden):
+            logger.warning(f"Could not send DM to {job.route} - DMs disabled")
+        else:
+            logger.error(f"Error sending DM to {job.route}: {error}")
+        if job.on_failure is not None:
+            try:
+                await job.on_failure(error)
+            except Exception as e:
+                logger.error(f"Error in DM failure callback: {e}")
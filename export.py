@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Xuất lịch sử vouch/feedback (bảng history trong vouchbot.db) ra CSV hoặc JSONL nén gzip.
+
+Bản ghi được đọc theo từng batch từ HistoryStore và ghi thẳng qua gzip ra
+file, nên bộ nhớ không tăng theo số bản ghi. Lệnh /vouchexport của bot dùng
+cùng các hàm này.
+
+Chạy:
+  python export.py --guild 123 -o feedback.csv.gz
+  python export.py --guild 123 --format jsonl --since 2024-01-01 --until 2024-01-31 --product "Nitro 1 tháng" -o jan.jsonl.gz
+  python export.py -o - --no-gzip                     # mọi guild, CSV ra stdout
+"""
+
+import io
+import os
+import sys
+import csv
+import gzip
+import json
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import IO, Iterable, Optional, Tuple
+
+FORMATS = ("csv", "jsonl")
+EXPORT_FIELDS = ("id", "created_at", "kind", "guild_id", "vouch_id", "buyer_id", "staff_id",
+                 "product", "quantity", "price", "stars", "feedback")
+
+
+def parse_date_range(since: Optional[str], until: Optional[str]) -> Tuple[Optional[float], Optional[float]]:
+    """Turn inclusive YYYY-MM-DD dates (UTC) into a [since, until) timestamp range; raises ValueError"""
+    start = datetime.strptime(since, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() if since else None
+    end = None
+    if until:
+        end = (datetime.strptime(until, "%Y-%m-%d").replace(tzinfo=timezone.utc) + timedelta(days=1)).timestamp()
+    if start is not None and end is not None and end <= start:
+        raise ValueError("until is before since")
+    return start, end
+
+
+def event_row(event) -> dict:
+    row = {field: getattr(event, field) for field in EXPORT_FIELDS}
+    row["created_at"] = datetime.fromtimestamp(event.created_at, tz=timezone.utc).isoformat(timespec="seconds")
+    return row
+
+
+def write_events(events: Iterable, out: IO[bytes], fmt: str = "csv", compress: bool = True) -> int:
+    """Stream ``events`` into the binary file ``out`` as CSV or JSONL (gzip by default); returns the record count"""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}")
+    sink = gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6) if compress else out
+    text = io.TextIOWrapper(sink, encoding="utf-8", newline="")
+    count = 0
+    try:
+        if fmt == "csv":
+            writer = csv.DictWriter(text, fieldnames=EXPORT_FIELDS)
+            writer.writeheader()
+            for event in events:
+                writer.writerow(event_row(event))
+                count += 1
+        else:
+            for event in events:
+                text.write(json.dumps(event_row(event), ensure_ascii=False))
+                text.write("\n")
+                count += 1
+        text.flush()
+    finally:
+        # Đóng gzip (ghi trailer) nhưng không đóng file đích của người gọi
+        text.detach()
+        if compress:
+            sink.close()
+    return count
+
+
+def export_filename(guild_id: Optional[int], fmt: str, since: Optional[str], until: Optional[str], compress: bool = True) -> str:
+    parts = ["vouch-history"]
+    if guild_id is not None:
+        parts.append(str(guild_id))
+    if since or until:
+        parts.append(f"{since or 'start'}_{until or 'now'}")
+    return "-".join(parts) + f".{fmt}" + (".gz" if compress else "")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Export vouch and feedback history to gzip CSV/JSONL")
+    parser.add_argument("--guild", type=int, help="only this guild (default: all guilds)")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--since", help="first day, YYYY-MM-DD (UTC)")
+    parser.add_argument("--until", help="last day, YYYY-MM-DD (UTC, inclusive)")
+    parser.add_argument("--product", help="only this product")
+    parser.add_argument("--database", default=os.getenv("DATABASE_FILE", "vouchbot.db"))
+    parser.add_argument("-o", "--output", help="output file, '-' for stdout (default: generated name)")
+    parser.add_argument("--no-gzip", action="store_true", help="write plain text instead of gzip")
+    args = parser.parse_args()
+
+    try:
+        since, until = parse_date_range(args.since, args.until)
+    except ValueError as e:
+        parser.error(f"invalid date range: {e}")
+    if not os.path.exists(args.database):
+        parser.error(f"database {args.database} not found")
+
+    from storage import HistoryStore
+    store = HistoryStore(args.database)
+    compress = not args.no_gzip
+    output = args.output or export_filename(args.guild, args.format, args.since, args.until, compress)
+    try:
+        events = store.iter_events(args.guild, since=since, until=until, product=args.product)
+        if output == "-":
+            count = write_events(events, sys.stdout.buffer, args.format, compress)
+            sys.stdout.buffer.flush()
+        else:
+            with open(output, "wb") as f:
+                count = write_events(events, f, args.format, compress)
+    finally:
+        store.close()
+    print(f"✅ Đã xuất {count} bản ghi -> {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
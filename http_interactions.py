@@ -0,0 +1,299 @@
+import json
+import time
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Pattern, Tuple
+
+import discord
+from discord import app_commands
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Loại interaction và loại phản hồi theo tài liệu Discord
+PING = 1
+APPLICATION_COMMAND = 2
+MESSAGE_COMPONENT = 3
+MODAL_SUBMIT = 5
+
+PONG = 1
+CHANNEL_MESSAGE = 4
+DEFERRED_CHANNEL_MESSAGE = 5
+DEFERRED_UPDATE_MESSAGE = 6
+UPDATE_MESSAGE = 7
+MODAL = 9
+
+EPHEMERAL = 1 << 6
+
+ComponentFactory = Callable[[discord.Interaction, Any], Awaitable[Any]]
+ModalFactory = Callable[[discord.Interaction, Any], Awaitable[Optional[discord.ui.Modal]]]
+
+
+def load_verify_key(public_key: str):
+    """Ed25519 key that checks Discord's request signatures (needs the optional PyNaCl package)"""
+    try:
+        from nacl.signing import VerifyKey
+    except ImportError as e:
+        raise RuntimeError("HTTP interactions need PyNaCl: pip install PyNaCl") from e
+    return VerifyKey(bytes.fromhex(public_key))
+
+
+def verify_signature(verify_key, signature: str, timestamp: str, body: bytes) -> bool:
+    """True when ``signature`` signs ``timestamp + body`` with the application's key"""
+    from nacl.exceptions import BadSignatureError
+    try:
+        verify_key.verify(timestamp.encode() + body, bytes.fromhex(signature))
+        return True
+    except (BadSignatureError, ValueError):
+        return False
+
+
+def submitted_values(components: List[dict]) -> Dict[str, str]:
+    """custom_id -> value of the text inputs in a modal submit payload (action rows or labels)"""
+    values = {}
+    for row in components:
+        children = row.get("components") or ([row["component"]] if "component" in row else [])
+        for child in children:
+            if "custom_id" in child and "value" in child:
+                values[child["custom_id"]] = child["value"]
+    return values
+
+
+def fill_modal(modal: discord.ui.Modal, components: List[dict]) -> None:
+    """Set the modal's text input values from a submit payload.
+
+    ``Modal._refresh`` changed its signature between discord.py releases,
+    so the values are copied here instead of going through it.
+    """
+    values = submitted_values(components)
+    # walk_children (text input trong Label) chỉ có từ discord.py 2.6
+    items = modal.walk_children() if hasattr(modal, "walk_children") else modal.children
+    for item in items:
+        if isinstance(item, discord.ui.TextInput) and item.custom_id in values:
+            item._value = values[item.custom_id]
+
+
+class TextChannelTransformer(app_commands.Transformer):
+    """A text channel option: the cached ``discord.TextChannel``, or the resolved
+    ``AppCommandChannel`` when the guild is not cached (HTTP interactions mode)"""
+
+    @property
+    def type(self) -> discord.AppCommandOptionType:
+        return discord.AppCommandOptionType.channel
+
+    @property
+    def channel_types(self) -> List[discord.ChannelType]:
+        return [discord.ChannelType.text]
+
+    async def transform(self, interaction: discord.Interaction, value: app_commands.AppCommandChannel):
+        return value.resolve() or value
+
+
+class HTTPInteractionResponse:
+    """Stands in for ``interaction.response`` and turns the first response into the HTTP reply body.
+
+    Handlers call ``send_message``/``send_modal``/``defer`` as usual; the call
+    returns once the reply has been written, so a following
+    ``original_response()`` or followup sees the message. If the handler is
+    too slow the endpoint defers on its behalf, with a public "thinking"
+    response (a silent update for components): a later ``send_message``
+    becomes a followup, ``edit_message`` edits the original response,
+    ``defer`` does nothing and ``send_modal`` fails (Discord does not
+    accept a modal after a defer).
+    """
+
+    def __init__(self, interaction: discord.Interaction):
+        self._interaction = interaction
+        self.payload: Optional[Dict[str, Any]] = None
+        self.replied = asyncio.get_running_loop().create_future()
+        self.delivered = asyncio.Event()
+        self.deferred_by_endpoint = False
+
+    def is_done(self) -> bool:
+        return self.payload is not None
+
+    async def _reply(self, payload: Dict[str, Any]) -> None:
+        if self.payload is not None or self.deferred_by_endpoint:
+            raise discord.InteractionResponded(self._interaction)
+        self.payload = payload
+        self.replied.set_result(payload)
+        await self.delivered.wait()
+
+    async def send_message(self, content: Optional[str] = None, *, embed: Optional[discord.Embed] = None,
+                           embeds: Optional[List[discord.Embed]] = None, view: Optional[discord.ui.View] = None,
+                           ephemeral: bool = False, **kwargs) -> None:
+        if self.deferred_by_endpoint:
+            # Endpoint đã defer thay cho handler: tin nhắn đi theo followup
+            followup = {"embeds": embeds or ([embed] if embed else [])}
+            if view is not None:
+                followup["view"] = view
+            await self._interaction.followup.send(content, ephemeral=ephemeral, **followup)
+            return
+        data: Dict[str, Any] = {}
+        if content is not None:
+            data["content"] = str(content)
+        if embed is not None or embeds:
+            data["embeds"] = [item.to_dict() for item in (embeds or [embed])]
+        if view is not None:
+            data["components"] = view.to_components()
+        if ephemeral:
+            data["flags"] = EPHEMERAL
+        await self._reply({"type": CHANNEL_MESSAGE, "data": data})
+
+    async def edit_message(self, *, content: Optional[str] = None, embed: Optional[discord.Embed] = None,
+                           view: Optional[discord.ui.View] = None, **kwargs) -> None:
+        if self.deferred_by_endpoint:
+            # Phản hồi gốc là tin nhắn defer của endpoint: sửa tin nhắn đó
+            edit = {"embed": embed} if embed is not None else {}
+            if content is not None:
+                edit["content"] = content
+            if view is not None:
+                edit["view"] = view
+            await self._interaction.edit_original_response(**edit)
+            return
+        data: Dict[str, Any] = {}
+        if content is not None:
+            data["content"] = str(content)
+        if embed is not None:
+            data["embeds"] = [embed.to_dict()]
+        if view is not None:
+            data["components"] = view.to_components()
+        await self._reply({"type": UPDATE_MESSAGE, "data": data})
+
+    async def send_modal(self, modal: discord.ui.Modal) -> None:
+        if self.deferred_by_endpoint:
+            logger.error(f"Modal for HTTP interaction {self._interaction.id} dropped: the endpoint already deferred it")
+        await self._reply({"type": MODAL, "data": modal.to_dict()})
+
+    async def defer(self, *, ephemeral: bool = False, thinking: bool = False) -> None:
+        if self.deferred_by_endpoint:
+            # Endpoint đã defer thay cho handler
+            return
+        if self._interaction.type is discord.InteractionType.component and not thinking:
+            await self._reply({"type": DEFERRED_UPDATE_MESSAGE})
+        else:
+            await self._reply({"type": DEFERRED_CHANNEL_MESSAGE, "data": {"flags": EPHEMERAL} if ephemeral else {}})
+
+
+def endpoint_defer(interaction: discord.Interaction) -> Dict[str, Any]:
+    """The reply the endpoint sends for a handler that missed the deadline.
+
+    The handler's own flags are not known yet, so nothing is forced
+    ephemeral: a click acknowledges silently (its message can still be
+    edited), anything else gets a public "thinking" response.
+    """
+    if interaction.type is discord.InteractionType.component:
+        return {"type": DEFERRED_UPDATE_MESSAGE}
+    return {"type": DEFERRED_CHANNEL_MESSAGE}
+
+
+class InteractionEndpoint:
+    """Discord's HTTP interactions endpoint, served by aiohttp.
+
+    Every request carries the whole interaction, so any replica can handle
+    it: slash commands go through the bot's command tree, buttons and modals
+    are rebuilt from their ``custom_id`` by the registered factories and
+    state is read from the shared store.
+    """
+
+    def __init__(self, client: discord.Client, verify_key, response_timeout: float = 2.5, max_skew: float = 300.0):
+        self.client = client
+        self.verify_key = verify_key
+        self.response_timeout = response_timeout
+        self.max_skew = max_skew
+        self.components: List[Tuple[Pattern, ComponentFactory]] = []
+        self.modals: List[Tuple[Pattern, ModalFactory]] = []
+        self._tasks: set = set()
+
+    def add_component(self, pattern: Pattern, factory: ComponentFactory) -> None:
+        """``factory(interaction, match)`` returns the item whose ``callback`` handles the click"""
+        self.components.append((pattern, factory))
+
+    def add_dynamic_item(self, item_cls) -> None:
+        """Register a ``discord.ui.DynamicItem`` subclass by its custom_id template"""
+        self.add_component(item_cls.__discord_ui_compiled_template__, lambda interaction, match: item_cls.from_custom_id(interaction, None, match))
+
+    def add_modal(self, pattern: Pattern, factory: ModalFactory) -> None:
+        """``factory(interaction, match)`` rebuilds the modal, or answers and returns None"""
+        self.modals.append((pattern, factory))
+
+    async def dispatch(self, interaction: discord.Interaction) -> None:
+        """Run the handler for one interaction"""
+        data = interaction.data or {}
+        if interaction.type is discord.InteractionType.application_command:
+            tree = self.client.tree
+            try:
+                await tree._call(interaction)
+            except app_commands.AppCommandError as e:
+                await tree._dispatch_error(interaction, e)
+            return
+
+        custom_id = data.get("custom_id", "")
+        if interaction.type is discord.InteractionType.component:
+            for pattern, factory in self.components:
+                match = pattern.fullmatch(custom_id)
+                if match:
+                    item = await factory(interaction, match)
+                    await item.callback(interaction)
+                    return
+        elif interaction.type is discord.InteractionType.modal_submit:
+            for pattern, factory in self.modals:
+                match = pattern.fullmatch(custom_id)
+                if match:
+                    modal = await factory(interaction, match)
+                    if modal is not None:
+                        fill_modal(modal, data.get("components", []))
+                        await modal.on_submit(interaction)
+                    return
+        logger.warning(f"No HTTP handler for interaction type {interaction.type} ({custom_id or data.get('name')})")
+
+    async def handle(self, request: "web.Request") -> "web.StreamResponse":
+        from aiohttp import web
+        body = await request.read()
+        signature = request.headers.get("X-Signature-Ed25519", "")
+        timestamp = request.headers.get("X-Signature-Timestamp", "")
+        if not signature or not timestamp or not verify_signature(self.verify_key, signature, timestamp, body):
+            return web.Response(status=401, text="invalid request signature")
+        # Chặn replay: chữ ký cũ hơn max_skew giây không được chấp nhận
+        if timestamp.isdigit() and abs(time.time() - int(timestamp)) > self.max_skew:
+            return web.Response(status=401, text="stale request timestamp")
+
+        payload = json.loads(body)
+        if payload.get("type") == PING:
+            return web.json_response({"type": PONG})
+
+        interaction = discord.Interaction(data=payload, state=self.client._connection)
+        response = HTTPInteractionResponse(interaction)
+        # Interaction.response là cached slot: thay bằng phản hồi qua HTTP body
+        interaction._cs_response = response
+
+        task = asyncio.create_task(self.dispatch(interaction), name=f"http-interaction-{interaction.id}")
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        await asyncio.wait({task, response.replied}, timeout=self.response_timeout, return_when=asyncio.FIRST_COMPLETED)
+
+        if response.payload is None:
+            if task.done():
+                return web.Response(status=500, text="interaction was not answered")
+            # Handler chưa trả lời kịp deadline 3 giây: defer thay cho handler
+            logger.warning(f"HTTP interaction {interaction.id} not answered in {self.response_timeout:.1f}s, deferring")
+            response.deferred_by_endpoint = True
+            reply = endpoint_defer(interaction)
+        else:
+            reply = response.payload
+
+        try:
+            http_response = web.json_response(reply)
+            await http_response.prepare(request)
+            await http_response.write_eof()
+        finally:
+            # Client ngắt kết nối hay ghi lỗi: handler không được chờ mãi
+            response.delivered.set()
+        return http_response
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"HTTP interaction handler {task.get_name()} failed: {task.exception()}")
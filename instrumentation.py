@@ -0,0 +1,170 @@
+import os
+import time
+import logging
+import functools
+import contextvars
+from collections import deque
+from typing import Awaitable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+import discord
+
+from startup import profiler
+from metrics import DISCORD_CALL_SECONDS, INTERACTION_ACK_SECONDS, INTERACTION_SECONDS, INTERACTIONS, registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Discord huỷ interaction nếu không được ack trong 3 giây
+ACK_WARN_SECONDS = float(os.getenv('ACK_WARN_SECONDS', '2.0'))
+WINDOW_SIZE = int(os.getenv('LATENCY_WINDOW_SIZE', '1024'))
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RollingWindow:
+    """Keep the last ``size`` samples and compute percentiles on demand"""
+
+    def __init__(self, size: int = WINDOW_SIZE):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, value: float) -> None:
+        self._samples.append(value)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentiles(self, quantiles=QUANTILES) -> Dict[float, float]:
+        if not self._samples:
+            return {}
+        ordered = sorted(self._samples)
+        last = len(ordered) - 1
+        return {q: ordered[min(last, int(round(q * last)))] for q in quantiles}
+
+
+# handler -> kind ("ack" / "total") -> cửa sổ mẫu gần nhất
+_windows: Dict[str, Dict[str, RollingWindow]] = {}
+
+
+def _window(handler: str, kind: str) -> RollingWindow:
+    return _windows.setdefault(handler, {}).setdefault(kind, RollingWindow())
+
+
+def latency_summary() -> Dict[str, Dict[str, Dict[float, float]]]:
+    """Rolling p50/p95/p99 per handler, for ack time and total handler time"""
+    return {
+        handler: {kind: window.percentiles() for kind, window in kinds.items()}
+        for handler, kinds in _windows.items()
+    }
+
+
+def _quantile_samples():
+    for handler, kinds in list(_windows.items()):
+        for kind, window in kinds.items():
+            for quantile, value in window.percentiles().items():
+                yield {"handler": handler, "kind": kind, "quantile": str(quantile)}, value
+
+
+registry.gauge(
+    "vouchbot_interaction_latency_quantile_seconds",
+    "Rolling latency percentiles per handler (kind=ack|total)",
+    ("handler", "kind", "quantile"),
+    callback=_quantile_samples
+)
+
+
+class InteractionTrace:
+    """Timings collected while one interaction is being handled"""
+
+    __slots__ = ("handler", "guild_id", "user_id", "started", "gateway_delay", "acked_at", "calls")
+
+    def __init__(self, handler: str, interaction: Optional[discord.Interaction]):
+        self.handler = handler
+        # Dùng cho log có cấu trúc (xem logging_setup.ContextFilter)
+        self.guild_id: Optional[int] = getattr(interaction, "guild_id", None)
+        self.user_id: Optional[int] = getattr(getattr(interaction, "user", None), "id", None)
+        self.started = time.perf_counter()
+        # Thời gian từ lúc Discord tạo interaction tới lúc handler bắt đầu
+        self.gateway_delay = 0.0
+        if interaction is not None:
+            self.gateway_delay = max(0.0, time.time() - interaction.created_at.timestamp())
+        self.acked_at: Optional[float] = None
+        self.calls: List[Tuple[str, float]] = []
+
+    @property
+    def ack_seconds(self) -> Optional[float]:
+        return None if self.acked_at is None else self.acked_at - self.started
+
+
+_current_trace: contextvars.ContextVar[Optional[InteractionTrace]] = contextvars.ContextVar("interaction_trace", default=None)
+
+
+def current_trace() -> Optional[InteractionTrace]:
+    return _current_trace.get()
+
+
+async def timed(call: str, awaitable: Awaitable[T]) -> T:
+    """Await a Discord REST call and record its duration on the current trace.
+
+    ``call="ack"`` marks the interaction response (send_message, send_modal,
+    defer); the first one sets the trace's time-to-first-ack.
+    """
+    trace = _current_trace.get()
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        finished = time.perf_counter()
+        DISCORD_CALL_SECONDS.observe(finished - started, handler=trace.handler if trace else "background", call=call)
+        if trace is not None:
+            trace.calls.append((call, finished - started))
+            if call == "ack" and trace.acked_at is None:
+                trace.acked_at = finished
+
+
+def _find_interaction(args) -> Optional[discord.Interaction]:
+    # Duck typing để cả interaction giả (benchmark, test) cũng được trace
+    for arg in args:
+        if isinstance(arg, discord.Interaction) or (hasattr(arg, "response") and hasattr(arg, "created_at")):
+            return arg
+    return None
+
+
+def _finish(trace: InteractionTrace, status: str) -> None:
+    total = time.perf_counter() - trace.started
+    INTERACTIONS.inc(handler=trace.handler, status=status)
+    INTERACTION_SECONDS.observe(total, handler=trace.handler)
+    _window(trace.handler, "total").add(total)
+
+    ack = trace.ack_seconds
+    if ack is not None:
+        INTERACTION_ACK_SECONDS.observe(ack, handler=trace.handler)
+        _window(trace.handler, "ack").add(ack)
+        if ack + trace.gateway_delay > ACK_WARN_SECONDS:
+            calls = ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in trace.calls)
+            logger.warning(
+                f"Slow ack in {trace.handler}: {ack * 1000:.0f}ms after start "
+                f"(+{trace.gateway_delay * 1000:.0f}ms gateway delay) [{calls}]"
+            )
+    logger.debug(f"{trace.handler} finished in {total * 1000:.0f}ms (ack={ack}, calls={trace.calls})")
+
+
+def instrumented(handler: str):
+    """Trace an interaction handler: ack time, total time and per-call timings"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            trace = InteractionTrace(handler, _find_interaction(args))
+            # Mốc cuối của đo khởi động: interaction đầu tiên sau khi process chạy
+            profiler.mark_once("first_interaction")
+            token = _current_trace.set(trace)
+            status = "ok"
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                _current_trace.reset(token)
+                _finish(trace, status)
+        return wrapper
+    return decorator
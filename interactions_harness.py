@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gửi interaction giả có chữ ký Ed25519 tới endpoint /interactions (INTERACTIONS_MODE=http).
+
+Kịch bản: PING, chữ ký sai, /setupvouch, /setupfeedback, /vouch, bấm sao,
+gửi modal feedback. Mỗi bước kiểm tra loại phản hồi và đo thời gian trả lời.
+
+Chạy:
+  python interactions_harness.py                   # endpoint chạy trong process này, key tạo ngẫu nhiên
+  python interactions_harness.py --generate-key    # in cặp key để chạy bot thật với DISCORD_PUBLIC_KEY
+  python interactions_harness.py --url http://localhost:8080/interactions --private-key <hex>
+
+Không có token thật nên các lời gọi REST nền (original_response, DM, followup)
+sẽ lỗi và được log; harness chỉ kiểm tra phản hồi của endpoint.
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import itertools
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+APPLICATION_ID = 100000000000000001
+GUILD_ID = 100000000000000002
+CHANNEL_ID = 100000000000000003
+ADMIN_ID = 100000000000000004
+BUYER_ID = 100000000000000005
+FEEDBACK_CHANNEL_ID = 100000000000000006
+ADMINISTRATOR = str(1 << 3)
+
+_ids = itertools.count(int(time.time() * 1000) << 22)
+
+
+def generate_key() -> Tuple[str, str]:
+    """New (private, public) Ed25519 key pair as hex"""
+    from nacl.signing import SigningKey
+    key = SigningKey.generate()
+    return key.encode().hex(), key.verify_key.encode().hex()
+
+
+def sign(private_key: str, timestamp: str, body: bytes) -> str:
+    from nacl.signing import SigningKey
+    return SigningKey(bytes.fromhex(private_key)).sign(timestamp.encode() + body).signature.hex()
+
+
+def user_payload(user_id: int) -> Dict[str, Any]:
+    return {"id": str(user_id), "username": f"user{user_id % 1000}", "discriminator": "0", "avatar": None, "global_name": None}
+
+
+def member_payload(user_id: int, permissions: str = "0") -> Dict[str, Any]:
+    return {"user": user_payload(user_id), "roles": [], "joined_at": "2024-01-01T00:00:00+00:00",
+            "deaf": False, "mute": False, "flags": 0, "permissions": permissions}
+
+
+def interaction_payload(kind: int, data: Dict[str, Any], user_id: int, permissions: str = "0",
+                        message: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    payload = {
+        "id": str(next(_ids)), "application_id": str(APPLICATION_ID), "type": kind, "data": data,
+        "token": f"harness-{next(_ids)}", "version": 1, "guild_id": str(GUILD_ID),
+        "channel_id": str(CHANNEL_ID),
+        "channel": {"id": str(CHANNEL_ID), "type": 0, "name": "vouch", "position": 0, "guild_id": str(GUILD_ID)},
+        "member": member_payload(user_id, permissions), "app_permissions": "0", "locale": "vi",
+        "attachment_size_limit": 8 * 1024 * 1024,
+    }
+    if message is not None:
+        payload["message"] = message
+    return payload
+
+
+def command_payload(name: str, options: List[Dict[str, Any]], user_id: int, permissions: str = "0",
+                    resolved: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    data = {"id": str(next(_ids)), "name": name, "type": 1, "options": options}
+    if resolved:
+        data["resolved"] = resolved
+    return interaction_payload(2, data, user_id, permissions)
+
+
+def message_payload(message_id: int, custom_ids: List[str]) -> Dict[str, Any]:
+    return {
+        "id": str(message_id), "channel_id": str(CHANNEL_ID), "author": user_payload(APPLICATION_ID),
+        "content": "vouch", "timestamp": "2024-01-01T00:00:00+00:00", "edited_timestamp": None, "tts": False,
+        "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [], "embeds": [],
+        "pinned": False, "type": 0,
+        "components": [{"type": 1, "components": [
+            {"type": 2, "style": 1, "label": custom_id, "custom_id": custom_id} for custom_id in custom_ids
+        ]}],
+    }
+
+
+def custom_ids(reply: Dict[str, Any]) -> List[str]:
+    return [
+        component["custom_id"]
+        for row in reply.get("data", {}).get("components", [])
+        for component in row.get("components", [])
+        if "custom_id" in component
+    ]
+
+
+async def post(session: aiohttp.ClientSession, url: str, private_key: str, payload: Dict[str, Any],
+               bad_signature: bool = False) -> Tuple[int, Dict[str, Any], float]:
+    body = json.dumps(payload).encode()
+    timestamp = str(int(time.time()))
+    signature = sign(private_key, timestamp, body)
+    if bad_signature:
+        signature = signature[:-2] + ("00" if signature[-2:] != "00" else "11")
+    started = time.perf_counter()
+    async with session.post(url, data=body, headers={
+        "Content-Type": "application/json", "X-Signature-Ed25519": signature, "X-Signature-Timestamp": timestamp,
+    }) as resp:
+        text = await resp.text()
+        elapsed = time.perf_counter() - started
+        return resp.status, json.loads(text) if resp.content_type == "application/json" else {}, elapsed
+
+
+async def run_flow(url: str, private_key: str) -> List[Dict[str, Any]]:
+    """Post the scripted interactions and return one result per step"""
+    results: List[Dict[str, Any]] = []
+
+    def record(step: str, status: int, reply: Dict[str, Any], elapsed: float, expected_status: int, expected_type: Optional[int]):
+        ok = status == expected_status and (expected_type is None or reply.get("type") == expected_type)
+        results.append({"step": step, "ok": ok, "status": status, "type": reply.get("type"), "ms": elapsed * 1000, "reply": reply})
+        return reply
+
+    async with aiohttp.ClientSession() as session:
+        status, reply, elapsed = await post(session, url, private_key, {"type": 1, "id": "0", "application_id": str(APPLICATION_ID), "token": "t", "version": 1})
+        record("ping", status, reply, elapsed, 200, 1)
+
+        status, reply, elapsed = await post(session, url, private_key, {"type": 1}, bad_signature=True)
+        record("bad signature", status, reply, elapsed, 401, None)
+
+        status, reply, elapsed = await post(session, url, private_key, command_payload("setupvouch", [], ADMIN_ID, ADMINISTRATOR))
+        record("/setupvouch", status, reply, elapsed, 200, 9)
+
+        status, reply, elapsed = await post(session, url, private_key, command_payload("setupvouch", [], BUYER_ID))
+        record("/setupvouch (không phải admin)", status, reply, elapsed, 200, 4)
+
+        channel = {"id": str(FEEDBACK_CHANNEL_ID), "type": 0, "name": "feedback", "permissions": "0", "guild_id": str(GUILD_ID)}
+        status, reply, elapsed = await post(session, url, private_key, command_payload(
+            "setupfeedback", [{"name": "channel", "type": 7, "value": str(FEEDBACK_CHANNEL_ID)}], ADMIN_ID, ADMINISTRATOR,
+            resolved={"channels": {str(FEEDBACK_CHANNEL_ID): channel}}
+        ))
+        record("/setupfeedback", status, reply, elapsed, 200, 4)
+
+        resolved = {
+            "users": {str(BUYER_ID): user_payload(BUYER_ID)},
+            "members": {str(BUYER_ID): {key: value for key, value in member_payload(BUYER_ID).items() if key != "user"}},
+        }
+        status, reply, elapsed = await post(session, url, private_key, command_payload("vouch", [
+            {"name": "buyer", "type": 6, "value": str(BUYER_ID)},
+            {"name": "quantity", "type": 4, "value": 1},
+            {"name": "product", "type": 3, "value": "Nitro 1 tháng"},
+            {"name": "price", "type": 3, "value": "50k"},
+        ], ADMIN_ID, resolved=resolved))
+        buttons = custom_ids(record("/vouch", status, reply, elapsed, 200, 4))
+
+        star = next((custom_id for custom_id in buttons if custom_id.endswith(":5")), "v:0:5")
+        message = message_payload(next(_ids), buttons)
+        status, reply, elapsed = await post(session, url, private_key, interaction_payload(
+            3, {"custom_id": star, "component_type": 2}, BUYER_ID, message=message
+        ))
+        modal = record("bấm 5 sao", status, reply, elapsed, 200, 9)
+
+        status, reply, elapsed = await post(session, url, private_key, interaction_payload(
+            3, {"custom_id": star, "component_type": 2}, ADMIN_ID, message=message
+        ))
+        record("bấm sao (không phải buyer)", status, reply, elapsed, 200, 4)
+
+        modal_id = modal.get("data", {}).get("custom_id", "fb:0:5")
+        status, reply, elapsed = await post(session, url, private_key, interaction_payload(5, {
+            "custom_id": modal_id,
+            "components": [{"type": 1, "components": [{"type": 4, "custom_id": "feedback", "value": "Shop uy tín"}]}],
+        }, BUYER_ID, message=message))
+        record("gửi feedback", status, reply, elapsed, 200, 5)
+    return results
+
+
+async def serve_local(private_key: Optional[str] = None, port: int = 0):
+    """Start vouch_bot1's interaction endpoint in this process; returns (runner, url, private key)"""
+    import discord
+    from aiohttp import web
+    import vouch_bot1
+
+    if private_key is None:
+        private_key, public_key = generate_key()
+    else:
+        from nacl.signing import SigningKey
+        public_key = SigningKey(bytes.fromhex(private_key)).verify_key.encode().hex()
+    endpoint = vouch_bot1.create_interaction_endpoint(public_key)
+    state = vouch_bot1.bot._connection
+    if state.user is None:
+        # Như sau khi login: interaction cần biết user của bot (guild.me)
+        state.user = discord.ClientUser(state=state, data={**user_payload(APPLICATION_ID), "bot": True})
+    vouch_bot1.dm_dispatcher.start()
+    app = web.Application()
+    app.router.add_post("/interactions", endpoint.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    bound = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{bound}/interactions", private_key
+
+
+async def run_local() -> List[Dict[str, Any]]:
+    import vouch_bot1
+    logged_in = vouch_bot1.bot._connection.user
+    runner, url, private_key = await serve_local()
+    try:
+        return await run_flow(url, private_key)
+    finally:
+        vouch_bot1.bot._connection.user = logged_in
+        # Chờ các tác vụ nền (đều lỗi vì không có token) rồi dừng
+        if vouch_bot1.background_tasks:
+            await asyncio.wait(set(vouch_bot1.background_tasks), timeout=5)
+        await vouch_bot1.dm_dispatcher.stop(timeout=1)
+        await runner.cleanup()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Post signed fake interactions to the HTTP interactions endpoint")
+    parser.add_argument("--url", help="endpoint of a running bot (default: start one in this process)")
+    parser.add_argument("--private-key", help="hex Ed25519 private key matching the bot's DISCORD_PUBLIC_KEY")
+    parser.add_argument("--generate-key", action="store_true", help="print a new key pair and exit")
+    args = parser.parse_args()
+
+    if args.generate_key:
+        private_key, public_key = generate_key()
+        print(f"DISCORD_PUBLIC_KEY={public_key}")
+        print(f"private key (cho --private-key): {private_key}")
+        return 0
+
+    if args.url:
+        if not args.private_key:
+            parser.error("--url needs --private-key")
+        results = asyncio.run(run_flow(args.url, args.private_key))
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix="vouchbot-http-")
+        # Cấu hình phải có trước khi import vouch_bot1
+        os.environ["DATABASE_FILE"] = os.path.join(tmp_dir, "http.db")
+        os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+        os.environ.setdefault("LOG_FILE", os.path.join(tmp_dir, "bot.log"))
+        results = asyncio.run(run_local())
+
+    print("📨 HTTP interactions:")
+    for result in results:
+        mark = "✅" if result["ok"] else "❌"
+        print(f"   {mark} {result['step']:<32} HTTP {result['status']}  type={result['type']}  {result['ms']:6.1f}ms")
+    return 0 if all(result["ok"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chạy VouchBot thành nhiều worker process, mỗi worker giữ một dải shard.
+
+Launcher chia shard cho các worker, khởi động lại worker bị thoát (backoff
+tăng dần) và phục vụ /health, /ready, /metrics trên PORT bằng cách gộp số
+liệu của các worker (mỗi worker chạy health server riêng trên cổng nội bộ).
+
+Chạy: python launcher.py [--workers N] [--shards N]
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import argparse
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+from dotenv import load_dotenv
+
+from metrics import Registry
+from sharding import format_shard_ids, split_shards
+
+logger = logging.getLogger("launcher")
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vouch_bot1.py")
+GATEWAY_BOT_URL = "https://discord.com/api/v10/gateway/bot"
+# Discord cho phép IDENTIFY max_concurrency shard mỗi 5 giây
+IDENTIFY_INTERVAL = 5.0
+# Worker chạy ổn định lâu hơn ngưỡng này thì backoff được đặt lại
+STABLE_SECONDS = 60.0
+MAX_BACKOFF = 60.0
+
+
+async def fetch_recommended_shards(token: str) -> Tuple[int, int]:
+    """Ask Discord for the recommended shard count and identify max_concurrency"""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(GATEWAY_BOT_URL, headers={"Authorization": f"Bot {token}"}) as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+    return int(data["shards"]), int(data.get("session_start_limit", {}).get("max_concurrency", 1))
+
+
+def merge_expositions(expositions: Dict[str, str], label: str = "worker") -> str:
+    """Merge several Prometheus text expositions, tagging each sample with ``label``.
+
+    Samples are regrouped by metric family so each family's HELP/TYPE appears
+    once, as the text format requires.
+    """
+    families: Dict[str, List[str]] = {}
+    headers: Dict[str, List[str]] = {}
+    for source, text in expositions.items():
+        family = ""
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            if line.startswith("# "):
+                parts = line.split(" ", 3)
+                if len(parts) >= 3 and parts[1] in ("HELP", "TYPE"):
+                    family = parts[2]
+                    header = headers.setdefault(family, [])
+                    if len(header) < 2 and line not in header:
+                        header.append(line)
+                    families.setdefault(family, [])
+                continue
+            name_end = min((i for i in (line.find("{"), line.find(" ")) if i != -1), default=len(line))
+            tag = f'{label}="{source}"'
+            if line[name_end:name_end + 1] == "{":
+                sample = f"{line[:name_end + 1]}{tag},{line[name_end + 1:]}"
+            else:
+                sample = f"{line[:name_end]}{{{tag}}}{line[name_end:]}"
+            families.setdefault(family or line[:name_end], []).append(sample)
+    lines: List[str] = []
+    for family, samples in families.items():
+        lines.extend(headers.get(family, []))
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+class WorkerProcess:
+    """One supervised bot process and the shard range it runs"""
+
+    def __init__(self, index: int, shard_ids: List[int], port: int):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.port = port
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.backoff = 1.0
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+
+class Launcher:
+    """Spawn, supervise and stop the worker processes"""
+
+    def __init__(self, shard_count: int, workers: int, port: int, worker_port_base: int,
+                 command: Optional[List[str]] = None, max_concurrency: int = 1):
+        self.shard_count = shard_count
+        self.command = command or [sys.executable, WORKER_SCRIPT]
+        self.port = port
+        self.max_concurrency = max(1, max_concurrency)
+        self.workers = [
+            WorkerProcess(index, shard_ids, worker_port_base + index)
+            for index, shard_ids in enumerate(split_shards(shard_count, workers))
+        ]
+        self._supervisors: List[asyncio.Task] = []
+        self._stopping = False
+        self._runner: Optional[web.AppRunner] = None
+        self.registry = Registry()
+        self.registry.gauge(
+            "vouchbot_launcher_worker_up", "1 while the worker process is running", ("worker",),
+            callback=lambda: [({"worker": str(w.index)}, 1 if w.alive else 0) for w in self.workers]
+        )
+        self.registry.gauge(
+            "vouchbot_launcher_worker_restarts", "Times the worker process was restarted", ("worker",),
+            callback=lambda: [({"worker": str(w.index)}, w.restarts) for w in self.workers]
+        )
+
+    # --- Vòng đời worker ---
+    def _worker_env(self, worker: WorkerProcess) -> Dict[str, str]:
+        env = dict(os.environ)
+        env.update({
+            "SHARD_COUNT": str(self.shard_count),
+            "SHARD_IDS": format_shard_ids(worker.shard_ids),
+            "PORT": str(worker.port),
+            "CLUSTER_WORKER": str(worker.index),
+        })
+        return env
+
+    async def _spawn(self, worker: WorkerProcess) -> None:
+        worker.process = await asyncio.create_subprocess_exec(*self.command, env=self._worker_env(worker))
+        worker.started_at = time.monotonic()
+        logger.info(f"Worker {worker.index} started (pid {worker.process.pid}, shards {format_shard_ids(worker.shard_ids)})")
+
+    async def _supervise(self, worker: WorkerProcess, delay: float) -> None:
+        # Giãn thời điểm khởi động để các worker không IDENTIFY cùng lúc
+        await asyncio.sleep(delay)
+        while not self._stopping:
+            await self._spawn(worker)
+            returncode = await worker.process.wait()
+            if self._stopping:
+                break
+            ran = time.monotonic() - worker.started_at
+            worker.backoff = 1.0 if ran >= STABLE_SECONDS else min(worker.backoff * 2, MAX_BACKOFF)
+            worker.restarts += 1
+            logger.warning(f"Worker {worker.index} exited with code {returncode} after {ran:.0f}s, restarting in {worker.backoff:.0f}s")
+            await asyncio.sleep(worker.backoff)
+
+    async def start(self) -> None:
+        self._runner = await self._start_health_server()
+        elapsed_shards = 0
+        for worker in self.workers:
+            delay = (elapsed_shards // self.max_concurrency) * IDENTIFY_INTERVAL
+            self._supervisors.append(asyncio.create_task(self._supervise(worker, delay), name=f"worker-{worker.index}"))
+            elapsed_shards += len(worker.shard_ids)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """SIGTERM every worker (they flush config on shutdown), then kill stragglers"""
+        self._stopping = True
+        for worker in self.workers:
+            if worker.alive:
+                worker.process.terminate()
+        running = [worker.process.wait() for worker in self.workers if worker.process is not None]
+        if running:
+            done, pending = await asyncio.wait([asyncio.ensure_future(wait) for wait in running], timeout=timeout)
+            if pending:
+                logger.warning(f"{len(pending)} worker(s) did not exit in {timeout:.0f}s, killing")
+                for worker in self.workers:
+                    if worker.alive:
+                        worker.process.kill()
+                await asyncio.wait(pending)
+        for task in self._supervisors:
+            task.cancel()
+        await asyncio.gather(*self._supervisors, return_exceptions=True)
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    # --- Health/metrics gộp từ các worker ---
+    async def _fetch_workers(self, path: str) -> Dict[int, Tuple[int, str]]:
+        timeout = aiohttp.ClientTimeout(total=2)
+        results: Dict[int, Tuple[int, str]] = {}
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async def fetch(worker: WorkerProcess):
+                if not worker.alive:
+                    return
+                try:
+                    async with session.get(f"http://127.0.0.1:{worker.port}{path}") as resp:
+                        results[worker.index] = (resp.status, await resp.text())
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass
+            await asyncio.gather(*(fetch(worker) for worker in self.workers))
+        return results
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        responses = await self._fetch_workers("/health")
+        workers = {}
+        for worker in self.workers:
+            status, body = responses.get(worker.index, (None, None))
+            workers[str(worker.index)] = {
+                "pid": worker.process.pid if worker.process is not None else None,
+                "alive": worker.alive,
+                "restarts": worker.restarts,
+                "shard_ids": worker.shard_ids,
+                "health": json.loads(body) if status == 200 else None,
+            }
+        return web.json_response({"status": "healthy", "shard_count": self.shard_count, "workers": workers})
+
+    async def handle_ready(self, request: web.Request) -> web.Response:
+        responses = await self._fetch_workers("/ready")
+        ready = {str(worker.index): responses.get(worker.index, (None, ""))[0] == 200 for worker in self.workers}
+        all_ready = all(ready.values())
+        return web.json_response({"ready": all_ready, "workers": ready}, status=200 if all_ready else 503)
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        responses = await self._fetch_workers("/metrics")
+        expositions = {str(index): body for index, (status, body) in sorted(responses.items()) if status == 200}
+        body = self.registry.expose() + merge_expositions(expositions)
+        return web.Response(body=body.encode("utf-8"), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    async def _start_health_server(self) -> web.AppRunner:
+        app = web.Application()
+        app.router.add_get("/health", self.handle_health)
+        app.router.add_get("/ready", self.handle_ready)
+        app.router.add_get("/metrics", self.handle_metrics)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "0.0.0.0", self.port).start()
+        logger.info(f"Launcher health server started on port {self.port}")
+        return runner
+
+
+async def run(args: argparse.Namespace) -> int:
+    token = os.getenv("DISCORD_TOKEN")
+    shard_count, max_concurrency = args.shards, 1
+    if token and not shard_count:
+        shard_count, max_concurrency = await fetch_recommended_shards(token)
+        logger.info(f"Discord recommends {shard_count} shard(s), max_concurrency {max_concurrency}")
+    if not shard_count:
+        logger.error("Shard count unknown: set DISCORD_TOKEN or pass --shards")
+        return 1
+
+    launcher = Launcher(
+        shard_count=shard_count,
+        workers=args.workers,
+        port=int(os.getenv("PORT", "8080")),
+        worker_port_base=args.worker_port_base,
+        max_concurrency=max_concurrency,
+    )
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    await launcher.start()
+    logger.info(f"Launched {len(launcher.workers)} worker(s) for {shard_count} shard(s)")
+    await stop_event.wait()
+    logger.info("Stopping workers...")
+    await launcher.stop()
+    return 0
+
+
+def main() -> int:
+    load_dotenv()
+    logging.basicConfig(
+        level=getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(description="Run VouchBot as several sharded worker processes")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("CLUSTER_WORKERS", os.cpu_count() or 1)),
+                        help="number of worker processes (default: CLUSTER_WORKERS or CPU count)")
+    parser.add_argument("--shards", type=int, default=int(os.getenv("SHARD_COUNT", "0")),
+                        help="total shard count (default: SHARD_COUNT or Discord's recommendation)")
+    parser.add_argument("--worker-port-base", type=int, default=int(os.getenv("WORKER_PORT_BASE", "9100")),
+                        help="first internal health port for the workers")
+    return asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import queue
+import random
+import atexit
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from instrumentation import current_trace
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Truyền vào ``extra`` của các log INFO lặp lại theo từng vouch/DM để chúng được lấy mẫu
+SAMPLED = {"sampled": True}
+
+# Các field có cấu trúc được đưa vào log JSON khi có mặt
+CONTEXT_FIELDS = ("guild_id", "user_id", "command", "latency_ms")
+
+
+class ContextFilter(logging.Filter):
+    """Attach the current interaction's guild_id, user_id, command and latency to each record.
+
+    Runs in the thread that logs (before the record is queued), so the
+    interaction trace from the handler's context is still visible.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace = current_trace()
+        if trace is not None:
+            if getattr(record, "command", None) is None:
+                record.command = trace.handler
+            if getattr(record, "guild_id", None) is None:
+                record.guild_id = trace.guild_id
+            if getattr(record, "user_id", None) is None:
+                record.user_id = trace.user_id
+            if getattr(record, "latency_ms", None) is None:
+                record.latency_ms = round((time.perf_counter() - trace.started) * 1000, 1)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of INFO-or-lower records logged with ``extra=SAMPLED``"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = max(0.0, min(1.0, rate))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1.0 or record.levelno > logging.INFO or not getattr(record, "sampled", False):
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the structured context fields when present"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _ThreadQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler for a listener in the same process.
+
+    The stock ``prepare`` formats the message and drops ``exc_info`` so the
+    record can be pickled; a thread-local listener doesn't need that, so the
+    formatting work moves to the listener thread as well.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(
+    level: Optional[str] = None,
+    json_format: Optional[bool] = None,
+    log_file: Optional[str] = None,
+    sample_rate: Optional[float] = None,
+) -> logging.handlers.QueueListener:
+    """Route all logging through a queue drained by a background thread.
+
+    Arguments default to the LOG_LEVEL, LOG_FORMAT (``text``/``json``),
+    LOG_FILE and LOG_SAMPLE_RATE environment variables. Calling it again
+    replaces the previous setup.
+    """
+    global _listener
+    if level is None:
+        level = os.getenv('LOG_LEVEL', 'INFO')
+    if json_format is None:
+        json_format = os.getenv('LOG_FORMAT', 'text').lower() == 'json'
+    if sample_rate is None:
+        sample_rate = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+
+    formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+    handlers: List[logging.Handler] = [logging.StreamHandler()]  # Railway đọc log từ stdout
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = _ThreadQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    if _listener is not None:
+        _listener.stop()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
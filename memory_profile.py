@@ -0,0 +1,41 @@
+import os
+from typing import Any, Dict
+
+import discord
+
+MEMORY_PROFILES = ("default", "low")
+
+# default: cấu hình discord.py như trước; low: chỉ cache những gì VouchBot dùng
+MEMORY_PROFILE = os.getenv('MEMORY_PROFILE', 'default').lower()
+
+
+def default_intents() -> discord.Intents:
+    intents = discord.Intents.default()
+    intents.message_content = False  # Không cần message content cho slash commands
+    intents.guilds = True
+    intents.guild_messages = True
+    return intents
+
+
+def client_options(profile: str = MEMORY_PROFILE) -> Dict[str, Any]:
+    """Keyword arguments for the bot constructor (intents and caches) for a memory profile.
+
+    The ``low`` profile keeps only the guild/channel cache that interactions
+    resolve against: slash commands, buttons and modals arrive with their
+    member and channel data, and messages are edited by id, so the message
+    cache, member cache, startup chunking and non-guild gateway events are
+    all dropped.
+    """
+    if profile not in MEMORY_PROFILES:
+        raise ValueError(f"unknown MEMORY_PROFILE: {profile!r} (expected one of {', '.join(MEMORY_PROFILES)})")
+    if profile == "low":
+        intents = discord.Intents.none()
+        intents.guilds = True
+        return {
+            "intents": intents,
+            "max_messages": None,
+            # Bot vẫn giữ Member của chính nó (guild.me) để kiểm tra quyền
+            "member_cache_flags": discord.MemberCacheFlags.none(),
+            "chunk_guilds_at_startup": False,
+        }
+    return {"intents": default_intents()}
@@ -0,0 +1,183 @@
+import os
+import heapq
+import asyncio
+import contextvars
+import itertools
+import time
+from typing import Awaitable, Dict, Hashable, List, Optional, Set, TypeVar
+
+from instrumentation import timed
+from metrics import OUTBOUND_COALESCED, OUTBOUND_WAIT_SECONDS
+
+T = TypeVar("T")
+
+# Thứ tự ưu tiên: ack interaction (deadline 3 giây) > đăng feedback, followup > DM và sửa tin nhắn
+PRIORITIES = ("ack", "post", "background")
+CALL_PRIORITIES = {
+    "ack": "ack",
+    "dm": "background",
+    "edit": "background",
+}
+DEFAULT_PRIORITY = "post"
+
+
+def priority_of(call: str) -> str:
+    return CALL_PRIORITIES.get(call, DEFAULT_PRIORITY)
+
+
+class _Job:
+    __slots__ = ("level", "priority", "seq", "call", "awaitable", "key", "enqueued_at", "context", "result")
+
+    def __init__(self, level: int, priority: str, seq: int, call: str, awaitable: Awaitable, key: Optional[Hashable]):
+        self.level = level
+        self.priority = priority
+        self.seq = seq
+        self.call = call
+        self.awaitable = awaitable
+        self.key = key
+        self.enqueued_at = time.monotonic()
+        # Chạy trong context của người gọi để timed() ghi vào đúng trace
+        self.context = contextvars.copy_context()
+        self.result = asyncio.get_running_loop().create_future()
+        # Người gọi có thể đã thôi chờ: không để lỗi thành "exception was never retrieved"
+        self.result.add_done_callback(lambda future: future.cancelled() or future.exception())
+
+    def __lt__(self, other: "_Job") -> bool:
+        return (self.level, self.seq) < (other.level, other.seq)
+
+
+def _discard(awaitable: Awaitable) -> None:
+    # Coroutine chưa chạy bị thay thế: đóng lại để không có cảnh báo "never awaited"
+    close = getattr(awaitable, "close", None)
+    if close is not None:
+        close()
+
+
+class OutboundScheduler:
+    """One gate in front of every Discord REST call the bot makes.
+
+    At most ``concurrency`` calls are in flight; when the gate is full, calls
+    wait in a priority queue (acks first, then posts and followups, then DMs
+    and edits, FIFO within a priority). ``reserved`` slots are kept for acks
+    so background work can never hold up an interaction past its deadline.
+    Calls submitted with a ``key`` (e.g. a message id for edits) are
+    coalesced: while one is still queued, a newer call with the same key
+    replaces it and every caller gets the result of the newest call. A
+    queued call is sent even if its caller stops waiting for it.
+    """
+
+    def __init__(self, concurrency: int = 32, reserved: int = 4):
+        self.concurrency = max(1, concurrency)
+        self.reserved = min(max(0, reserved), self.concurrency - 1)
+        self.active = 0
+        self._heap: List[_Job] = []
+        self._keyed: Dict[Hashable, _Job] = {}
+        self._running: Set[asyncio.Task] = set()
+        self._seq = itertools.count()
+        self._depth: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+        # Số liệu thống kê
+        self.coalesced = 0
+        self.wait_total: Dict[str, float] = {priority: 0.0 for priority in PRIORITIES}
+        self.wait_max: Dict[str, float] = {priority: 0.0 for priority in PRIORITIES}
+        self.started: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+
+    def _limit(self, level: int) -> int:
+        return self.concurrency if level == 0 else self.concurrency - self.reserved
+
+    def _record_wait(self, priority: str, waited: float) -> None:
+        self.started[priority] += 1
+        self.wait_total[priority] += waited
+        self.wait_max[priority] = max(self.wait_max[priority], waited)
+        OUTBOUND_WAIT_SECONDS.observe(waited, priority=priority)
+
+    def _dispatch(self) -> None:
+        """Start the highest-priority queued calls while slots are free"""
+        while self._heap and self.active < self._limit(self._heap[0].level):
+            job = heapq.heappop(self._heap)
+            self.active += 1
+            self._depth[job.priority] -= 1
+            if job.key is not None and self._keyed.get(job.key) is job:
+                del self._keyed[job.key]
+            self._record_wait(job.priority, time.monotonic() - job.enqueued_at)
+            task = asyncio.create_task(self._execute(job), name=f"outbound-{job.call}", context=job.context)
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _execute(self, job: _Job) -> None:
+        try:
+            result = await timed(job.call, job.awaitable)
+        except asyncio.CancelledError:
+            job.result.cancel()
+            raise
+        except BaseException as e:
+            job.result.set_exception(e)
+        else:
+            job.result.set_result(result)
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        self.active -= 1
+        self._dispatch()
+
+    async def run(self, call: str, awaitable: Awaitable[T], key: Optional[Hashable] = None) -> T:
+        """Await ``awaitable`` (a REST call named ``call``) once the scheduler grants it a slot"""
+        priority = priority_of(call)
+        level = PRIORITIES.index(priority)
+
+        queued = self._keyed.get(key) if key is not None else None
+        if queued is not None:
+            # Gộp với lời gọi cùng key đang chờ: chỉ lời gọi mới nhất được gửi
+            _discard(queued.awaitable)
+            queued.awaitable = awaitable
+            self.coalesced += 1
+            OUTBOUND_COALESCED.inc(call=call)
+            return await asyncio.shield(queued.result)
+
+        if self.active < self._limit(level) and not (self._heap and self._heap[0].level <= level):
+            # Còn slot và không có lời gọi nào ưu tiên hơn đang chờ: gửi ngay
+            self.active += 1
+            self._record_wait(priority, 0.0)
+            try:
+                return await timed(call, awaitable)
+            finally:
+                self._release()
+
+        job = _Job(level, priority, next(self._seq), call, awaitable, key)
+        heapq.heappush(self._heap, job)
+        self._depth[priority] += 1
+        if key is not None:
+            self._keyed[key] = job
+        self._dispatch()
+        return await asyncio.shield(job.result)
+
+    def depths(self) -> Dict[str, int]:
+        """Calls waiting for a slot, per priority"""
+        return dict(self._depth)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "coalesced": self.coalesced,
+            "priorities": {
+                priority: {
+                    "depth": self._depth[priority],
+                    "started": self.started[priority],
+                    "avg_wait_seconds": self.wait_total[priority] / self.started[priority] if self.started[priority] else 0.0,
+                    "max_wait_seconds": self.wait_max[priority],
+                }
+                for priority in PRIORITIES
+            },
+        }
+
+
+# Scheduler dùng chung của bot
+scheduler = OutboundScheduler(
+    concurrency=int(os.getenv("OUTBOUND_CONCURRENCY", "32")),
+    reserved=int(os.getenv("OUTBOUND_ACK_RESERVED", "4"))
+)
+
+
+def scheduled(call: str, awaitable: Awaitable[T], key: Optional[Hashable] = None) -> Awaitable[T]:
+    """Route a Discord REST call through the shared scheduler (drop-in for ``timed``)"""
+    return scheduler.run(call, awaitable, key)
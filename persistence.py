@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import tempfile
+import threading
+from typing import Awaitable, Callable, Dict, Iterable, Mapping, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def atomic_write_json(path: str, data: dict) -> None:
+    """Write JSON to path atomically (temp file in the same directory + rename)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".config-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        # Không để lại file tạm nếu ghi lỗi
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class WriteBehindWriter:
+    """Coalesce per-guild config changes and flush them off the event loop.
+
+    Handlers call ``mark_dirty(guild_id)`` after mutating ``source``. The first
+    change arms a debounce timer; when it fires, copies of every dirty entry are
+    handed to ``flush_fn`` in a worker thread. ``flush_sync`` drains whatever is
+    still pending and is meant for shutdown, after the loop has stopped.
+    """
+
+    def __init__(self, source: Mapping[str, dict], flush_fn: Callable[[Dict[str, dict]], None], delay: float = 1.0):
+        self.source = source
+        self.flush_fn = flush_fn
+        self.delay = delay
+        self._dirty: Set[str] = set()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._task: Optional[asyncio.Task] = None
+        # flush_fn chỉ được chạy bởi một luồng tại một thời điểm
+        self._write_lock = threading.Lock()
+        self.flush_count = 0
+        self.last_flush_seconds = 0.0
+        # Callback nhận thời gian mỗi lần ghi (dùng cho metrics)
+        self.on_write: Optional[Callable[[float], None]] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    def is_dirty(self, key: str) -> bool:
+        return key in self._dirty
+
+    def discard(self, keys: Iterable[str]) -> None:
+        """Forget pending changes for ``keys`` (they were replaced from outside)"""
+        self._dirty.difference_update(keys)
+
+    async def wait_idle(self) -> None:
+        """Wait for a flush that is already writing"""
+        task = self._task
+        if task is not None and not task.done() and task is not asyncio.current_task():
+            await asyncio.shield(task)
+
+    def mark_dirty(self, key: str) -> None:
+        """Record that ``source[key]`` changed and schedule a flush"""
+        self._dirty.add(key)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Không có event loop (script, test): ghi luôn
+            self.flush_sync()
+            return
+        if self._timer is None and (self._task is None or self._task.done()):
+            self._timer = loop.call_later(self.delay, self._start_flush)
+
+    def _start_flush(self) -> None:
+        self._timer = None
+        self._task = asyncio.ensure_future(self.flush())
+
+    def _take_changes(self) -> Dict[str, dict]:
+        changes = {key: dict(self.source[key]) for key in self._dirty if key in self.source}
+        self._dirty.clear()
+        return changes
+
+    def _write(self, changes: Dict[str, dict]) -> None:
+        with self._write_lock:
+            started = time.perf_counter()
+            self.flush_fn(changes)
+            self.last_flush_seconds = time.perf_counter() - started
+            self.flush_count += 1
+        if self.on_write is not None:
+            self.on_write(self.last_flush_seconds)
+
+    async def flush(self) -> None:
+        """Flush dirty entries in a worker thread"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._dirty:
+            return
+        changes = self._take_changes()
+        try:
+            await asyncio.to_thread(self._write, changes)
+            logger.debug(f"Flushed config for {len(changes)} guild(s) in {self.last_flush_seconds * 1000:.1f}ms")
+        except Exception as e:
+            logger.error(f"Error flushing config: {e}")
+            # Giữ lại các guild chưa ghi được để thử lại lần sau
+            self._dirty.update(changes)
+        # Có thay đổi mới trong lúc đang ghi thì hẹn lần ghi tiếp theo
+        if self._dirty and self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.delay, self._start_flush)
+
+    def flush_sync(self) -> None:
+        """Flush dirty entries on the calling thread (shutdown path)"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._dirty:
+            return
+        changes = self._take_changes()
+        try:
+            self._write(changes)
+        except Exception as e:
+            logger.error(f"Error flushing config: {e}")
+            self._dirty.update(changes)
+
+
+def guild_entries(data: object) -> Dict[str, dict]:
+    """The guild entries of a config.json dict (numeric id -> settings dict)"""
+    if not isinstance(data, dict):
+        return {}
+    return {
+        str(guild_id): guild_cfg
+        for guild_id, guild_cfg in data.items()
+        if str(guild_id).isdigit() and isinstance(guild_cfg, dict)
+    }
+
+
+def diff_guild_configs(old: Mapping[str, dict], new: Mapping[str, dict]) -> Tuple[Dict[str, dict], Set[str]]:
+    """Guild entries added or changed in ``new``, and guild ids that are gone"""
+    changed = {guild_id: guild_cfg for guild_id, guild_cfg in new.items() if old.get(guild_id) != guild_cfg}
+    removed = set(old) - set(new)
+    return changed, removed
+
+
+class ConfigFileWatcher:
+    """Poll a config.json file and hand the guild entries that changed to ``on_change``.
+
+    The file is checked every ``interval`` seconds by its mtime, size and
+    inode (an atomic replace changes the inode even within the same mtime
+    tick); ``stat`` and parsing run in a worker thread. Changes are diffed
+    against the last good snapshot, so a half-written or invalid file is
+    logged and skipped until the next edit.
+
+    With a ``meta`` store (anything with ``get``/``set``, e.g. ``MetaStore``)
+    the last applied snapshot is kept under ``meta_key``, so edits made while
+    the bot was stopped are applied by ``prime`` on the next start.
+    """
+
+    def __init__(self, path: str, on_change: Callable[[Dict[str, dict], Set[str]], Awaitable[None]], interval: float = 2.0,
+                 meta=None, meta_key: str = "config_json_snapshot"):
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.meta = meta
+        self.meta_key = meta_key
+        self._snapshot: Dict[str, dict] = {}
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.reloads = 0
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _read(self) -> Tuple[Optional[Tuple[int, int, int]], Optional[Dict[str, dict]]]:
+        """(signature, guild entries) of the file; entries are None when it is missing or cannot be parsed"""
+        signature = self._stat()
+        if signature is None:
+            # config.json chỉ là file import cũ: xoá hay chuyển đi không có nghĩa là xoá guild
+            return None, None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return signature, guild_entries(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable {self.path}: {e}")
+            return signature, None
+
+    def _load_snapshot(self) -> Optional[Dict[str, dict]]:
+        if self.meta is None:
+            return None
+        value = self.meta.get(self.meta_key)
+        if value is None:
+            return None
+        try:
+            return guild_entries(json.loads(value))
+        except ValueError as e:
+            logger.warning(f"Ignoring stored {self.path} snapshot: {e}")
+            return None
+
+    def _save_snapshot(self, entries: Dict[str, dict]) -> None:
+        if self.meta is not None:
+            self.meta.set(self.meta_key, json.dumps(entries, ensure_ascii=False, sort_keys=True))
+
+    async def _apply(self, entries: Dict[str, dict]) -> bool:
+        changed, removed = diff_guild_configs(self._snapshot, entries)
+        if changed or removed:
+            await self.on_change(changed, removed)
+        # Chỉ cập nhật snapshot khi áp dụng thành công: lỗi thì lần sau thử lại
+        self._snapshot = entries
+        await asyncio.to_thread(self._save_snapshot, entries)
+        if not changed and not removed:
+            return False
+        self.reloads += 1
+        logger.info(f"Applied {self.path}: {len(changed)} guild(s) changed, {len(removed)} removed")
+        return True
+
+    async def prime(self) -> bool:
+        """Start watching; applies edits made since the last applied snapshot, True when guild entries changed.
+
+        Without a stored snapshot (first start, or no ``meta``) the current
+        file is taken as the baseline: its content was just imported.
+        """
+        signature, entries = await asyncio.to_thread(self._read)
+        stored = await asyncio.to_thread(self._load_snapshot)
+        if stored is None:
+            self._snapshot = entries or {}
+            if entries is not None:
+                await asyncio.to_thread(self._save_snapshot, entries)
+            self._signature = signature
+            return False
+        self._snapshot = stored
+        if entries is None:
+            self._signature = signature
+            return False
+        try:
+            applied = await self._apply(entries)
+        except Exception as e:
+            # Để _signature là None: vòng kiểm tra sẽ áp dụng lại
+            logger.error(f"Error applying {self.path}: {e}")
+            return False
+        self._signature = signature
+        return applied
+
+    async def check(self) -> bool:
+        """Apply the file if it changed since the last check; True when guild entries changed"""
+        if await asyncio.to_thread(self._stat) == self._signature:
+            return False
+        signature, entries = await asyncio.to_thread(self._read)
+        self._signature = signature
+        if entries is None:
+            return False
+        return await self._apply(entries)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                self._signature = None
+                logger.error(f"Error applying {self.path}: {e}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="config-file-watcher")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
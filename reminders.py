@@ -0,0 +1,137 @@
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+from metrics import REMINDERS_SENT
+from storage import PendingVouch, ReminderStore
+
+logger = logging.getLogger(__name__)
+
+DelaysFor = Callable[[int], Sequence[float]]
+VouchGetter = Callable[[int], Optional[PendingVouch]]
+SendReminder = Callable[[PendingVouch, int], Awaitable[None]]
+
+
+def parse_delays(value: str) -> List[float]:
+    """Reminder delays in seconds from a comma-separated list of hours, e.g. "24,72" """
+    return [float(part) * 3600 for part in value.split(",") if part.strip()]
+
+
+def limit_delays(delays: Sequence[float], limit: Optional[int]) -> List[float]:
+    """The first ``limit`` delays; past the end the last delay repeats"""
+    if limit is None:
+        return list(delays)
+    if not delays:
+        return []
+    return list(delays[:limit]) + [delays[-1]] * max(0, limit - len(delays))
+
+
+class ReminderScheduler:
+    """Re-DM buyers who have not rated their vouch yet.
+
+    ``delays_for(guild_id)`` gives a guild's delays: reminder ``n`` is due
+    ``delays[n - 1]`` seconds after the vouch (n = 1) or after the previous
+    reminder, and a guild gets at most ``len(delays)`` reminders per vouch.
+    Pending reminders live in ``ReminderStore``; the loop wakes for the
+    earliest one, handles what is due in batches of ``batch_size`` and never
+    sleeps longer than ``max_sleep``, so it picks up reminders added by other
+    processes and after a restart.
+    """
+
+    def __init__(self, store: ReminderStore, get_vouch: VouchGetter, delays_for: DelaysFor, send: SendReminder,
+                 batch_size: int = 200, max_sleep: float = 60.0, clock: Callable[[], float] = time.time):
+        self.store = store
+        self.get_vouch = get_vouch
+        self.delays_for = delays_for
+        self.send = send
+        self.batch_size = batch_size
+        self.max_sleep = max_sleep
+        self.clock = clock
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._wake_at: Optional[float] = None
+        # Số liệu thống kê
+        self.sent = 0
+        self.dropped = 0
+
+    def first_due(self, guild_id: int) -> Optional[float]:
+        """When a new vouch's first reminder is due, or None if the guild has reminders off"""
+        delays = self.delays_for(guild_id)
+        return self.clock() + delays[0] if delays else None
+
+    def wake(self, due_at: Optional[float]) -> None:
+        """Make the loop look again if ``due_at`` is earlier than it planned to"""
+        if due_at is not None and (self._wake_at is None or due_at < self._wake_at):
+            self._wakeup.set()
+
+    def _load_due(self, now: float) -> List[Tuple[Tuple[int, int, int], Optional[PendingVouch]]]:
+        return [(row, self.get_vouch(row[0])) for row in self.store.due(now, self.batch_size)]
+
+    def _claim(self, claims: List[Tuple[int, int, Optional[float]]]) -> List[bool]:
+        return [self.store.advance(vouch_id, attempt, next_due) for vouch_id, attempt, next_due in claims]
+
+    async def run_once(self) -> int:
+        """Handle one batch of due reminders; returns how many were due"""
+        now = self.clock()
+        due = await asyncio.to_thread(self._load_due, now)
+        if not due:
+            return 0
+        claims = []
+        to_send = []
+        for (vouch_id, guild_id, attempt), vouch_record in due:
+            delays = self.delays_for(guild_id)
+            if vouch_record is None or vouch_record.rated_at is not None or attempt >= len(delays):
+                # Đã đánh giá, vouch không còn, hoặc guild đã giảm giới hạn: bỏ nhắc
+                claims.append((vouch_id, attempt, None))
+                to_send.append(None)
+                self.dropped += 1
+                continue
+            next_due = now + delays[attempt + 1] if attempt + 1 < len(delays) else None
+            claims.append((vouch_id, attempt, next_due))
+            to_send.append(vouch_record)
+        claimed = await asyncio.to_thread(self._claim, claims)
+        for vouch_record, won, (_, attempt, _) in zip(to_send, claimed, claims):
+            if vouch_record is None or not won:
+                continue
+            try:
+                await self.send(vouch_record, attempt + 1)
+                self.sent += 1
+                REMINDERS_SENT.inc()
+            except Exception as e:
+                logger.error(f"Error sending rating reminder for vouch {vouch_record.id}: {e}")
+        return len(due)
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            self._wake_at = None
+            next_due = None
+            try:
+                if await self.run_once() >= self.batch_size:
+                    # Còn nhắc nhở đến hạn: xử lý batch tiếp ngay
+                    await asyncio.sleep(0)
+                    continue
+                next_due = await asyncio.to_thread(self.store.next_due)
+            except Exception as e:
+                logger.error(f"Error in reminder scheduler: {e}")
+            delay = self.max_sleep if next_due is None else min(max(0.0, next_due - self.clock()), self.max_sleep)
+            self._wake_at = self.clock() + delay
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="reminder-scheduler")
+            logger.info("Reminder scheduler started")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
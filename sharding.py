@@ -0,0 +1,80 @@
+import os
+import logging
+from typing import Dict, List, Optional
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+
+def parse_shard_ids(value: str) -> Optional[List[int]]:
+    """Parse ``"0,1,2"`` or ``"0-3"`` (or a mix like ``"0-1,4"``); empty means all shards"""
+    value = (value or "").strip()
+    if not value:
+        return None
+    shard_ids: List[int] = []
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = (int(bound) for bound in part.split("-", 1))
+            if end < start:
+                raise ValueError(f"invalid shard range: {part}")
+            shard_ids.extend(range(start, end + 1))
+        else:
+            shard_ids.append(int(part))
+    return sorted(set(shard_ids))
+
+
+def split_shards(shard_count: int, workers: int) -> List[List[int]]:
+    """Split shard ids 0..shard_count-1 into ``workers`` contiguous, nearly equal ranges"""
+    workers = max(1, min(workers, shard_count))
+    base, extra = divmod(shard_count, workers)
+    ranges: List[List[int]] = []
+    start = 0
+    for index in range(workers):
+        size = base + (1 if index < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+def format_shard_ids(shard_ids: List[int]) -> str:
+    return ",".join(str(shard_id) for shard_id in shard_ids)
+
+
+# --- Cấu hình shard của process hiện tại (do launcher.py truyền xuống qua env) ---
+SHARD_COUNT: Optional[int] = int(os.getenv('SHARD_COUNT', '0')) or None
+SHARD_IDS: Optional[List[int]] = parse_shard_ids(os.getenv('SHARD_IDS', ''))
+SHARDED = bool(SHARD_COUNT or SHARD_IDS) or os.getenv('SHARDED', '').lower() in ('1', 'true', 'yes')
+
+
+class ShardTracker:
+    """Per-shard readiness, fed by the bot's shard events"""
+
+    def __init__(self):
+        self.ready: Dict[int, bool] = {}
+
+    def mark(self, shard_id: Optional[int], ready: bool) -> None:
+        self.ready[shard_id or 0] = ready
+
+    def status(self, bot: discord.Client) -> Dict[int, dict]:
+        """Latency (seconds, None while unknown) and readiness of every shard this process runs"""
+        if isinstance(bot, discord.AutoShardedClient):
+            shards = {
+                shard_id: (info.latency, self.ready.get(shard_id, False) and not info.is_closed())
+                for shard_id, info in bot.shards.items()
+            }
+            # Shard chưa kết nối vẫn được báo là chưa sẵn sàng
+            for shard_id in bot.shard_ids or ():
+                shards.setdefault(shard_id, (float("nan"), False))
+        else:
+            shards = {bot.shard_id or 0: (bot.latency, bot.is_ready() and not bot.is_closed())}
+        return {
+            shard_id: {
+                "latency": latency if latency == latency and latency != float("inf") else None,
+                "ready": ready,
+            }
+            for shard_id, (latency, ready) in sorted(shards.items())
+        }
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Đo thời gian khởi động của bot theo từng giai đoạn, tính từ lúc process bắt đầu.
+
+vouch_bot1.py gọi ``profiler.mark(...)`` ở mỗi giai đoạn (import, logging,
+store, login, setup_hook, ready, sync, interaction đầu tiên). Module này chỉ
+dùng thư viện chuẩn để có thể import trước discord.py.
+
+Chạy:
+  python startup.py            # đo các giai đoạn khi import vouch_bot1 (không kết nối Discord)
+  python startup.py --imports  # bảng thời gian import theo module (python -X importtime)
+  python startup.py --check    # so với startup_budget.json, exit 1 nếu vượt
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_budget.json")
+
+
+def process_start_time() -> Optional[float]:
+    """Wall-clock time the current process started (Linux /proc), None if unknown"""
+    try:
+        with open("/proc/self/stat", encoding="ascii") as f:
+            # Tên lệnh có thể chứa dấu cách: lấy phần sau dấu ')' cuối cùng
+            fields = f.read().rsplit(")", 1)[1].split()
+        # starttime tính bằng tick kể từ lúc boot, so với CLOCK_BOOTTIME hiện tại
+        started_after_boot = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        age = time.clock_gettime(time.CLOCK_BOOTTIME) - started_after_boot
+        return time.time() - age
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class StartupProfiler:
+    """Timestamps of the startup phases, relative to process start"""
+
+    def __init__(self):
+        started = process_start_time()
+        now = time.time()
+        # /proc chỉ chính xác tới 10ms; không được muộn hơn lúc module này được import
+        self.origin = started if started is not None and started <= now else now
+        self.phases: List[Tuple[str, float]] = [("interpreter", now - self.origin)]
+        self._seen = {"interpreter"}
+        self.enabled = "--profile-startup" in sys.argv or os.getenv("STARTUP_PROFILE", "").lower() in ("1", "true", "yes")
+
+    def mark(self, phase: str) -> float:
+        """Record ``phase`` as finished now; returns seconds since process start"""
+        elapsed = time.time() - self.origin
+        self.phases.append((phase, elapsed))
+        self._seen.add(phase)
+        return elapsed
+
+    def mark_once(self, phase: str) -> None:
+        """Record ``phase`` the first time only, logging the report when profiling is on"""
+        if phase in self._seen:
+            return
+        self.mark(phase)
+        if self.enabled:
+            self.log()
+
+    def has(self, phase: str) -> bool:
+        return phase in self._seen
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """``{phase: {"at": seconds since start, "took": seconds since previous phase}}``"""
+        result: Dict[str, Dict[str, float]] = {}
+        previous = 0.0
+        for name, elapsed in self.phases:
+            result[name] = {"at": round(elapsed, 4), "took": round(elapsed - previous, 4)}
+            previous = elapsed
+        return result
+
+    def log(self) -> None:
+        lines = ", ".join(f"{name}={info['took'] * 1000:.0f}ms" for name, info in self.report().items())
+        logger.info(f"Startup phases (total {self.phases[-1][1] * 1000:.0f}ms): {lines}")
+        path = os.getenv("STARTUP_REPORT")
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.report(), f, indent=4)
+
+
+profiler = StartupProfiler()
+
+
+def import_time_breakdown(module: str = "vouch_bot1", top: int = 20) -> List[Tuple[str, float, float]]:
+    """Run ``python -X importtime -c "import module"`` and return (module, self s, cumulative s), slowest first"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if self_us.isdigit():
+            rows.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return rows[:top]
+
+
+def measure_import_phases() -> Dict[str, Dict[str, float]]:
+    """Import vouch_bot1 in a fresh interpreter and return its phase report"""
+    code = "import json, startup, vouch_bot1; print(json.dumps(startup.profiler.report()))"
+    env = dict(os.environ, LOG_LEVEL="WARNING")
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def check_budget(report: Dict[str, Dict[str, float]], budget: Dict[str, float]) -> List[str]:
+    """Return the phases whose duration (``took``) exceeds the budget; ``total`` checks the last phase"""
+    over = []
+    for phase, limit in budget.items():
+        if phase == "total":
+            value = max(info["at"] for info in report.values())
+        elif phase in report:
+            value = report[phase]["took"]
+        else:
+            continue
+        if value > limit:
+            over.append(f"{phase}: {value * 1000:.0f}ms > {limit * 1000:.0f}ms")
+    return over
+
+
+def load_budget(path: str = BUDGET_FILE) -> Dict[str, float]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="VouchBot cold-start profiler")
+    parser.add_argument("--imports", action="store_true", help="show the slowest imports (python -X importtime)")
+    parser.add_argument("--check", action="store_true", help="compare against startup_budget.json")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.imports:
+        print(f"📦 Import chậm nhất của vouch_bot1 (top {args.top}):")
+        print(f"   {'module':<45} {'self (ms)':>10} {'tổng (ms)':>10}")
+        for name, self_seconds, cumulative in import_time_breakdown(top=args.top):
+            print(f"   {name:<45} {self_seconds * 1000:>10.1f} {cumulative * 1000:>10.1f}")
+        return 0
+
+    report = measure_import_phases()
+    print("⏱️  Các giai đoạn khởi động (tới khi module vouch_bot1 import xong):")
+    for phase, info in report.items():
+        print(f"   {phase:<15} +{info['took'] * 1000:7.1f}ms  (t={info['at'] * 1000:7.1f}ms)")
+    if args.check:
+        over = check_budget(report, load_budget())
+        for line in over:
+            print(f"❌ Vượt budget: {line}")
+        if over:
+            return 1
+        print("✅ Trong budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,723 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from logging_setup import SAMPLED
+from persistence import WriteBehindWriter, guild_entries
+
+logger = logging.getLogger(__name__)
+
+# --- File database dùng chung cho các store ---
+DATABASE_FILE = os.getenv('DATABASE_FILE', 'vouchbot.db')
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open a SQLite connection in WAL mode, usable from worker threads"""
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+class MetaStore:
+    """Small key/value table for bot bookkeeping (command tree hash, import markers, ...)"""
+
+    def __init__(self, path: str = DATABASE_FILE):
+        self.path = path
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else default
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class GuildConfigStore:
+    """Per-guild settings stored as one SQLite row per guild.
+
+    Behaves like the old ``config`` dict for the handlers: ``get`` and
+    ``__getitem__`` answer from an in-process cache filled lazily per guild
+    (guilds with no settings are cached as misses, so unconfigured guilds do
+    not query SQLite on every interaction), and ``__setitem__`` updates the cache and schedules a write-behind flush
+    of just that guild's row.
+
+    Several processes (launcher workers) may share the database. Every write
+    bumps ``config_version`` in the meta table; at most every
+    ``refresh_interval`` seconds the store checks ``PRAGMA data_version`` and,
+    if another connection changed the config, drops its cache (keeping local
+    changes that are not flushed yet) and calls ``on_reload``.
+
+    Reads that run on the event loop (version checks, cache misses) use a
+    separate query-only connection with its own lock: in WAL mode they never
+    wait for a flush in progress or for another process holding the write lock.
+    """
+
+    def __init__(self, path: str = DATABASE_FILE, flush_delay: float = 1.0, refresh_interval: float = 1.0):
+        self.path = path
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        # None = guild không có config (cache cả lần đọc trượt)
+        self._cache: Dict[str, Optional[dict]] = {}
+        self.refresh_interval = refresh_interval
+        self._checked_at = 0.0
+        self._data_version: Optional[int] = None
+        self._config_version: Optional[str] = None
+        # Callback khi cache bị xoá do process khác ghi config (vd: xoá cache template)
+        self.on_reload: Optional[Callable[[], None]] = None
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS guild_config ("
+                " guild_id INTEGER PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # Connection chỉ đọc: không dùng chung lock với write_many (BEGIN IMMEDIATE)
+        self._reader = connect(path)
+        self._reader.execute("PRAGMA query_only=ON")
+        self._read_lock = threading.Lock()
+        self.writer = WriteBehindWriter(self, self.write_many, delay=flush_delay)
+        self._check_external_changes(force=True)
+
+    # --- Đồng bộ giữa các process ---
+    def _read_versions(self):
+        with self._read_lock:
+            data_version = self._reader.execute("PRAGMA data_version").fetchone()[0]
+            row = self._reader.execute("SELECT value FROM meta WHERE key = 'config_version'").fetchone()
+        return data_version, row[0] if row is not None else None
+
+    def _check_external_changes(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = now
+        with self._read_lock:
+            data_version = self._reader.execute("PRAGMA data_version").fetchone()[0]
+        # data_version chỉ đổi khi connection khác commit (kể cả vouch/rating):
+        # chỉ đọc config_version khi có commit mới
+        if data_version == self._data_version:
+            return
+        data_version, config_version = self._read_versions()
+        changed = self._data_version is not None and config_version != self._config_version
+        self._data_version, self._config_version = data_version, config_version
+        if changed:
+            self.reload()
+
+    def reload(self) -> None:
+        """Drop cached guilds (except unflushed local changes) so the next read hits SQLite"""
+        for guild_id in list(self._cache):
+            if not self.writer.is_dirty(guild_id):
+                self._cache.pop(guild_id, None)
+        logger.info("Guild config changed by another process, cache reloaded")
+        if self.on_reload is not None:
+            self.on_reload()
+
+    # --- Giao diện giống dict ---
+    def _load(self, guild_id: str) -> Optional[dict]:
+        self._check_external_changes()
+        if guild_id in self._cache:
+            return self._cache[guild_id]
+        try:
+            key = int(guild_id)
+        except ValueError:
+            return None
+        with self._read_lock:
+            row = self._reader.execute("SELECT data FROM guild_config WHERE guild_id = ?", (key,)).fetchone()
+        if row is None:
+            self._cache[guild_id] = None
+            return None
+        guild_cfg = json.loads(row[0])
+        self._cache[guild_id] = guild_cfg
+        return guild_cfg
+
+    def get(self, guild_id: str, default: Optional[dict] = None) -> Optional[dict]:
+        guild_cfg = self._load(guild_id)
+        return default if guild_cfg is None else guild_cfg
+
+    def __getitem__(self, guild_id: str) -> dict:
+        guild_cfg = self._load(guild_id)
+        if guild_cfg is None:
+            raise KeyError(guild_id)
+        return guild_cfg
+
+    def __contains__(self, guild_id: object) -> bool:
+        return isinstance(guild_id, str) and self._load(guild_id) is not None
+
+    def __setitem__(self, guild_id: str, guild_cfg: dict) -> None:
+        self._cache[guild_id] = guild_cfg
+        self.writer.mark_dirty(guild_id)
+
+    def __len__(self) -> int:
+        with self._read_lock:
+            return self._reader.execute("SELECT COUNT(*) FROM guild_config").fetchone()[0]
+
+    def __iter__(self) -> Iterator[str]:
+        with self._read_lock:
+            rows = self._reader.execute("SELECT guild_id FROM guild_config").fetchall()
+        return iter([str(row[0]) for row in rows])
+
+    # --- Ghi xuống SQLite ---
+    def write_many(self, changes: Dict[str, dict], removed: Iterable[str] = ()) -> None:
+        """Upsert the given guild rows (and delete ``removed``) in a single transaction (thread-safe)"""
+        now = time.time()
+        rows = [
+            (int(guild_id), json.dumps(guild_cfg, ensure_ascii=False), now)
+            for guild_id, guild_cfg in changes.items()
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO guild_config (guild_id, data, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(guild_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                    rows
+                )
+                deleted = [(int(guild_id),) for guild_id in removed]
+                if deleted:
+                    self._conn.executemany("DELETE FROM guild_config WHERE guild_id = ?", deleted)
+                # Báo cho các process khác biết config đã đổi
+                self._conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('config_version', '1') "
+                    "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+                )
+                self._config_version = self._conn.execute("SELECT value FROM meta WHERE key = 'config_version'").fetchone()[0]
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        logger.info(f"Configuration saved for {len(rows)} guild(s)", extra=SAMPLED)
+
+    async def apply_external(self, changes: Dict[str, dict], removed: Iterable[str] = ()) -> None:
+        """Replace guild entries edited outside the bot (config.json) in one transaction.
+
+        The outside edit wins over unflushed local changes to the same guilds.
+        The cache is swapped in one step on the event loop, so a handler sees
+        either the old or the new settings of a guild, never a mix.
+        """
+        removed = set(removed)
+        self.writer.discard(set(changes) | removed)
+        # Lần ghi đang chạy (bản cũ) phải xong trước, không được đè lên bản mới
+        await self.writer.wait_idle()
+        await asyncio.to_thread(self.write_many, changes, removed)
+        for guild_id in removed:
+            self._cache.pop(guild_id, None)
+        self._cache.update({guild_id: dict(guild_cfg) for guild_id, guild_cfg in changes.items()})
+
+    async def flush(self) -> None:
+        await self.writer.flush()
+
+    def flush_sync(self) -> None:
+        self.writer.flush_sync()
+
+    # --- Nhập dữ liệu từ config.json cũ ---
+    @property
+    def json_imported(self) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM meta WHERE key = 'config_json_imported'").fetchone()
+        return row is not None
+
+    def import_json(self, data: dict) -> int:
+        """One-shot import of a legacy config.json dict; returns the number of guilds imported"""
+        if self.json_imported:
+            return 0
+        changes = guild_entries(data)
+        if changes:
+            self.write_many(changes)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('config_json_imported', ?)",
+                (str(time.time()),)
+            )
+        self._cache.clear()
+        logger.info(f"Imported {len(changes)} guild(s) from config.json")
+        return len(changes)
+
+    def close(self) -> None:
+        self.flush_sync()
+        with self._read_lock:
+            self._reader.close()
+        with self._lock:
+            self._conn.close()
+
+
+class PendingVouch:
+    """Compact in-memory record of one vouch, only materialized while a click is handled"""
+
+    __slots__ = ("id", "guild_id", "buyer_id", "quantity", "product", "price", "channel_id", "message_id", "created_at", "rated_at")
+
+    def __init__(self, id: int, guild_id: int, buyer_id: int, quantity: int, product: str, price: str,
+                 channel_id: int, message_id: Optional[int], created_at: float, rated_at: Optional[float]):
+        self.id = id
+        self.guild_id = guild_id
+        self.buyer_id = buyer_id
+        self.quantity = quantity
+        self.product = product
+        self.price = price
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.created_at = created_at
+        self.rated_at = rated_at
+
+    def __repr__(self) -> str:
+        return f"<PendingVouch id={self.id} buyer_id={self.buyer_id} product={self.product!r}>"
+
+
+_VOUCH_COLUMNS = "id, guild_id, buyer_id, quantity, product, price, channel_id, message_id, created_at, rated_at"
+
+
+class VouchStore:
+    """Pending vouch state (buyer, order, message) persisted so star buttons survive restarts"""
+
+    def __init__(self, path: str = DATABASE_FILE):
+        self.path = path
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS vouches ("
+                " id INTEGER PRIMARY KEY,"
+                " guild_id INTEGER NOT NULL,"
+                " buyer_id INTEGER NOT NULL,"
+                " quantity INTEGER NOT NULL,"
+                " product TEXT NOT NULL,"
+                " price TEXT NOT NULL,"
+                " channel_id INTEGER NOT NULL,"
+                " message_id INTEGER,"
+                " created_at REAL NOT NULL,"
+                " rated_at REAL)"
+            )
+            self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_vouches_message ON vouches (message_id)")
+
+    def add(self, guild_id: int, buyer_id: int, quantity: int, product: str, price: str, channel_id: int, message_id: Optional[int] = None) -> int:
+        """Persist a new vouch and return its id"""
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO vouches (guild_id, buyer_id, quantity, product, price, channel_id, message_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (guild_id, buyer_id, quantity, product, price, channel_id, message_id, time.time())
+            )
+            return cur.lastrowid
+
+    def set_message(self, vouch_id: int, message_id: int) -> None:
+        """Attach the posted message id once the vouch message has been sent"""
+        with self._lock:
+            self._conn.execute("UPDATE vouches SET message_id = ? WHERE id = ?", (message_id, vouch_id))
+
+    def get(self, vouch_id: int) -> Optional[PendingVouch]:
+        """Return the vouch with the given id, or None"""
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_VOUCH_COLUMNS} FROM vouches WHERE id = ?", (vouch_id,)).fetchone()
+        return PendingVouch(*row) if row is not None else None
+
+    def get_by_message(self, message_id: int) -> Optional[PendingVouch]:
+        """Return the vouch posted as ``message_id``, or None"""
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_VOUCH_COLUMNS} FROM vouches WHERE message_id = ?", (message_id,)).fetchone()
+        return PendingVouch(*row) if row is not None else None
+
+    def mark_rated(self, vouch_id: int) -> bool:
+        """Mark the vouch rated; False when it already was (a repeated submit)"""
+        with self._lock:
+            cur = self._conn.execute("UPDATE vouches SET rated_at = ? WHERE id = ? AND rated_at IS NULL", (time.time(), vouch_id))
+            return cur.rowcount > 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RatingStore:
+    """Every star rating plus running per-guild and per-product aggregates.
+
+    Aggregates are updated in the same transaction as the rating insert, so
+    ``get_stats`` reads a single row whatever the number of ratings.
+    Guild-wide totals are kept under the empty product key.
+    """
+
+    def __init__(self, path: str = DATABASE_FILE):
+        self.path = path
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ratings ("
+                " id INTEGER PRIMARY KEY,"
+                " guild_id INTEGER NOT NULL,"
+                " vouch_id INTEGER,"
+                " buyer_id INTEGER NOT NULL,"
+                " product TEXT NOT NULL,"
+                " stars INTEGER NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rating_stats ("
+                " guild_id INTEGER NOT NULL,"
+                " product_key TEXT NOT NULL,"
+                " count INTEGER NOT NULL DEFAULT 0,"
+                " total INTEGER NOT NULL DEFAULT 0,"
+                " s1 INTEGER NOT NULL DEFAULT 0,"
+                " s2 INTEGER NOT NULL DEFAULT 0,"
+                " s3 INTEGER NOT NULL DEFAULT 0,"
+                " s4 INTEGER NOT NULL DEFAULT 0,"
+                " s5 INTEGER NOT NULL DEFAULT 0,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (guild_id, product_key))"
+            )
+
+    @staticmethod
+    def product_key(product: str) -> str:
+        return " ".join(product.lower().split())
+
+    def record(self, guild_id: int, vouch_id: Optional[int], buyer_id: int, product: str, stars: int) -> None:
+        """Store one rating and bump the guild and product aggregates"""
+        if not 1 <= stars <= 5:
+            raise ValueError(f"stars must be between 1 and 5, got {stars}")
+        now = time.time()
+        bucket = f"s{stars}"
+        upsert = (
+            f"INSERT INTO rating_stats (guild_id, product_key, count, total, {bucket}, updated_at) VALUES (?, ?, 1, ?, 1, ?) "
+            f"ON CONFLICT(guild_id, product_key) DO UPDATE SET count = count + 1, total = total + excluded.total, "
+            f"{bucket} = {bucket} + 1, updated_at = excluded.updated_at"
+        )
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO ratings (guild_id, vouch_id, buyer_id, product, stars, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (guild_id, vouch_id, buyer_id, product, stars, now)
+                )
+                self._conn.executemany(upsert, [
+                    (guild_id, "", stars, now),
+                    (guild_id, self.product_key(product), stars, now),
+                ])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get_stats(self, guild_id: int, product: Optional[str] = None) -> Optional[dict]:
+        """Return count, sum, average, histogram and last update for a guild or one of its products"""
+        key = self.product_key(product) if product else ""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT count, total, s1, s2, s3, s4, s5, updated_at FROM rating_stats WHERE guild_id = ? AND product_key = ?",
+                (guild_id, key)
+            ).fetchone()
+        if row is None:
+            return None
+        count, total = row[0], row[1]
+        return {
+            "count": count,
+            "sum": total,
+            "average": total / count if count else 0.0,
+            "histogram": {stars: row[1 + stars] for stars in range(1, 6)},
+            "updated_at": row[7],
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class HistoryEvent:
+    """One row of a guild's vouch/feedback history"""
+
+    __slots__ = ("id", "guild_id", "kind", "vouch_id", "buyer_id", "staff_id", "product", "quantity", "price", "stars", "feedback", "created_at")
+
+    def __init__(self, id: int, guild_id: int, kind: str, vouch_id: Optional[int], buyer_id: int, staff_id: Optional[int],
+                 product: str, quantity: Optional[int], price: Optional[str], stars: Optional[int], feedback: Optional[str],
+                 created_at: float):
+        self.id = id
+        self.guild_id = guild_id
+        self.kind = kind
+        self.vouch_id = vouch_id
+        self.buyer_id = buyer_id
+        self.staff_id = staff_id
+        self.product = product
+        self.quantity = quantity
+        self.price = price
+        self.stars = stars
+        self.feedback = feedback
+        self.created_at = created_at
+
+    def __repr__(self) -> str:
+        return f"<HistoryEvent id={self.id} kind={self.kind} buyer_id={self.buyer_id} product={self.product!r}>"
+
+
+_HISTORY_COLUMNS = "id, guild_id, kind, vouch_id, buyer_id, staff_id, product, quantity, price, stars, feedback, created_at"
+
+
+class HistoryStore:
+    """Append-only log of every vouch and feedback, for lookups by buyer, product and time.
+
+    Pages are read by keyset on the event id (ids grow with time): each page
+    is one range scan of an index on ``(guild_id, <filter>, id)``, so the
+    cost does not depend on how deep the page is or how long the history is.
+    On first use the log is backfilled from the ``vouches`` and ``ratings``
+    tables.
+    """
+
+    def __init__(self, path: str = DATABASE_FILE):
+        self.path = path
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        with self._lock:
+            # Trong transaction: khi nhiều worker cùng khởi động chỉ một worker backfill
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                exists = self._conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history'").fetchone()
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS history ("
+                    " id INTEGER PRIMARY KEY,"
+                    " guild_id INTEGER NOT NULL,"
+                    " kind TEXT NOT NULL,"
+                    " vouch_id INTEGER,"
+                    " buyer_id INTEGER NOT NULL,"
+                    " staff_id INTEGER,"
+                    " product TEXT NOT NULL,"
+                    " product_key TEXT NOT NULL,"
+                    " quantity INTEGER,"
+                    " price TEXT,"
+                    " stars INTEGER,"
+                    " feedback TEXT,"
+                    " created_at REAL NOT NULL)"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_history_guild ON history (guild_id, id)")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_history_buyer ON history (guild_id, buyer_id, id)")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_history_product ON history (guild_id, product_key, id)")
+                self._conn.execute("CREATE INDEX IF NOT EXISTS idx_history_time ON history (guild_id, created_at)")
+                if exists is None:
+                    self._backfill()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _backfill(self) -> None:
+        # Dữ liệu có từ trước khi có bảng history: vouch và đánh giá, theo thứ tự thời gian
+        tables = {row[0] for row in self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        events = []
+        if "vouches" in tables:
+            events += [
+                (guild_id, "vouch", vouch_id, buyer_id, None, product, RatingStore.product_key(product), quantity, price, None, None, created_at)
+                for vouch_id, guild_id, buyer_id, quantity, product, price, created_at in self._conn.execute(
+                    "SELECT id, guild_id, buyer_id, quantity, product, price, created_at FROM vouches"
+                )
+            ]
+        if "ratings" in tables:
+            events += [
+                (guild_id, "feedback", vouch_id, buyer_id, None, product, RatingStore.product_key(product), None, None, stars, None, created_at)
+                for guild_id, vouch_id, buyer_id, product, stars, created_at in self._conn.execute(
+                    "SELECT guild_id, vouch_id, buyer_id, product, stars, created_at FROM ratings"
+                )
+            ]
+        events.sort(key=lambda event: event[-1])
+        self._insert(events)
+        if events:
+            logger.info(f"Backfilled {len(events)} history event(s)")
+
+    def _insert(self, events) -> None:
+        self._conn.executemany(
+            "INSERT INTO history (guild_id, kind, vouch_id, buyer_id, staff_id, product, product_key, quantity, price, stars, feedback, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            events
+        )
+
+    def record_vouch(self, guild_id: int, vouch_id: int, buyer_id: int, staff_id: Optional[int], product: str, quantity: int, price: str) -> None:
+        with self._lock:
+            self._insert([(guild_id, "vouch", vouch_id, buyer_id, staff_id, product, RatingStore.product_key(product), quantity, price, None, None, time.time())])
+
+    def record_feedback(self, guild_id: int, vouch_id: int, buyer_id: int, product: str, quantity: Optional[int], price: Optional[str],
+                        stars: int, feedback: str) -> None:
+        with self._lock:
+            self._insert([(guild_id, "feedback", vouch_id, buyer_id, None, product, RatingStore.product_key(product), quantity, price, stars, feedback, time.time())])
+
+    def page(self, guild_id: int, buyer_id: Optional[int] = None, product: Optional[str] = None,
+             before: Optional[int] = None, after: Optional[int] = None, limit: int = 10) -> Tuple[List[HistoryEvent], bool, bool]:
+        """One page of events, newest first: ``(events, has_older, has_newer)``.
+
+        ``before`` continues to older events than that id, ``after`` goes back
+        to newer ones; with neither, the newest page is returned.
+        """
+        where = ["guild_id = ?"]
+        params: list = [guild_id]
+        if buyer_id is not None:
+            where.append("buyer_id = ?")
+            params.append(buyer_id)
+        if product:
+            where.append("product_key = ?")
+            params.append(RatingStore.product_key(product))
+        if after is not None:
+            where.append("id > ?")
+            params.append(after)
+        elif before is not None:
+            where.append("id < ?")
+            params.append(before)
+        order = "ASC" if after is not None else "DESC"
+        params.append(limit + 1)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_HISTORY_COLUMNS} FROM history WHERE {' AND '.join(where)} ORDER BY id {order} LIMIT ?",
+                params
+            ).fetchall()
+        more = len(rows) > limit
+        events = [HistoryEvent(*row) for row in rows[:limit]]
+        if after is not None:
+            # Đọc theo chiều tăng để dùng index, rồi đảo lại thành mới nhất trước
+            events.reverse()
+            return events, True, more
+        return events, more, before is not None
+
+    def _id_range(self, guild_id: int, since: Optional[float], until: Optional[float]) -> Tuple[Optional[int], Optional[int]]:
+        """Smallest and largest event id of a guild within [since, until), from idx_history_time"""
+        where = ["guild_id = ?"]
+        params: list = [guild_id]
+        if since is not None:
+            where.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("created_at < ?")
+            params.append(until)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT MIN(id), MAX(id) FROM history INDEXED BY idx_history_time WHERE {' AND '.join(where)}", params
+            ).fetchone()
+        return row[0], row[1]
+
+    def iter_events(self, guild_id: Optional[int] = None, since: Optional[float] = None, until: Optional[float] = None,
+                    product: Optional[str] = None, batch_size: int = 1000) -> Iterator[HistoryEvent]:
+        """Every matching event, oldest first, read in keyset batches of ``batch_size``.
+
+        Only one batch is held at a time and the lock is released between
+        batches, so an export of any size neither grows memory nor blocks
+        writers for long. ``until`` is exclusive.
+        """
+        where = []
+        params: list = []
+        last_id = 0
+        if guild_id is not None:
+            where.append("guild_id = ?")
+            params.append(guild_id)
+        if since is not None or until is not None:
+            # "+created_at": lọc theo thời gian trên từng dòng, còn thứ tự đọc
+            # đi theo index có id (tránh sắp xếp lại cả khoảng ngày mỗi batch)
+            if since is not None:
+                where.append("+created_at >= ?")
+                params.append(since)
+            if until is not None:
+                where.append("+created_at < ?")
+                params.append(until)
+            if guild_id is not None:
+                first_id, end_id = self._id_range(guild_id, since, until)
+                if first_id is None:
+                    return
+                last_id = first_id - 1
+                where.append("id <= ?")
+                params.append(end_id)
+        if product:
+            where.append("product_key = ?")
+            params.append(RatingStore.product_key(product))
+        where.append("id > ?")
+        sql = f"SELECT {_HISTORY_COLUMNS} FROM history WHERE {' AND '.join(where)} ORDER BY id LIMIT ?"
+        while True:
+            with self._lock:
+                rows = self._conn.execute(sql, params + [last_id, batch_size]).fetchall()
+            for row in rows:
+                yield HistoryEvent(*row)
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ReminderStore:
+    """Pending rating reminders, one row per unrated vouch, ordered by due time.
+
+    The ``due_at`` index is the scheduler's heap: the next reminder and the
+    batch that is due are index lookups, so only a batch is ever held in
+    memory however many reminders are pending. A row is advanced or deleted
+    only if its ``attempt`` is unchanged, so when several processes share the
+    database each reminder is sent once.
+    """
+
+    def __init__(self, path: str = DATABASE_FILE):
+        self.path = path
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS reminders ("
+                " vouch_id INTEGER PRIMARY KEY,"
+                " guild_id INTEGER NOT NULL,"
+                " due_at REAL NOT NULL,"
+                " attempt INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_reminders_due ON reminders (due_at)")
+
+    def add(self, vouch_id: int, guild_id: int, due_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reminders (vouch_id, guild_id, due_at, attempt) VALUES (?, ?, ?, 0)",
+                (vouch_id, guild_id, due_at)
+            )
+
+    def cancel(self, vouch_id: int) -> bool:
+        """Drop the vouch's pending reminder; True if there was one"""
+        with self._lock:
+            return self._conn.execute("DELETE FROM reminders WHERE vouch_id = ?", (vouch_id,)).rowcount > 0
+
+    def due(self, now: float, limit: int) -> List[Tuple[int, int, int]]:
+        """Up to ``limit`` reminders due at ``now``, earliest first: (vouch_id, guild_id, attempt)"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT vouch_id, guild_id, attempt FROM reminders WHERE due_at <= ? ORDER BY due_at LIMIT ?",
+                (now, limit)
+            ).fetchall()
+
+    def next_due(self) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(due_at) FROM reminders").fetchone()
+        return row[0]
+
+    def advance(self, vouch_id: int, attempt: int, due_at: Optional[float]) -> bool:
+        """Claim reminder ``attempt``: reschedule the next one at ``due_at``, or drop the row when None.
+
+        Returns False if another process already claimed it (or it was cancelled).
+        """
+        with self._lock:
+            if due_at is None:
+                cur = self._conn.execute("DELETE FROM reminders WHERE vouch_id = ? AND attempt = ?", (vouch_id, attempt))
+            else:
+                cur = self._conn.execute(
+                    "UPDATE reminders SET due_at = ?, attempt = attempt + 1 WHERE vouch_id = ? AND attempt = ?",
+                    (due_at, vouch_id, attempt)
+                )
+        return cur.rowcount > 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM reminders").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,141 @@
+import string
+import logging
+import threading
+from typing import Callable, Dict, List, Mapping, Optional
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# Giá trị mặc định cho các key branding trong config của guild
+DEFAULT_BRANDING: Dict[str, object] = {
+    "thankyou": "Cảm ơn",
+    "brand": "LewLewStore",
+    "invite": "discord.gg/lewlewstore",
+    "vouch_channel": 1294909151515774999,
+    "emoji_success": "<:giveaway1:1388824182237958155>",
+    "emoji_shop": "<:Shop1:1388824257748013181>",
+    "emoji_feedback": "<:feedback1:1388824011617603689>",
+    "emoji_star": "<a:TwinklingStar:1388826311346356226>",
+    "embed_color": 0xfc44c2,
+}
+
+# Mẫu gốc: {brand}, {emoji_*}, {thankyou}, {vouch_channel} cố định theo guild,
+# các placeholder còn lại được điền mỗi lần gửi
+VOUCH_TEMPLATE = (
+    "{emoji_success} **Giao dịch thành công!**\n\n"
+    "{thankyou} {buyer}\n\n"
+    "{emoji_shop}**{brand}** xin bạn một ít phút để đánh giá dịch vụ tại đây nhé !!! chúng mình luôn muốn lắng nghe góp ý của các bạn và cải thiện dịch vụ tại **{brand}**\n\n"
+    "```+vouch {buyer} x{quantity} {product} {price} vnd legit```\n"
+    "- Mình xin chút ít thời gian của bạn để ủng hộ mình 1 vouch bằng cách sao chép nội dung ở trên và dán ở <#{vouch_channel}> hoặc 1 feedback bằng nút bên dưới (có thể cả vừa vouch và feeddback nếu bạn muốn)"
+)
+DM_TEMPLATE = (
+    "{emoji_success}Đơn hàng **{product}** của bạn đã hoàn thành\n\n"
+    "Bạn hãy vào {channel} để xác nhận đơn hàng và dành chút ít thời gian để đánh giá, góp ý dịch vụ bên mình bạn nhé !!!"
+)
+FEEDBACK_HEADER_TEMPLATE = "{emoji_feedback}•Feedback của {buyer}:"
+FEEDBACK_DONE_TEMPLATE = (
+    "**{brand}** đã ghi nhận feedback của bạn\n\n"
+    "Cảm ơn bạn đã tin tưởng và sử dụng dịch vụ tại **{brand}**"
+)
+FEEDBACK_RETRY_TEMPLATE = "**{brand}** chưa nhận được feedback của bạn, vui lòng chọn lại số sao để gửi lại"
+REMINDER_TEMPLATE = (
+    "⏰ Bạn chưa đánh giá đơn **{quantity} {product}** tại **{brand}**. "
+    "Bấm sao ở tin nhắn vouch để gửi feedback: {jump_url}"
+)
+
+
+class CompiledTemplate:
+    """A format string with the per-guild values already filled in.
+
+    Static values are inlined once with their braces doubled, so user input
+    is never parsed as a placeholder; ``render`` is ``str.format`` on the
+    result and only fills the per-message fields.
+    """
+
+    __slots__ = ("fields", "render")
+
+    def __init__(self, source: str, static: Mapping[str, object]):
+        pieces: List[str] = []
+        fields: List[str] = []
+        for literal, name, _spec, _conv in string.Formatter().parse(source):
+            pieces.append(_escape_braces(literal))
+            if name is None:
+                continue
+            if name in static:
+                pieces.append(_escape_braces(str(static[name])))
+                continue
+            if not name.isidentifier():
+                raise ValueError(f"invalid placeholder: {name!r}")
+            if name not in fields:
+                fields.append(name)
+            pieces.append("{" + name + "}")
+        self.fields = frozenset(fields)
+        self.render: Callable[..., str] = "".join(pieces).format
+
+
+def _escape_braces(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+class GuildTemplates:
+    """Every message template of one guild, compiled from its config"""
+
+    __slots__ = ("vouch", "dm", "feedback_header", "feedback_done", "feedback_retry", "reminder", "_color", "_author", "_footer", "_stars")
+
+    def __init__(self, guild_cfg: Mapping[str, object]):
+        static = dict(DEFAULT_BRANDING)
+        static.update({key: value for key, value in guild_cfg.items() if key in DEFAULT_BRANDING and value})
+        self.vouch = CompiledTemplate(VOUCH_TEMPLATE, static)
+        self.dm = CompiledTemplate(DM_TEMPLATE, static)
+        self.feedback_header = CompiledTemplate(FEEDBACK_HEADER_TEMPLATE, static)
+        self.feedback_done = CompiledTemplate(FEEDBACK_DONE_TEMPLATE, static).render()
+        self.feedback_retry = CompiledTemplate(FEEDBACK_RETRY_TEMPLATE, static).render()
+        self.reminder = CompiledTemplate(REMINDER_TEMPLATE, static)
+
+        # Khung embed feedback: chỉ title, mô tả, ảnh và số sao thay đổi mỗi lần gửi
+        self._color = int(static["embed_color"])
+        self._author = "Cảm ơn quý khách đã ủng hộ !!!"
+        self._footer = f"{static['brand']} • {static['invite']}"
+        self._stars = tuple(str(static["emoji_star"]) * count for count in range(6))
+
+    def feedback_embed(self, product: str, feedback: str, stars: int,
+                       avatar_url: Optional[str], server_icon: Optional[str]) -> discord.Embed:
+        embed = discord.Embed(title=f"Đã mua: {product}", description=f"> • {feedback}", color=self._color)
+        embed.set_author(name=self._author, icon_url=avatar_url)
+        if avatar_url:
+            embed.set_thumbnail(url=avatar_url)
+        embed.add_field(name="Đánh giá", value=self._stars[stars], inline=False)
+        embed.set_footer(text=self._footer, icon_url=server_icon)
+        return embed
+
+
+class TemplateCache:
+    """Compile each guild's templates on first use and keep them until invalidated"""
+
+    def __init__(self, loader: Callable[[int], Mapping[str, object]]):
+        self.loader = loader
+        self._cache: Dict[int, GuildTemplates] = {}
+        self._lock = threading.Lock()
+        self.compiled = 0
+
+    def get(self, guild_id: int) -> GuildTemplates:
+        templates = self._cache.get(guild_id)
+        if templates is None:
+            templates = GuildTemplates(self.loader(guild_id) or {})
+            with self._lock:
+                self._cache[guild_id] = templates
+                self.compiled += 1
+        return templates
+
+    def invalidate(self, guild_id: Optional[int] = None) -> None:
+        """Drop one guild's compiled templates, or all of them"""
+        with self._lock:
+            if guild_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(guild_id, None)
+        logger.debug(f"Template cache invalidated for {guild_id if guild_id is not None else 'all guilds'}")
+
+    def __len__(self) -> int:
+        return len(self._cache)
@@ -10,6 +10,12 @@ import tempfile
 import asyncio
 from unittest.mock import patch, MagicMock
 
+# Cấu hình phải có trước khi import vouch_bot1: test chạy trên database và log
+# tạm, không ghi vào vouchbot.db/bot.log thật
+TEST_DIR = tempfile.mkdtemp(prefix="vouchbot-test-")
+os.environ["DATABASE_FILE"] = os.path.join(TEST_DIR, "vouchbot.db")
+os.environ["LOG_FILE"] = os.path.join(TEST_DIR, "bot.log")
+
 def test_bot_initialization():
     """Test khởi tạo bot object"""
     try:
@@ -76,6 +82,1272 @@ def test_config_functions():
         print(f"❌ Lỗi test config functions: {e}")
         return False
 
+def test_write_behind_config():
+    """Test ghi config kiểu write-behind và ghi atomic"""
+    try:
+        from persistence import WriteBehindWriter, atomic_write_json
+        import json
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'config.json')
+            source = {}
+            persisted = {}
+            writes = []
+
+            def flush_fn(changes):
+                writes.append(sorted(changes))
+                persisted.update(changes)
+                atomic_write_json(path, persisted)
+
+            async def scenario():
+                writer = WriteBehindWriter(source, flush_fn, delay=0.05)
+                # Nhiều thay đổi liên tiếp chỉ tạo ra một lần ghi
+                for i in range(20):
+                    source[str(i % 3)] = {"thankyou": f"msg {i}"}
+                    writer.mark_dirty(str(i % 3))
+                await asyncio.sleep(0.2)
+                # Thay đổi chưa kịp flush phải được ghi khi tắt
+                source["9"] = {"thankyou": "shutdown"}
+                writer.mark_dirty("9")
+                return writer
+
+            writer = asyncio.run(scenario())
+            writer.flush_sync()
+
+            with open(path, 'r', encoding='utf-8') as f:
+                on_disk = json.load(f)
+            leftovers = [name for name in os.listdir(tmp_dir) if name.endswith('.tmp')]
+
+        if writes[0] == ['0', '1', '2'] and on_disk == source and not leftovers:
+            print(f"✅ Write-behind gom {len(writes)} lần ghi cho 21 thay đổi")
+            return True
+        print(f"❌ Write-behind sai: writes={writes}, on_disk={on_disk}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test write-behind config: {e}")
+        return False
+
+def test_guild_config_store():
+    """Test GuildConfigStore (SQLite) và import từ config.json"""
+    try:
+        from storage import GuildConfigStore
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, 'vouchbot.db')
+            store = GuildConfigStore(db_path)
+            imported = store.import_json({"123": {"thankyou": "Cảm ơn"}, "456": {"feedback_channel": 42}})
+            # Import chỉ chạy một lần
+            imported_again = store.import_json({"789": {}})
+
+            guild_cfg = store.get("123", {})
+            guild_cfg["feedback_channel"] = 99
+            store["123"] = guild_cfg
+            store.flush_sync()
+            store.close()
+
+            reopened = GuildConfigStore(db_path)
+            lookups = []
+            reopened._reader.set_trace_callback(lambda sql: lookups.append(sql) if "FROM guild_config WHERE" in sql else None)
+            # Guild chưa cấu hình: chỉ đọc SQLite lần đầu
+            missing = reopened.get("789") is None and reopened.get("789") is None and "789" not in reopened
+            missed_once = len(lookups) == 1
+            reopened["789"] = {"thankyou": "Xin chào"}
+            # Process khác thêm guild: cache trượt bị xoá khi thấy config_version mới
+            reopened.get("555")
+            other = GuildConfigStore(db_path)
+            other.write_many({"555": {"brand": "MeoShop"}})
+            other.close()
+            reopened._check_external_changes(force=True)
+            result = (
+                imported == 2 and imported_again == 0
+                and reopened.get("123") == {"thankyou": "Cảm ơn", "feedback_channel": 99}
+                and missing and missed_once and reopened.get("789") == {"thankyou": "Xin chào"}
+                and reopened.get("555") == {"brand": "MeoShop"}
+                and sorted(reopened) == ["123", "456", "555", "789"]
+            )
+            reopened.close()
+
+        if result:
+            print("✅ GuildConfigStore lưu và đọc config thành công!")
+            return True
+        print("❌ GuildConfigStore trả về dữ liệu sai")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test GuildConfigStore: {e}")
+        return False
+
+def test_vouch_store():
+    """Test lưu state vouch và đọc lại sau khi mở lại database (giả lập restart)"""
+    try:
+        from storage import VouchStore
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, 'vouchbot.db')
+            store = VouchStore(db_path)
+            vouch_id = store.add(1, 2, 3, "Nitro", "50k", 4, message_id=5)
+            store.close()
+
+            reopened = VouchStore(db_path)
+            record = reopened.get(vouch_id)
+            first = reopened.mark_rated(vouch_id)
+            rated = reopened.get_by_message(5)
+            # Gửi feedback lần hai không được đánh dấu (và cộng điểm) lại
+            again = reopened.mark_rated(vouch_id)
+            missing = reopened.get_by_message(6)
+            reopened.close()
+
+        if (record and record.buyer_id == 2 and record.product == "Nitro" and rated.rated_at and missing is None
+                and first and not again):
+            print("✅ VouchStore giữ state vouch qua restart!")
+            return True
+        print(f"❌ VouchStore trả về dữ liệu sai: {record}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test VouchStore: {e}")
+        return False
+
+def test_star_button_custom_id():
+    """Test custom_id của star button mang id vouch và khớp template dispatcher"""
+    try:
+        from vouch_bot1 import StarButton, VouchView, to_base36
+
+        template = StarButton.__discord_ui_compiled_template__
+        custom_ids = [item.custom_id for item in VouchView(1000).children]
+        new_match = template.fullmatch(custom_ids[4])
+        legacy_match = template.fullmatch("star_3")
+
+        if (custom_ids[0] == f"v:{to_base36(1000)}:1"
+                and int(new_match["vouch_id"], 36) == 1000 and new_match["stars"] == "5"
+                and legacy_match["vouch_id"] is None and legacy_match["stars"] == "3"):
+            print(f"✅ Star button custom_id gọn: {custom_ids[0]}")
+            return True
+        print(f"❌ custom_id không đúng: {custom_ids}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test star button custom_id: {e}")
+        return False
+
+def test_command_tree_hash():
+    """Test hash của command tree ổn định và đổi khi command thay đổi"""
+    try:
+        import discord
+        from discord import app_commands
+        from vouch_bot1 import bot, command_tree_hash
+
+        first = command_tree_hash(bot.tree)
+        second = command_tree_hash(bot.tree)
+
+        @app_commands.command(name="ping", description="Ping")
+        async def ping(interaction: discord.Interaction):
+            pass
+
+        bot.tree.add_command(ping)
+        try:
+            changed = command_tree_hash(bot.tree)
+        finally:
+            bot.tree.remove_command("ping")
+
+        if first == second and changed != first and command_tree_hash(bot.tree) == first:
+            print(f"✅ Command tree hash ổn định: {first[:12]}")
+            return True
+        print("❌ Command tree hash không ổn định")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test command tree hash: {e}")
+        return False
+
+def test_dm_dispatcher():
+    """Test hàng đợi DM: retry khi bị 429, không retry khi DM bị tắt"""
+    try:
+        import discord
+        from types import SimpleNamespace
+        from dm_queue import DMDispatcher
+
+        class FakeUser:
+            def __init__(self, user_id, errors):
+                self.id = user_id
+                self.errors = list(errors)
+                self.received = []
+
+            async def send(self, content):
+                if self.errors:
+                    raise self.errors.pop(0)
+                self.received.append(content)
+
+        forbidden = discord.Forbidden(SimpleNamespace(status=403, reason="Forbidden"), "Cannot send messages to this user")
+        ok_user = FakeUser(1, [])
+        limited_user = FakeUser(2, [discord.RateLimited(0.05)])
+        closed_user = FakeUser(3, [forbidden])
+        failures = []
+
+        async def on_failure(error):
+            failures.append(error)
+
+        async def scenario():
+            dispatcher = DMDispatcher(maxsize=10, workers=2, max_retries=2, base_delay=0.01)
+            dispatcher.start()
+            for user in (ok_user, limited_user, closed_user):
+                dispatcher.enqueue(user, "Đơn hàng đã hoàn thành", on_failure=on_failure)
+            await asyncio.sleep(0.2)
+            await dispatcher.stop()
+            return dispatcher.stats()
+
+        stats = asyncio.run(scenario())
+        if (ok_user.received and limited_user.received and not closed_user.received
+                and stats["delivered"] == 2 and stats["failed"] == 1 and stats["retried"] == 1
+                and len(failures) == 1 and stats["depth"] == 0):
+            print(f"✅ DM dispatcher hoạt động: {stats}")
+            return True
+        print(f"❌ DM dispatcher sai: {stats}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test DM dispatcher: {e}")
+        return False
+
+def test_vouchbulk_pipeline():
+    """Test parse file CSV/JSONL và pipeline giới hạn concurrency của /vouchbulk"""
+    try:
+        from bulk import BulkProgress, BulkRowError, iter_rows, run_pipeline
+
+        csv_data = "Buyer,Quantity,Product,Price\n<@1>,2,Nitro,50k\n<@2>,x,Nitro,50k\n<@3>,1,Spotify,30k\n".encode()
+        jsonl_data = b'{"buyer": "4", "quantity": 1, "product": "Netflix", "price": "70k"}\nnot json\n'
+        csv_rows = list(iter_rows(csv_data, "orders.csv"))
+        jsonl_rows = list(iter_rows(jsonl_data, "orders.jsonl"))
+        try:
+            list(iter_rows(b"buyer,product\n1,Nitro\n", "bad.csv"))
+            header_checked = False
+        except ValueError:
+            header_checked = True
+
+        in_flight = 0
+        peak = 0
+
+        async def handle(row):
+            nonlocal in_flight, peak
+            if not row.quantity.isdigit():
+                raise BulkRowError("số lượng không hợp lệ")
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+        rows = csv_rows * 10
+        progress = asyncio.run(run_pipeline(iter(rows), handle, BulkProgress(), concurrency=3, max_rows=25))
+
+        if (header_checked and [row.product for row in csv_rows] == ["Nitro", "Nitro", "Spotify"]
+                and jsonl_rows[0].buyer == "4" and jsonl_rows[1].product == ""
+                and progress.done and progress.parsed == 25 and peak <= 3
+                and progress.created == 17 and progress.failed == 9):
+            print(f"✅ Pipeline /vouchbulk: {progress.created} thành công, {progress.failed} lỗi, tối đa {peak} dòng song song")
+            return True
+        print(f"❌ Pipeline /vouchbulk sai: created={progress.created}, failed={progress.failed}, peak={peak}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test /vouchbulk: {e}")
+        return False
+
+def test_rating_store():
+    """Test thống kê đánh giá cộng dồn theo guild và sản phẩm"""
+    try:
+        from storage import RatingStore
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = RatingStore(os.path.join(tmp_dir, 'vouchbot.db'))
+            for stars, product in [(5, "Nitro"), (4, "nitro "), (1, "Spotify"), (5, "Nitro")]:
+                store.record(1, None, 2, product, stars)
+            guild_stats = store.get_stats(1)
+            nitro_stats = store.get_stats(1, "NITRO")
+            missing = store.get_stats(2)
+            store.close()
+
+        if (guild_stats["count"] == 4 and guild_stats["sum"] == 15
+                and nitro_stats["count"] == 3 and nitro_stats["histogram"] == {1: 0, 2: 0, 3: 0, 4: 1, 5: 2}
+                and abs(nitro_stats["average"] - 14 / 3) < 1e-9 and missing is None):
+            print(f"✅ Thống kê đánh giá: trung bình {guild_stats['average']:.2f} trên {guild_stats['count']} lượt")
+            return True
+        print(f"❌ Thống kê đánh giá sai: {guild_stats}, {nitro_stats}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test RatingStore: {e}")
+        return False
+
+def test_health_server():
+    """Test health/ready/metrics server chạy trên event loop"""
+    try:
+        import socket
+        import aiohttp
+        import vouch_bot1
+
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+
+        async def scenario():
+            with patch.dict(os.environ, {'PORT': str(port)}):
+                runner = await vouch_bot1.start_health_server()
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.get(f'http://127.0.0.1:{port}/health') as resp:
+                        health = (resp.status, await resp.json())
+                    async with session.get(f'http://127.0.0.1:{port}/ready') as resp:
+                        ready_status = resp.status
+                    async with session.get(f'http://127.0.0.1:{port}/metrics') as resp:
+                        metrics_text = await resp.text()
+            finally:
+                await runner.cleanup()
+            return health, ready_status, metrics_text
+
+        health, ready_status, metrics_text = asyncio.run(scenario())
+        status, body = health
+        if (status == 200 and body['bot_ready'] is False and body['shards'] == {'0': {'latency': None, 'ready': False}}
+                and 'imports' in body['startup'] and ready_status == 503
+                and '# TYPE vouchbot_interactions_total counter' in metrics_text
+                and 'vouchbot_shard_ready{shard="0"} 0' in metrics_text
+                and 'vouchbot_guilds 0' in metrics_text):
+            print("✅ Health server trả lời /health, /ready và /metrics")
+            return True
+        print(f"❌ Health server trả lời sai: {health}, {ready_status}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test health server: {e}")
+        return False
+
+def test_interaction_instrumentation():
+    """Test đo thời gian ack, tổng thời gian và từng lời gọi Discord của handler"""
+    try:
+        import logging
+        from datetime import datetime, timezone
+        from types import SimpleNamespace
+        import instrumentation
+        from instrumentation import instrumented, latency_summary, timed
+
+        @instrumented("test_handler")
+        async def handler(interaction):
+            await timed("ack", asyncio.sleep(0.02))
+            await timed("send", asyncio.sleep(0.01))
+
+        warnings = []
+
+        class Collector(logging.Handler):
+            def emit(self, record):
+                warnings.append(record.getMessage())
+
+        collector = Collector(level=logging.WARNING)
+        instrumentation.logger.addHandler(collector)
+        fake_interaction = SimpleNamespace(response=None, created_at=datetime.now(timezone.utc))
+        try:
+            with patch('instrumentation.ACK_WARN_SECONDS', 0.001):
+                for _ in range(5):
+                    asyncio.run(handler(fake_interaction))
+        finally:
+            instrumentation.logger.removeHandler(collector)
+
+        summary = latency_summary()["test_handler"]
+        if (0.015 < summary["ack"][0.5] < summary["total"][0.5] and set(summary["total"]) == {0.5, 0.95, 0.99}
+                and len(warnings) == 5 and "send=" in warnings[0]):
+            print(f"✅ Instrumentation: ack p50={summary['ack'][0.5] * 1000:.0f}ms, total p50={summary['total'][0.5] * 1000:.0f}ms")
+            return True
+        print(f"❌ Instrumentation sai: {summary}, {warnings}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test instrumentation: {e}")
+        return False
+
+def test_ack_first_feedback():
+    """Test feedback: post kênh và sửa tin nhắn gốc chạy song song, followup báo kết quả"""
+    try:
+        import time
+        from types import SimpleNamespace
+        import vouch_bot1
+        from storage import PendingVouch
+
+        class FakeChannel:
+            def __init__(self, fail=False):
+                self.fail = fail
+                self.sent = []
+
+            async def send(self, content, embed=None):
+                await asyncio.sleep(0.1)
+                if self.fail:
+                    raise RuntimeError("500 Internal Server Error")
+                self.sent.append(content)
+
+        class FakeMessage:
+            id = 20
+            edited = 0
+
+            async def edit(self, **kwargs):
+                await asyncio.sleep(0.1)
+                FakeMessage.edited += 1
+
+        partial = MagicMock()
+        partial.get_partial_message.return_value = FakeMessage()
+
+        def run(channel):
+            followups = []
+
+            async def followup_send(message, ephemeral=False):
+                followups.append(message)
+
+            interaction = SimpleNamespace(
+                user=SimpleNamespace(id=42, mention="<@42>"), guild_id=1,
+                followup=SimpleNamespace(send=followup_send)
+            )
+            record = PendingVouch(7, 1, 42, 1, "Nitro", "50k", 10, 20, 0.0, None)
+            started = time.perf_counter()
+            asyncio.run(vouch_bot1.deliver_feedback(interaction, record, 5, channel, None))
+            return followups, time.perf_counter() - started
+
+        with patch.object(vouch_bot1.bot, 'get_partial_messageable', return_value=partial), \
+                patch.object(vouch_bot1, 'vouch_store') as store, patch.object(vouch_bot1, 'rating_store') as ratings, \
+                patch.object(vouch_bot1, 'history_store'), patch.object(vouch_bot1, 'reminder_store') as reminder_store:
+            ok_channel = FakeChannel()
+            ok_followups, elapsed = run(ok_channel)
+            failed_followups, _ = run(FakeChannel(fail=True))
+            # Lỗi sau khi đã defer: buyer nhận followup thay vì kẹt ở "đang suy nghĩ…"
+            stuck_followups = []
+
+            async def submit_after_defer():
+                interaction = MagicMock(guild_id=1)
+                interaction.created_at.timestamp.return_value = time.time()
+                interaction.guild.icon = None
+                interaction.response.defer = MagicMock(side_effect=lambda **kwargs: asyncio.sleep(0))
+                interaction.response.is_done.return_value = True
+                interaction.followup.send = MagicMock(side_effect=lambda message, **kwargs: asyncio.sleep(0, stuck_followups.append(message)))
+                modal = vouch_bot1.FeedbackModal(PendingVouch(7, 1, 42, 1, "Nitro", "50k", 10, 20, 0.0, None), 5)
+                def fail_spawn(coro, name=None):
+                    coro.close()
+                    raise RuntimeError("no loop")
+
+                with patch.object(vouch_bot1, 'spawn_background', side_effect=fail_spawn):
+                    await modal.on_submit(interaction)
+
+            asyncio.run(submit_after_defer())
+            # Modal gửi lần hai: vouch đã đánh giá, không cộng điểm và lịch sử lần nữa
+            store.mark_rated.return_value = False
+            vouch_bot1.record_feedback(PendingVouch(7, 1, 42, 1, "Nitro", "50k", 10, 20, 0.0, None), 42, 5, "")
+
+        if (ok_channel.sent and elapsed < 0.18 and FakeMessage.edited == 3
+                and ok_followups == ["✅ Cảm ơn feedback của bạn!"]
+                and failed_followups and failed_followups[0].startswith("❌")
+                and stuck_followups == [vouch_bot1.templates.get(1).feedback_retry]
+                and reminder_store.cancel.call_count == 1
+                and store.mark_rated.call_count == 2 and ratings.record.call_count == 1):
+            print(f"✅ Feedback side effects chạy song song ({elapsed * 1000:.0f}ms), followup đúng, chỉ huỷ nhắc khi đã đăng")
+            return True
+        print(f"❌ Feedback pipeline sai: {elapsed:.3f}s, {ok_followups}, {failed_followups}, {stuck_followups}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test feedback pipeline: {e}")
+        return False
+
+def test_message_templates():
+    """Test template theo guild: biên dịch một lần, điền placeholder, xoá cache khi đổi branding"""
+    try:
+        from templates import TemplateCache
+
+        guild_configs = {1: {"thankyou": "Cảm ơn {bạn}", "brand": "{buyer.__class__} {0}"}}
+        cache = TemplateCache(lambda guild_id: guild_configs.get(guild_id, {}))
+
+        text = cache.get(1).vouch.render(buyer="<@42>", quantity=2, product="Nitro {1}", price="50k")
+        dm = cache.get(1).dm.render(product="Nitro", channel="<#7>")
+        header = cache.get(1).feedback_header.render(buyer="<@42>")
+        reminder = cache.get(1).reminder.render(quantity=2, product="Nitro {1}", jump_url="https://discord.com/channels/1/2/3")
+        embed = cache.get(1).feedback_embed("Nitro", "Tốt", 3, None, None)
+        compiled_once = cache.compiled == 1
+
+        guild_configs[1] = {"brand": "MeoShop", "vouch_channel": 555}
+        stale = "MeoShop" not in cache.get(1).feedback_done
+        cache.invalidate(1)
+        fresh = cache.get(1)
+
+        if (compiled_once and stale
+                and text.startswith("<:giveaway1:1388824182237958155> **Giao dịch thành công!**\n\nCảm ơn {bạn} <@42>")
+                and "```+vouch <@42> x2 Nitro {1} 50k vnd legit```" in text and "**{buyer.__class__} {0}**" in text and "<#1294909151515774999>" in text
+                and "Đơn hàng **Nitro**" in dm and "<#7>" in dm
+                and header == "<:feedback1:1388824011617603689>•Feedback của <@42>:"
+                and "**2 Nitro {1}** tại **{buyer.__class__} {0}**" in reminder and reminder.endswith("https://discord.com/channels/1/2/3")
+                and embed.fields[0].value.count("TwinklingStar") == 3 and embed.footer.text == "{buyer.__class__} {0} • discord.gg/lewlewstore"
+                and "**MeoShop**" in fresh.feedback_done and "<#555>" in fresh.vouch.render(buyer="", quantity=1, product="", price="")
+                and cache.compiled == 2):
+            print("✅ Template: render đúng, giữ nguyên dấu ngoặc của user, cache được xoá khi đổi branding")
+            return True
+        print(f"❌ Template sai: {text!r}, {dm!r}, {header!r}, {reminder!r}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test template: {e}")
+        return False
+
+def test_structured_logging():
+    """Test log qua QueueListener: JSON có guild_id/user_id/command/latency, lấy mẫu log INFO"""
+    try:
+        import json
+        import logging
+        import threading
+        from datetime import datetime, timezone
+        from types import SimpleNamespace
+        from instrumentation import instrumented
+        from logging_setup import SAMPLED, setup_logging, stop_logging
+
+        test_logger = logging.getLogger("test_structured_logging")
+        emit_threads = []
+
+        @instrumented("vouch")
+        async def handler(interaction):
+            test_logger.info("Vouch created")
+            test_logger.info("DM sent", extra=SAMPLED)
+            test_logger.warning("DM failed", extra=SAMPLED)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log_file = os.path.join(tmp_dir, 'bot.log')
+            listener = setup_logging(json_format=True, log_file=log_file, sample_rate=0.0)
+            original_emit = listener.handlers[-1].emit
+
+            def emit(record):
+                emit_threads.append(threading.current_thread())
+                original_emit(record)
+
+            listener.handlers[-1].emit = emit
+            interaction = SimpleNamespace(
+                response=None, created_at=datetime.now(timezone.utc),
+                guild_id=123, user=SimpleNamespace(id=456)
+            )
+            try:
+                asyncio.run(handler(interaction))
+            finally:
+                stop_logging()
+            with open(log_file, encoding='utf-8') as f:
+                entries = [json.loads(line) for line in f]
+            # Trả lại cấu hình log mặc định cho các test sau
+            setup_logging(log_file=None)
+
+        messages = [entry["message"] for entry in entries]
+        first = entries[0] if entries else {}
+        if (messages == ["Vouch created", "DM failed"] and first.get("guild_id") == 123
+                and first.get("user_id") == 456 and first.get("command") == "vouch" and "latency_ms" in first
+                and emit_threads and threading.main_thread() not in emit_threads):
+            print(f"✅ Log JSON ghi trên luồng nền: {first}")
+            return True
+        print(f"❌ Log có cấu trúc sai: {entries}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test structured logging: {e}")
+        return False
+
+def test_sharding():
+    """Test chia shard, config dùng chung giữa các process và launcher khởi động lại worker"""
+    try:
+        import socket
+        import sqlite3
+        import threading
+        import launcher
+        from sharding import parse_shard_ids, split_shards
+        from storage import GuildConfigStore
+
+        ranges_ok = (parse_shard_ids("0-2,5") == [0, 1, 2, 5] and parse_shard_ids("") is None
+                     and split_shards(10, 3) == [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]] and split_shards(2, 4) == [[0], [1]])
+
+        # Hai store trên cùng file mô phỏng hai worker process
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, 'shared.db')
+            worker_a = GuildConfigStore(db_path, refresh_interval=0)
+            worker_b = GuildConfigStore(db_path, refresh_interval=0)
+            reloads = []
+            worker_b.on_reload = lambda: reloads.append(True)
+            worker_a["1"] = {"thankyou": "Cảm ơn"}
+            before = worker_b.get("1", {}).get("thankyou")
+            worker_a["1"] = {"thankyou": "Thanks"}
+            after = worker_b.get("1", {}).get("thankyou")
+            own_write_reloads = len(reloads)
+            worker_b["2"] = {"thankyou": "Hi"}
+            worker_b.get("2")
+            shared_ok = before == "Cảm ơn" and after == "Thanks" and own_write_reloads >= 1 and len(reloads) == own_write_reloads
+
+            # Đọc config (trên event loop) không chờ lần flush đang chạy hay process khác giữ write lock
+            blocker = sqlite3.connect(db_path, isolation_level=None)
+            blocker.execute("BEGIN IMMEDIATE")
+            blocker.execute("UPDATE meta SET value = value WHERE key = 'config_version'")
+            with worker_b._lock:
+                reader = threading.Thread(target=lambda: (worker_b._check_external_changes(force=True), worker_b.get("9"), len(worker_b)))
+                reader.start()
+                reader.join(timeout=2)
+                shared_ok = shared_ok and not reader.is_alive()
+            reader.join()
+            blocker.execute("ROLLBACK")
+            blocker.close()
+            worker_a.close()
+            worker_b.close()
+
+        merged = launcher.merge_expositions({
+            "0": "# HELP up Up\n# TYPE up gauge\nup 1\n# HELP calls Calls\n# TYPE calls counter\ncalls{handler=\"vouch\"} 2\n",
+            "1": "# HELP up Up\n# TYPE up gauge\nup 0\n",
+        })
+        merge_ok = merged.splitlines()[:4] == ["# HELP up Up", "# TYPE up gauge", 'up{worker="0"} 1', 'up{worker="1"} 0'] \
+            and 'calls{worker="0",handler="vouch"} 2' in merged
+
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+
+        async def scenario():
+            cluster = launcher.Launcher(
+                shard_count=2, workers=2, port=port, worker_port_base=port + 1,
+                command=[sys.executable, "-c", "import sys; sys.exit(3)"], max_concurrency=2
+            )
+            await cluster.start()
+            await asyncio.sleep(0.8)
+            exposed = cluster.registry.expose()
+            await cluster.stop(timeout=2)
+            return cluster, exposed
+
+        with patch('launcher.MAX_BACKOFF', 0.05):
+            cluster, exposed = asyncio.run(scenario())
+        restarts = [worker.restarts for worker in cluster.workers]
+        launcher_ok = (all(count >= 1 for count in restarts) and [w.shard_ids for w in cluster.workers] == [[0], [1]]
+                       and 'vouchbot_launcher_worker_restarts{worker="0"}' in exposed)
+
+        if ranges_ok and shared_ok and merge_ok and launcher_ok:
+            print(f"✅ Sharding: chia shard đúng, config đồng bộ giữa process, worker được khởi động lại {restarts}")
+            return True
+        print(f"❌ Sharding sai: ranges={ranges_ok}, shared={shared_ok}, merge={merge_ok}, launcher={launcher_ok} {restarts}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test sharding: {e}")
+        return False
+
+def test_memory_profile():
+    """Test MEMORY_PROFILE=low: tắt cache message/member và chunking, chỉ giữ intent guilds"""
+    try:
+        import discord
+        from memory_profile import client_options
+        from bench_memory import run_worker
+
+        low = client_options("low")
+        options_ok = (low["max_messages"] is None and low["member_cache_flags"].value == 0
+                      and low["chunk_guilds_at_startup"] is False and low["intents"] == discord.Intents(guilds=True)
+                      and client_options("default")["intents"].guild_messages)
+        try:
+            client_options("tiny")
+            options_ok = False
+        except ValueError:
+            pass
+
+        # Lỗi trong on_message (vd. bot.user là None) được discord.py log rồi bỏ qua
+        import logging
+        errors = []
+        handler = logging.Handler(logging.ERROR)
+        handler.emit = errors.append
+        logging.getLogger("discord.client").addHandler(handler)
+        try:
+            default_run = asyncio.run(run_worker("default", 5, 20, 3))
+            low_run = asyncio.run(run_worker("low", 5, 20, 3))
+        finally:
+            logging.getLogger("discord.client").removeHandler(handler)
+        if (options_ok and not errors and default_run["cached_messages"] == 15
+                and low_run["cached_messages"] == 0 and low_run["cached_members"] == 0):
+            print(f"✅ Memory profile low: không cache message/member (default cache {default_run['cached_messages']} message)")
+            return True
+        print(f"❌ Memory profile sai: {options_ok}, {default_run}, {low_run}, {len(errors)} lỗi on_message")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test memory profile: {e}")
+        return False
+
+def test_startup_budget():
+    """Test thời gian khởi động từng giai đoạn so với startup_budget.json"""
+    try:
+        import subprocess
+        from startup import check_budget, load_budget, measure_import_phases
+
+        report = measure_import_phases()
+        over = check_budget(report, load_budget())
+        # aiohttp.web chỉ được import khi health server khởi động
+        web_loaded = subprocess.run(
+            [sys.executable, "-c", "import sys, vouch_bot1; print('aiohttp.web' in sys.modules)"],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip().splitlines()[-1]
+
+        phases = ["interpreter", "imports", "dotenv", "logging", "stores", "bot"]
+        if list(report) == phases and not over and web_loaded == "False":
+            total = max(info["at"] for info in report.values())
+            print(f"✅ Khởi động trong budget: import xong sau {total * 1000:.0f}ms")
+            return True
+        print(f"❌ Khởi động vượt budget: {over}, phases={list(report)}, aiohttp.web={web_loaded}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test startup budget: {e}")
+        return False
+
+def test_load_harness():
+    """Test load test offline: vouch -> bấm sao -> feedback với REST giả"""
+    try:
+        from bench_load import run_load
+
+        result = asyncio.run(run_load(buyers=40, concurrency=20, latency=0.002, jitter=0.0, rate_429=0.1, retry_after=0.01))
+        kinds = {"vouch", "star_button", "feedback_modal"}
+        if (result["failures"] == 0 and result["acked"] == 120 and set(result["ack"]) == kinds
+                and result["dm"]["delivered"] >= 40 and result["interactions_per_second"] > 0):
+            p99 = max(quantiles[0.99] for quantiles in result["ack"].values())
+            print(f"✅ Load harness: {result['interactions']} interactions, {result['interactions_per_second']:.0f}/s, ack p99 {p99 * 1000:.0f}ms, {result['rate_limited']} lần 429")
+            return True
+        print(f"❌ Load harness sai: {result}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test load harness: {e}")
+        return False
+
+def test_feedback_webhook_pool():
+    """Test webhook pool gửi feedback: chia tải, bỏ webhook đã xoá, quay về bot user"""
+    try:
+        import discord
+        from types import SimpleNamespace
+        from webhook_pool import WebhookPool, WebhookPoolCache
+
+        class FakeWebhook:
+            def __init__(self, webhook_id, error=None):
+                self.id = webhook_id
+                self.error = error
+                self.sent = 0
+
+            async def send(self, content, **kwargs):
+                if self.error is not None:
+                    raise self.error
+                self.sent += 1
+
+        class FakeChannel:
+            id = 10
+            sent = 0
+
+            async def send(self, content, **kwargs):
+                FakeChannel.sent += 1
+
+        removed = []
+        hooks = [FakeWebhook(1), FakeWebhook(2), FakeWebhook(3)]
+        pool = WebhookPool(1, 10, hooks, on_removed=lambda guild_id, webhook_id: removed.append(webhook_id))
+
+        async def scenario():
+            channel = FakeChannel()
+            spread = [await pool.send(channel, "hi") for _ in range(6)]
+            hooks[0].error = discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), "Unknown Webhook")
+            hooks[1].error = discord.HTTPException(SimpleNamespace(status=429, reason="Too Many Requests"), "slow down")
+            failover = [await pool.send(channel, "hi") for _ in range(3)]
+            hooks[2].error = discord.HTTPException(SimpleNamespace(status=403, reason="Forbidden"), "missing access")
+            fallback = await pool.send(channel, "hi")
+
+            # Lỗi 5xx: bài có thể đã lên, không đăng lại qua webhook khác hay bot user
+            ambiguous = [FakeWebhook(8, discord.HTTPException(SimpleNamespace(status=503, reason="Unavailable"), "boom")), FakeWebhook(9)]
+            try:
+                await WebhookPool(1, 10, ambiguous).send(channel, "hi")
+                no_repost = False
+            except discord.HTTPException as e:
+                no_repost = e.status == 503 and ambiguous[1].sent == 0
+            return spread, failover, fallback, no_repost
+
+        spread, failover, fallback, no_repost = asyncio.run(scenario())
+        cache = WebhookPoolCache(
+            lambda guild_id: {"feedback_channel": 10, "feedback_webhooks": [{"id": 7, "token": "t"}]} if guild_id == 1 else {},
+            lambda webhook_id, token: FakeWebhook(webhook_id)
+        )
+        if (spread == ["webhook"] * 6 and [hook.sent for hook in hooks] == [2, 2, 5]
+                and failover == ["webhook"] * 3 and removed == [1] and len(pool) == 2
+                and fallback == "bot" and no_repost and FakeChannel.sent == 1
+                and len(cache.get(1)) == 1 and cache.get(2) is None):
+            print("✅ Webhook pool: chia đều, bỏ webhook bị xoá, chỉ thử webhook khác khi bài chưa được đăng, lỗi 5xx không đăng lại")
+            return True
+        print(f"❌ Webhook pool sai: {spread} {failover} {fallback} {no_repost} {[hook.sent for hook in hooks]} {removed}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test webhook pool: {e}")
+        return False
+
+def test_outbound_scheduler():
+    """Test scheduler REST: ưu tiên ack, slot dành riêng cho ack, gộp các lần sửa cùng tin nhắn"""
+    try:
+        from outbound import OutboundScheduler
+
+        order = []
+
+        async def call(name, delay=0.05):
+            await asyncio.sleep(delay)
+            order.append(name)
+            return name
+
+        async def scenario():
+            scheduler = OutboundScheduler(concurrency=2, reserved=1)
+            # 1 slot cho việc nền đang bận; các lời gọi sau phải xếp hàng
+            busy = asyncio.create_task(scheduler.run("dm", call("dm-0", 0.1)))
+            await asyncio.sleep(0)
+            queued = [
+                asyncio.create_task(scheduler.run("dm", call("dm-1"))),
+                asyncio.create_task(scheduler.run("edit", call("edit-a1"), key=1)),
+                asyncio.create_task(scheduler.run("followup", call("followup"))),
+            ]
+            await asyncio.sleep(0)
+            edit_latest = asyncio.create_task(scheduler.run("edit", call("edit-a2"), key=1))
+            await asyncio.sleep(0)
+            depths = scheduler.depths()
+            # Ack dùng slot dành riêng, không phải chờ
+            ack = await scheduler.run("ack", call("ack", 0.01))
+            results = await asyncio.gather(busy, *queued, edit_latest)
+            return scheduler, depths, ack, results
+
+        scheduler, depths, ack, results = asyncio.run(scenario())
+        stats = scheduler.stats()
+        if (order == ["ack", "dm-0", "followup", "dm-1", "edit-a2"]
+                and depths == {"ack": 0, "post": 1, "background": 2}
+                and results[2] == "edit-a2" and results[4] == "edit-a2" and stats["coalesced"] == 1
+                and stats["priorities"]["ack"]["max_wait_seconds"] == 0.0
+                and stats["priorities"]["background"]["max_wait_seconds"] > 0 and scheduler.active == 0):
+            print(f"✅ Outbound scheduler: thứ tự {order}, gộp {stats['coalesced']} lần sửa")
+            return True
+        print(f"❌ Outbound scheduler sai: {order}, {depths}, {results}, {stats}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test outbound scheduler: {e}")
+        return False
+
+def test_http_interactions():
+    """Test endpoint HTTP interactions: chữ ký Ed25519, lệnh, nút sao, modal feedback, phản hồi sau khi endpoint defer"""
+    try:
+        import discord
+        from http_interactions import DEFERRED_CHANNEL_MESSAGE, DEFERRED_UPDATE_MESSAGE, HTTPInteractionResponse, endpoint_defer, fill_modal
+
+        async def modal_values():
+            # Payload dạng action row (cũ) và Label (discord.py 2.6+) đều điền được giá trị
+            modal = discord.ui.Modal(title="x")
+            feedback = discord.ui.TextInput(label="Feedback", custom_id="feedback")
+            modal.add_item(feedback)
+            fill_modal(modal, [{"type": 1, "components": [{"type": 4, "custom_id": "feedback", "value": "tốt"}]}])
+            rows = feedback.value
+            fill_modal(modal, [{"type": 18, "component": {"type": 4, "custom_id": "feedback", "value": "rất tốt"}}])
+            return rows == "tốt" and feedback.value == "rất tốt"
+
+        async def late_responses():
+            # Handler trả lời sau khi endpoint đã defer thay nó
+            interaction = MagicMock(type=discord.InteractionType.component, id=1)
+            interaction.edit_original_response = MagicMock(side_effect=lambda **kwargs: asyncio.sleep(0))
+            interaction.followup.send = MagicMock(side_effect=lambda *args, **kwargs: asyncio.sleep(0))
+            response = HTTPInteractionResponse(interaction)
+            response.deferred_by_endpoint = True
+            await response.defer()
+            await response.edit_message(content="trang 2")
+            await response.send_message("xong", ephemeral=True)
+            try:
+                await response.send_modal(discord.ui.Modal(title="x"))
+                modal_refused = False
+            except discord.InteractionResponded:
+                modal_refused = True
+            # Endpoint defer thay handler: không ép ephemeral
+            public_defer = (endpoint_defer(interaction) == {"type": DEFERRED_UPDATE_MESSAGE}
+                            and endpoint_defer(MagicMock(type=discord.InteractionType.modal_submit)) == {"type": DEFERRED_CHANNEL_MESSAGE})
+            return (modal_refused and public_defer and response.payload is None
+                    and interaction.edit_original_response.call_args.kwargs == {"content": "trang 2"}
+                    and interaction.followup.send.call_count == 1)
+
+        if not asyncio.run(modal_values()):
+            print("❌ HTTP interactions: không điền được giá trị modal")
+            return False
+
+        # Trước đây phản hồi muộn chờ mãi một HTTP response không bao giờ được gửi
+        if not asyncio.run(asyncio.wait_for(late_responses(), timeout=5)):
+            print("❌ HTTP interactions: phản hồi sau khi endpoint defer bị mất")
+            return False
+
+        try:
+            import nacl  # noqa: F401
+        except ImportError:
+            print("✅ HTTP interactions: bỏ qua (chưa cài PyNaCl)")
+            return True
+        from interactions_harness import run_local
+
+        results = asyncio.run(run_local())
+        failed = [result for result in results if not result["ok"]]
+        if not failed and len(results) == 9:
+            slowest = max(result["ms"] for result in results)
+            print(f"✅ HTTP interactions: {len(results)} bước đúng, chậm nhất {slowest:.0f}ms")
+            return True
+        print(f"❌ HTTP interactions sai: {[(result['step'], result['status'], result['type']) for result in failed]}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test HTTP interactions: {e}")
+        return False
+
+def test_config_file_watcher():
+    """Test hot-reload config.json: chỉ áp dụng guild thay đổi, bỏ qua file hỏng hoặc bị xoá, file thắng thay đổi chưa ghi, áp dụng sửa đổi lúc bot tắt"""
+    try:
+        from persistence import ConfigFileWatcher, atomic_write_json
+        from storage import GuildConfigStore, MetaStore
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, 'vouchbot.db')
+            json_path = os.path.join(tmp_dir, 'config.json')
+            store = GuildConfigStore(db_path, flush_delay=60)
+            applied = []
+
+            async def on_change(changes, removed):
+                applied.append((sorted(changes), sorted(removed)))
+                await store.apply_external(changes, removed)
+
+            async def scenario():
+                atomic_write_json(json_path, {"1": {"thankyou": "a"}, "2": {"thankyou": "b"}, "3": {"thankyou": "c"}})
+                store.import_json({"1": {"thankyou": "a"}, "2": {"thankyou": "b"}, "3": {"thankyou": "c"}})
+                watcher = ConfigFileWatcher(json_path, on_change, interval=0)
+                await watcher.prime()
+                unchanged = await watcher.check()
+
+                # Thay đổi cục bộ chưa ghi của guild 2 bị file ghi đè
+                local = store.get("2", {})
+                local["thankyou"] = "local"
+                store["2"] = local
+                atomic_write_json(json_path, {"1": {"thankyou": "a"}, "2": {"thankyou": "B"}, "4": {"thankyou": "d"}})
+                changed = await watcher.check()
+
+                with open(json_path, "w", encoding="utf-8") as f:
+                    f.write('{"1": {"thankyou": ')
+                broken = await watcher.check()
+
+                # Xoá config.json (file import cũ) không được xoá guild khỏi database
+                os.remove(json_path)
+                missing = await watcher.check()
+                return unchanged, changed, broken or missing, store.writer.pending
+
+            async def restart():
+                # Lần khởi động đầu: file là mốc; sửa file lúc bot tắt được áp dụng khi khởi động lại
+                meta = MetaStore(db_path)
+                atomic_write_json(json_path, {"1": {"thankyou": "a"}, "2": {"thankyou": "B"}, "4": {"thankyou": "d"}})
+                first = await ConfigFileWatcher(json_path, on_change, interval=0, meta=meta).prime()
+                atomic_write_json(json_path, {"1": {"thankyou": "A"}, "4": {"thankyou": "d"}})
+                second = await ConfigFileWatcher(json_path, on_change, interval=0, meta=meta).prime()
+                third = await ConfigFileWatcher(json_path, on_change, interval=0, meta=meta).prime()
+                meta.close()
+                return not first and second and not third
+
+            unchanged, changed, broken, pending = asyncio.run(scenario())
+            restarted = asyncio.run(restart())
+            store.close()
+            reopened = GuildConfigStore(db_path)
+            rows = {guild_id: reopened.get(guild_id) for guild_id in reopened}
+            reopened.close()
+
+        expected = {"1": {"thankyou": "A"}, "4": {"thankyou": "d"}}
+        if (not unchanged and changed and not broken and pending == 0 and restarted
+                and applied == [(["2", "4"], ["3"]), (["1"], ["2"])] and rows == expected):
+            print(f"✅ Config watcher: áp dụng {applied[0][0]}, xoá {applied[0][1]}, bỏ qua file hỏng/bị xoá, bắt kịp sửa đổi lúc tắt")
+            return True
+        print(f"❌ Config watcher sai: {applied} {rows} pending={pending} restarted={restarted}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test config watcher: {e}")
+        return False
+
+def test_vouch_dedupe():
+    """Test chống gửi trùng /vouch: TTL, giới hạn kích thước, gửi lại chỉ nhận trả lời ephemeral"""
+    try:
+        from dedupe import DedupeIndex, vouch_key
+        from bench_load import FakeGuild, FakeInteraction, FakeMember, FakeREST, FakeTextChannel, Stats
+        import vouch_bot1
+
+        now = [0.0]
+        index = DedupeIndex(ttl=10, max_size=2, clock=lambda: now[0])
+        key = vouch_key(1, 2, " Nitro  1 tháng", 1, "50K")
+        first = index.claim(key)
+        now[0] = 3.0
+        repeat = index.claim(vouch_key(1, 2, "nitro 1 tháng", 1, "50k"))
+        now[0] = 10.0
+        expired = index.claim(key)
+        index.claim("b")
+        index.claim("c")
+        evicted = key not in index._entries and len(index) == 2 and index.evicted == 1
+        index.release("c")
+        released = index.claim("c")
+
+        async def scenario():
+            stats = Stats()
+            rest = FakeREST(stats, latency=0.0, jitter=0.0, rate_429=0.0, retry_after=0.0)
+            guild = FakeGuild(1, FakeTextChannel(rest, 2))
+            staff = FakeMember(rest, 99)
+            buyer = FakeMember(rest, 4242)
+            vouch_bot1.recent_vouches.clear()
+            await vouch_bot1.vouch.callback(FakeInteraction("vouch", rest, stats, guild, staff), buyer, 1, "Nitro", "50k")
+            calls_first = stats.rest_calls
+            duplicate = FakeInteraction("vouch", rest, stats, guild, staff)
+            await vouch_bot1.vouch.callback(duplicate, buyer, 1, " nitro ", "50K")
+            return calls_first, stats.rest_calls - calls_first, duplicate.response.is_done()
+
+        calls_first, calls_repeat, answered = asyncio.run(scenario())
+        if (first is None and repeat == 0.0 and expired is None and evicted and released is None
+                and calls_first >= 2 and calls_repeat == 1 and answered):
+            print(f"✅ Dedupe /vouch: lần gửi trùng chỉ tốn 1 REST call (lần đầu {calls_first})")
+            return True
+        print(f"❌ Dedupe /vouch sai: {first} {repeat} {expired} {evicted} {released} {calls_first} {calls_repeat} {answered}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test dedupe /vouch: {e}")
+        return False
+
+def test_history_store():
+    """Test lịch sử vouch/feedback: backfill, lọc buyer/sản phẩm, keyset 100k sự kiện"""
+    try:
+        import sqlite3
+        import time
+        from storage import HistoryStore, RatingStore, VouchStore
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, 'vouchbot.db')
+            vouches = VouchStore(db_path)
+            ratings = RatingStore(db_path)
+            vouch_id = vouches.add(1, 42, 1, "Nitro", "50k", 10, message_id=20)
+            ratings.record(1, vouch_id, 42, "Nitro", 5)
+            history = HistoryStore(db_path)
+            backfilled, _, _ = history.page(1)
+            history.record_vouch(1, 2, 43, 99, "Spotify  Premium", 2, "30k")
+            history.record_feedback(1, 2, 43, "Spotify Premium", 2, "30k", 4, "Tốt")
+            by_buyer, _, _ = history.page(1, buyer_id=43)
+            by_product, _, _ = history.page(1, product="spotify premium")
+
+            # 100k sự kiện của một guild, xen kẽ guild khác
+            conn = sqlite3.connect(db_path)
+            now = time.time()
+            conn.executemany(
+                "INSERT INTO history (guild_id, kind, vouch_id, buyer_id, staff_id, product, product_key, quantity, price, stars, feedback, created_at) "
+                "VALUES (?, 'vouch', ?, ?, 99, 'Nitro', 'nitro', 1, '50k', NULL, NULL, ?)",
+                [(2 if i % 2 else 3, i, 1000 + i % 500, now + i) for i in range(200_000)]
+            )
+            conn.commit()
+            conn.close()
+
+            started = time.perf_counter()
+            first, has_older, has_newer = history.page(2)
+            first_ms = (time.perf_counter() - started) * 1000
+            # Trang sâu: mốc gần cuối lịch sử
+            started = time.perf_counter()
+            deep, _, _ = history.page(2, before=first[0].id - 150_000)
+            deep_ms = (time.perf_counter() - started) * 1000
+            buyer_page, _, _ = history.page(2, buyer_id=1001, before=first[0].id - 150_000)
+            second, _, _ = history.page(2, before=first[-1].id)
+            back, _, back_has_newer = history.page(2, after=second[0].id)
+            history.close()
+            vouches.close()
+            ratings.close()
+
+        # Nút chuyển trang giữ tên sản phẩm như đã nhập, custom_id lạ bị từ chối
+        import vouch_bot1
+        for i in range(12):
+            vouch_bot1.history_store.record_vouch(777, 5000 + i, 42, 99, "Nitro  1 Tháng", 1, "50k")
+        _, view = vouch_bot1.build_history_page(777, None, vouch_bot1.history_product(" Nitro  1 Tháng "))
+        older = view.children[1]
+        template = vouch_bot1.HistoryPageButton.__discord_ui_compiled_template__
+
+        async def parse(custom_id):
+            return await vouch_bot1.HistoryPageButton.from_custom_id(None, None, template.fullmatch(custom_id))
+
+        button = asyncio.run(parse(older.custom_id))
+        page_two, _ = vouch_bot1.build_history_page(777, button.buyer_id, button.product, before=button.cursor)
+        forged = asyncio.run(parse("vh:o:2s::" + "x" * 80))
+        buttons_ok = (older.custom_id.endswith(":Nitro 1 Tháng") and button.valid and page_two.title == "Lịch sử vouch: Nitro 1 Tháng"
+                      and not forged.valid and forged.product is None and template.fullmatch("vh:o:" + "1" * 20 + "::") is None)
+
+        if (buttons_ok and [event.kind for event in backfilled] == ["feedback", "vouch"]
+                and [event.kind for event in by_buyer] == ["feedback", "vouch"] and by_buyer[1].staff_id == 99
+                and len(by_product) == 2 and by_product[0].feedback == "Tốt"
+                and len(first) == 10 and has_older and not has_newer and len(deep) == 10
+                and all(event.buyer_id == 1001 for event in buyer_page) and len(buyer_page) == 10
+                and [event.id for event in back] == [event.id for event in first] and not back_has_newer
+                and first_ms < 50 and deep_ms < 50):
+            print(f"✅ History: trang đầu {first_ms:.2f}ms, trang sâu {deep_ms:.2f}ms trên 100k sự kiện")
+            return True
+        print(f"❌ History sai: {buttons_ok} {first_ms:.2f}ms {deep_ms:.2f}ms {[event.kind for event in backfilled]} {by_buyer} {len(buyer_page)}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test history: {e}")
+        return False
+
+def test_history_export():
+    """Test xuất lịch sử: gzip CSV/JSONL theo luồng, lọc ngày/sản phẩm, bộ nhớ không tăng theo số bản ghi"""
+    try:
+        import csv
+        import gzip
+        import json
+        import sqlite3
+        import subprocess
+        import tracemalloc
+        from export import parse_date_range, write_events
+        from storage import HistoryStore
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, 'vouchbot.db')
+            history = HistoryStore(db_path)
+            history.record_feedback(1, 7, 42, "Nitro", 1, "50k", 5, 'Giao nhanh, "uy tín"\nsẽ quay lại')
+            jan_start, jan_end = parse_date_range("2024-01-01", "2024-01-31")
+            conn = sqlite3.connect(db_path)
+            conn.executemany(
+                "INSERT INTO history (guild_id, kind, vouch_id, buyer_id, staff_id, product, product_key, quantity, price, stars, feedback, created_at) "
+                "VALUES (2, 'vouch', ?, ?, 99, ?, ?, 1, '50k', NULL, NULL, ?)",
+                [(i, 1000 + i % 500, "Nitro" if i % 4 else "Spotify", "nitro" if i % 4 else "spotify", jan_start - 86400 * 10 + i * 60) for i in range(60_000)]
+            )
+            conn.commit()
+            conn.close()
+
+            def peak_kib(count):
+                tracemalloc.start()
+                with open(os.devnull, "wb") as out:
+                    written = write_events(history.iter_events(2, since=jan_start - 86400 * 10, until=jan_start - 86400 * 10 + count * 60), out, "jsonl")
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                return written, peak / 1024
+
+            small_count, small_peak = peak_kib(5_000)
+            large_count, large_peak = peak_kib(60_000)
+
+            csv_path = os.path.join(tmp_dir, 'g1.csv.gz')
+            with open(csv_path, "wb") as out:
+                write_events(history.iter_events(1), out, "csv")
+            with gzip.open(csv_path, "rt", encoding="utf-8", newline="") as f:
+                rows = list(csv.DictReader(f))
+
+            jsonl_path = os.path.join(tmp_dir, 'jan.jsonl.gz')
+            cli = subprocess.run(
+                [sys.executable, "export.py", "--database", db_path, "--guild", "2", "--format", "jsonl",
+                 "--since", "2024-01-01", "--until", "2024-01-31", "--product", "spotify", "-o", jsonl_path],
+                capture_output=True, text=True, timeout=60
+            )
+            with gzip.open(jsonl_path, "rt", encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+            history.close()
+
+        expected_jan = sum(1 for i in range(60_000) if i % 4 == 0 and jan_start <= jan_start - 86400 * 10 + i * 60 < jan_end)
+        if (small_count == 5_000 and large_count == 60_000 and large_peak < small_peak * 2 + 256
+                and len(rows) == 1 and rows[0]["feedback"] == 'Giao nhanh, "uy tín"\nsẽ quay lại' and rows[0]["stars"] == "5"
+                and cli.returncode == 0 and len(records) == expected_jan
+                and all(record["product"] == "Spotify" and record["created_at"].startswith("2024-01") for record in records)):
+            print(f"✅ Export: {large_count} bản ghi với peak {large_peak:.0f}KiB ({small_count}: {small_peak:.0f}KiB), lọc ngày/sản phẩm {len(records)} bản ghi")
+            return True
+        print(f"❌ Export sai: {small_peak:.0f}/{large_peak:.0f}KiB {rows} {cli.returncode} {cli.stderr[-300:]} {len(records)}/{expected_jan}")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test export: {e}")
+        return False
+
+def test_reminder_scheduler():
+    """Test nhắc đánh giá: lịch nhắc, huỷ, claim giữa hai process, restart, 100k nhắc nhở đang chờ"""
+    try:
+        import sqlite3
+        import time
+        import tracemalloc
+        from reminders import ReminderScheduler, limit_delays, parse_delays
+        from storage import PendingVouch, ReminderStore
+
+        now = [0.0]
+        sent = []
+        rated = {2}
+
+        def get_vouch(vouch_id):
+            return PendingVouch(vouch_id, 1, 40 + vouch_id, 1, "Nitro", "50k", 10, 20,
+                                0.0, 1.0 if vouch_id in rated else None)
+
+        async def send(vouch_record, attempt):
+            sent.append((vouch_record.id, attempt))
+
+        def make(store, batch_size=200):
+            return ReminderScheduler(store, get_vouch, lambda guild_id: [10.0, 20.0], send,
+                                     batch_size=batch_size, clock=lambda: now[0])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, 'vouchbot.db')
+            store = ReminderStore(db_path)
+            scheduler = make(store)
+
+            async def schedule():
+                for vouch_id in (1, 2, 3):
+                    store.add(vouch_id, 1, scheduler.first_due(1))
+                store.cancel(3)
+                steps = []
+                for at in (5.0, 10.0, 25.0, 30.0):
+                    now[0] = at
+                    await scheduler.run_once()
+                    steps.append(list(sent))
+                # Hai process cùng thấy một nhắc nhở đến hạn: chỉ một bên gửi
+                store.add(4, 1, 40.0)
+                now[0] = 40.0
+                other = make(ReminderStore(db_path))
+                await asyncio.gather(scheduler.run_once(), other.run_once())
+                other.store.close()
+                return steps
+
+            steps = asyncio.run(schedule())
+            claimed_once = sent.count((4, 1)) == 1
+            store.add(5, 1, 50.0)
+            store.close()
+
+            # Restart: nhắc nhở còn trong database
+            store = ReminderStore(db_path)
+            restored = store.next_due() == 50.0
+            now[0] = 50.0
+            asyncio.run(make(store).run_once())
+            restored = restored and sent[-1] == (5, 1)
+            store.close()
+
+            # 100k nhắc nhở đang chờ: lấy lịch tiếp theo và một batch theo index
+            big_path = os.path.join(tmp_dir, 'big.db')
+            ReminderStore(big_path).close()
+            conn = sqlite3.connect(big_path)
+            conn.executemany("INSERT INTO reminders (vouch_id, guild_id, due_at) VALUES (?, 1, ?)",
+                             [(1000 + i, 1000.0 + (i * 7919) % 100_000) for i in range(100_000)])
+            conn.commit()
+            conn.close()
+            store = ReminderStore(big_path)
+            started = time.perf_counter()
+            first = store.next_due()
+            batch = store.due(1000.0 + 500, 200)
+            lookup_ms = (time.perf_counter() - started) * 1000
+            now[0] = 1000.0 + 100_000
+            big = make(store, batch_size=1000)
+            tracemalloc.start()
+            processed = asyncio.run(big.run_once())
+            peak_kib = tracemalloc.get_traced_memory()[1] / 1024
+            tracemalloc.stop()
+            pending = len(store)
+            store.close()
+
+        expected_steps = [[], [(1, 1)], [(1, 1)], [(1, 1), (1, 2)]]
+        if (steps == expected_steps and claimed_once and restored
+                and scheduler.dropped == 1 and first == 1000.0 and len(batch) == 200 and lookup_ms < 100
+                and processed == 1000 and pending == 100_000 and peak_kib < 2048
+                and parse_delays("24, 72") == [86400.0, 259200.0] and parse_delays("") == []
+                and limit_delays([1.0, 2.0], 3) == [1.0, 2.0, 2.0] and limit_delays([1.0, 2.0], 0) == []):
+            print(f"✅ Nhắc đánh giá: 100k đang chờ, tra lịch {lookup_ms:.1f}ms, batch 1000 peak {peak_kib:.0f}KiB")
+            return True
+        print(f"❌ Nhắc đánh giá sai: {steps} {sent[:8]} {claimed_once} {restored} {scheduler.dropped} {first} {len(batch)} {lookup_ms:.1f}ms {processed} {pending} {peak_kib:.0f}KiB")
+        return False
+
+    except Exception as e:
+        print(f"❌ Lỗi test nhắc đánh giá: {e}")
+        return False
+
 def test_modal_classes():
     """Test các Modal classes"""
     try:
@@ -109,6 +1381,31 @@ def main():
     tests = [
         ("Bot initialization", test_bot_initialization),
         ("Config functions", test_config_functions),
+        ("Write-behind config", test_write_behind_config),
+        ("Guild config store", test_guild_config_store),
+        ("Vouch store", test_vouch_store),
+        ("Star button custom_id", test_star_button_custom_id),
+        ("Command tree hash", test_command_tree_hash),
+        ("DM dispatcher", test_dm_dispatcher),
+        ("Vouchbulk pipeline", test_vouchbulk_pipeline),
+        ("Rating store", test_rating_store),
+        ("Health server", test_health_server),
+        ("Interaction instrumentation", test_interaction_instrumentation),
+        ("Ack-first feedback", test_ack_first_feedback),
+        ("Message templates", test_message_templates),
+        ("Structured logging", test_structured_logging),
+        ("Sharding", test_sharding),
+        ("Memory profile", test_memory_profile),
+        ("Startup budget", test_startup_budget),
+        ("Load harness", test_load_harness),
+        ("Feedback webhook pool", test_feedback_webhook_pool),
+        ("Outbound scheduler", test_outbound_scheduler),
+        ("HTTP interactions", test_http_interactions),
+        ("Config file watcher", test_config_file_watcher),
+        ("Vouch dedupe", test_vouch_dedupe),
+        ("History store", test_history_store),
+        ("History export", test_history_export),
+        ("Reminder scheduler", test_reminder_scheduler),
         ("Modal classes", test_modal_classes)
     ]
     
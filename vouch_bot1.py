@@ -1,33 +1,54 @@
 import os
+import sys
 import json
+import time
+import hashlib
 import logging
+import signal
+import re
 import asyncio
-from threading import Thread
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import tempfile
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Iterable, Optional
+# Mốc thời gian khởi động: import trước discord.py để đo được cả giai đoạn import
+from startup import profiler
 import discord
 from discord import app_commands
 from discord.ext import commands
 from dotenv import load_dotenv
+from instrumentation import instrumented, timed
+from logging_setup import SAMPLED, setup_logging, stop_logging
+from metrics import CONFIG_WRITE_SECONDS, VOUCH_DUPLICATES, registry
+from memory_profile import MEMORY_PROFILE, client_options
+from outbound import scheduled, scheduler as outbound
+from persistence import ConfigFileWatcher, atomic_write_json
+from sharding import SHARD_COUNT, SHARD_IDS, SHARDED, ShardTracker
+from bulk import BulkProgress, BulkRow, BulkRowError, TokenBucket, iter_rows, run_pipeline
+from dedupe import DedupeIndex, vouch_key
+from dm_queue import DMDispatcher, UserDM
+from export import FORMATS as EXPORT_FORMATS, export_filename, parse_date_range, write_events
+from http_interactions import InteractionEndpoint, TextChannelTransformer, load_verify_key
+from reminders import ReminderScheduler, limit_delays, parse_delays
+from storage import DATABASE_FILE, GuildConfigStore, HistoryEvent, HistoryStore, MetaStore, PendingVouch, RatingStore, ReminderStore, VouchStore
+from templates import TemplateCache
+from webhook_pool import MAX_FEEDBACK_WEBHOOKS, WebhookPoolCache, provision_webhooks
+
+if TYPE_CHECKING:
+    # aiohttp.web chỉ được import khi health server khởi động
+    from aiohttp import web
+
+profiler.mark("imports")
 
 # Load environment variables
 load_dotenv()
+profiler.mark("dotenv")
 
 # Setup logging - optimized for Railway
-log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
-logging.basicConfig(
-    level=getattr(logging, log_level, logging.INFO),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()  # Railway prefers stdout logging
-    ]
-)
+# Mọi I/O của log chạy trên luồng nền (QueueListener), không chặn event loop;
+# chỉ ghi bot.log khi không chạy trên Railway
+setup_logging(log_file=os.getenv('LOG_FILE') or (None if os.getenv('RAILWAY_ENVIRONMENT') else 'bot.log'))
 logger = logging.getLogger(__name__)
-
-# Add file logging only if not on Railway
-if not os.getenv('RAILWAY_ENVIRONMENT'):
-    file_handler = logging.FileHandler('bot.log', encoding='utf-8')
-    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-    logging.getLogger().addHandler(file_handler)
+profiler.mark("logging")
 
 # --- Cấu hình file lưu settings ---
 CONFIG_FILE = "config.json"
@@ -51,186 +72,543 @@ def load_config() -> dict:
     return {}
 
 def save_config(cfg: dict) -> None:
-    """Save configuration to JSON file with error handling"""
+    """Save configuration to JSON file atomically with error handling"""
     try:
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-            json.dump(cfg, f, ensure_ascii=False, indent=4)
+        atomic_write_json(CONFIG_FILE, cfg)
         logger.info("Configuration saved successfully")
     except Exception as e:
         logger.error(f"Error saving config file: {e}")
 
-# Khởi tạo config
-config = load_config()
-
-# Health check server for Railway
-class HealthCheckHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        if self.path == '/health':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            response = {
-                'status': 'healthy',
-                'bot_ready': bot.is_ready() if 'bot' in globals() else False
-            }
-            self.wfile.write(json.dumps(response).encode())
-        else:
-            self.send_response(404)
-            self.end_headers()
-    
-    def log_message(self, format, *args):
-        # Suppress default HTTP server logs
-        pass
+# Lưu các thông tin phụ của bot (hash command tree, ...)
+meta_store = MetaStore(DATABASE_FILE)
+
+# Lưu state của các vouch đang chờ đánh giá
+vouch_store = VouchStore(DATABASE_FILE)
+
+# Lưu đánh giá và thống kê sao cộng dồn theo guild/sản phẩm
+rating_store = RatingStore(DATABASE_FILE)
+
+# Lịch sử vouch/feedback cho /vouchhistory
+history_store = HistoryStore(DATABASE_FILE)
+
+# Nhắc buyer chưa bấm sao, sắp theo thời điểm đến hạn
+reminder_store = ReminderStore(DATABASE_FILE)
+
+# Hàng đợi gửi DM nền (workers được khởi động trong setup_hook)
+dm_dispatcher = DMDispatcher(
+    maxsize=int(os.getenv('DM_QUEUE_SIZE', '1000')),
+    workers=int(os.getenv('DM_WORKERS', '3')),
+    max_retries=int(os.getenv('DM_MAX_RETRIES', '3'))
+)
+
+# Vouch vừa tạo theo (guild, buyer, sản phẩm, số lượng, giá): staff bấm gửi lại
+# khi Discord lag sẽ không tạo tin nhắn và DM trùng
+recent_vouches = DedupeIndex(
+    ttl=float(os.getenv('VOUCH_DEDUPE_TTL', '60')),
+    max_size=int(os.getenv('VOUCH_DEDUPE_MAX', '10000'))
+)
+
+# Khởi tạo config: mỗi guild một dòng trong SQLite, ghi kiểu write-behind
+config = GuildConfigStore(DATABASE_FILE, flush_delay=float(os.getenv('CONFIG_FLUSH_DELAY', '1.0')))
+config.writer.on_write = CONFIG_WRITE_SECONDS.observe
+
+# Template tin nhắn đã biên dịch theo guild; xoá cache khi config branding thay đổi
+templates = TemplateCache(lambda guild_id: config.get(str(guild_id), {}))
+
+def forget_feedback_webhook(guild_id: int, webhook_id: int) -> None:
+    """Drop a deleted feedback webhook from the guild config"""
+    guild_cfg = config.get(str(guild_id), {})
+    entries = guild_cfg.get("feedback_webhooks") or []
+    guild_cfg["feedback_webhooks"] = [entry for entry in entries if int(entry["id"]) != webhook_id]
+    config[str(guild_id)] = guild_cfg
+
+# Webhook pool gửi feedback theo guild (chỉ khi /setupfeedback bật webhooks)
+webhook_pools = WebhookPoolCache(
+    lambda guild_id: config.get(str(guild_id), {}),
+    lambda webhook_id, token: discord.Webhook.partial(webhook_id, token, client=bot),
+    on_removed=forget_feedback_webhook
+)
+
+def invalidate_guild_caches(guild_ids: Optional[Iterable[int]] = None) -> None:
+    """Drop compiled templates and webhook pools of some guilds, or of all of them"""
+    if guild_ids is None:
+        templates.invalidate()
+        webhook_pools.invalidate()
+        return
+    for guild_id in guild_ids:
+        templates.invalidate(guild_id)
+        webhook_pools.invalidate(guild_id)
+
+# Worker khác (launcher.py) đổi config: template và webhook pool phải dựng lại
+config.on_reload = invalidate_guild_caches
+
+async def apply_config_file(changes: dict, removed: set) -> None:
+    """Apply guild entries changed in config.json while the bot runs"""
+    await config.apply_external(changes, removed)
+    # Không có await giữa hai bước: handler không thấy config mới với template cũ
+    invalidate_guild_caches(int(guild_id) for guild_id in set(changes) | removed)
+
+# Sửa config.json khi bot đang chạy (khôi phục backup, sửa hàng loạt, tool khác):
+# chỉ các guild thay đổi được áp dụng, không cần restart; snapshot lưu trong meta
+# nên sửa đổi lúc bot tắt được áp dụng khi khởi động lại
+config_watcher = ConfigFileWatcher(CONFIG_FILE, apply_config_file, interval=float(os.getenv('CONFIG_WATCH_INTERVAL', '2.0')), meta=meta_store)
+
+# Nhắc đánh giá: REMINDER_DELAYS (giờ) là khoảng cách giữa các lần nhắc, rỗng = tắt;
+# /setupreminder đặt số lần nhắc tối đa của từng guild
+REMINDER_DELAYS = parse_delays(os.getenv('REMINDER_DELAYS', '24,72'))
+MAX_REMINDERS = 5
+
+def reminder_delays(guild_id: int) -> list:
+    return limit_delays(REMINDER_DELAYS, config.get(str(guild_id), {}).get("reminder_limit"))
+
+def build_reminder_text(vouch_record: PendingVouch) -> str:
+    jump_url = f"https://discord.com/channels/{vouch_record.guild_id}/{vouch_record.channel_id}/{vouch_record.message_id}"
+    return templates.get(vouch_record.guild_id).reminder.render(
+        quantity=vouch_record.quantity, product=vouch_record.product, jump_url=jump_url
+    )
+
+async def send_rating_reminder(vouch_record: PendingVouch, attempt: int) -> None:
+    # Chỉ có id buyer: DM channel được mở khi dispatcher gửi
+    if not dm_dispatcher.enqueue(UserDM(bot, vouch_record.buyer_id), build_reminder_text(vouch_record)):
+        logger.warning(f"Could not queue rating reminder {attempt} to {vouch_record.buyer_id}")
+    else:
+        logger.info(f"Rating reminder {attempt} queued for vouch {vouch_record.id}", extra=SAMPLED)
+
+reminders = ReminderScheduler(reminder_store, vouch_store.get, reminder_delays, send_rating_reminder)
+
+profiler.mark("stores")
 
-def start_health_server():
-    """Start health check server for Railway"""
+def import_legacy_config() -> None:
+    """Move the old config.json into SQLite (only once); run from setup_hook, off the import path"""
+    if os.path.exists(CONFIG_FILE) and not config.json_imported:
+        config.import_json(load_config())
+
+# Health check + metrics server cho Railway, chạy trên event loop của bot
+def _gateway_latency():
+    latency = bot.latency
+    return [({}, latency)] if latency == latency and latency != float("inf") else []
+
+def _shard_latency():
+    return [({"shard": str(shard_id)}, info["latency"]) for shard_id, info in shard_tracker.status(bot).items() if info["latency"] is not None]
+
+def _shard_ready():
+    return [({"shard": str(shard_id)}, 1 if info["ready"] else 0) for shard_id, info in shard_tracker.status(bot).items()]
+
+registry.gauge("vouchbot_gateway_latency_seconds", "Gateway heartbeat latency", callback=_gateway_latency)
+registry.gauge("vouchbot_shard_latency_seconds", "Gateway heartbeat latency per shard", ("shard",), callback=_shard_latency)
+registry.gauge("vouchbot_shard_ready", "1 when the shard is connected and ready", ("shard",), callback=_shard_ready)
+registry.gauge("vouchbot_guilds", "Number of guilds the bot is in", callback=lambda: [({}, len(bot.guilds))])
+registry.gauge("vouchbot_dm_queue_depth", "DMs waiting to be sent", callback=lambda: [({}, dm_dispatcher.depth)])
+registry.gauge(
+    "vouchbot_outbound_queue_depth", "Discord REST calls waiting for an outbound scheduler slot", ("priority",),
+    callback=lambda: [({"priority": priority}, depth) for priority, depth in outbound.depths().items()]
+)
+registry.gauge("vouchbot_outbound_in_flight", "Discord REST calls in flight", callback=lambda: [({}, outbound.active)])
+registry.gauge("vouchbot_vouch_dedupe_entries", "Recent vouches remembered for duplicate detection", callback=lambda: [({}, len(recent_vouches))])
+registry.gauge("vouchbot_config_dirty_guilds", "Guild configs waiting to be flushed", callback=lambda: [({}, config.writer.pending)])
+
+async def handle_health(request: "web.Request") -> "web.Response":
+    from aiohttp import web
+    return web.json_response({
+        'status': 'healthy',
+        'bot_ready': bot.is_ready(),
+        'shards': {str(shard_id): info for shard_id, info in shard_tracker.status(bot).items()},
+        'startup': profiler.report()
+    })
+
+async def handle_ready(request: "web.Request") -> "web.Response":
+    from aiohttp import web
+    if interaction_endpoint is not None:
+        # Chế độ HTTP interactions: sẵn sàng khi đã đăng nhập REST
+        ready = bot.user is not None and not bot.is_closed()
+        return web.json_response({'ready': ready, 'mode': 'http'}, status=200 if ready else 503)
+    # Chỉ sẵn sàng khi mọi shard của process này đã kết nối
+    shards = shard_tracker.status(bot)
+    ready = bot.is_ready() and not bot.is_closed() and bool(shards) and all(info['ready'] for info in shards.values())
+    return web.json_response(
+        {'ready': ready, 'shards': {str(shard_id): info['ready'] for shard_id, info in shards.items()}},
+        status=200 if ready else 503
+    )
+
+async def handle_metrics(request: "web.Request") -> "web.Response":
+    from aiohttp import web
+    return web.Response(
+        body=registry.expose().encode('utf-8'),
+        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+    )
+
+async def start_health_server() -> "web.AppRunner":
+    """Start the health check and metrics server for Railway on the running loop"""
+    from aiohttp import web
     port = int(os.getenv('PORT', 8080))
-    server = HTTPServer(('0.0.0.0', port), HealthCheckHandler)
-    logger.info(f"Health check server starting on port {port}")
-    server.serve_forever()
+    app = web.Application()
+    app.router.add_get('/health', handle_health)
+    app.router.add_get('/ready', handle_ready)
+    app.router.add_get('/metrics', handle_metrics)
+    if interaction_endpoint is not None:
+        app.router.add_post('/interactions', interaction_endpoint.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '0.0.0.0', port).start()
+    logger.info(f"Health check server started on port {port}")
+    return runner
 
 # Modal để thiết lập lời cảm ơn
+# custom_id cố định để dựng lại modal từ custom_id (chế độ HTTP interactions)
 class ThankYouModal(discord.ui.Modal, title="Thiết lập Lời Cảm Ơn"):
     thankyou = discord.ui.TextInput(
         label="Lời cảm ơn",
-        style=discord.TextStyle.paragraph
+        style=discord.TextStyle.paragraph,
+        custom_id="thankyou"
     )
 
     def __init__(self, guild_id: int):
-        super().__init__()
+        super().__init__(custom_id=f"ty:{guild_id}")
         self.guild_id = str(guild_id)
 
+    @instrumented("thankyou_modal")
     async def on_submit(self, interaction: discord.Interaction):
         try:
             guild_cfg = config.get(self.guild_id, {})
             guild_cfg["thankyou"] = self.thankyou.value
             config[self.guild_id] = guild_cfg
-            save_config(config)
+            templates.invalidate(int(self.guild_id))
             logger.info(f"Thank you message set for guild {self.guild_id}")
-            await interaction.response.send_message("✅ Đã thiết lập lời cảm ơn thành công!", ephemeral=True)
+            await scheduled("ack", interaction.response.send_message("✅ Đã thiết lập lời cảm ơn thành công!", ephemeral=True))
         except Exception as e:
             logger.error(f"Error setting thank you message: {e}")
-            await interaction.response.send_message("❌ Có lỗi xảy ra khi thiết lập lời cảm ơn!", ephemeral=True)
+            await scheduled("ack", interaction.response.send_message("❌ Có lỗi xảy ra khi thiết lập lời cảm ơn!", ephemeral=True))
 
 # Modal thu thập feedback sau khi user bấm sao
 class FeedbackModal(discord.ui.Modal, title="Gửi Feedback"):
     feedback = discord.ui.TextInput(
         label="Feedback",
-        style=discord.TextStyle.paragraph
+        style=discord.TextStyle.paragraph,
+        custom_id="feedback"
     )
 
-    def __init__(self, buyer: discord.Member, stars: int, quantity: int, product: str, price: str, origin_channel: discord.TextChannel, original_message: discord.Message):
-        super().__init__()
-        self.buyer = buyer
+    def __init__(self, vouch_record: PendingVouch, stars: int):
+        super().__init__(custom_id=f"fb:{to_base36(vouch_record.id)}:{stars}")
+        self.vouch_record = vouch_record
         self.stars = stars
-        self.quantity = quantity
-        self.product = product
-        self.price = price
-        self.origin_channel = origin_channel
-        self.original_message = original_message
 
+    @instrumented("feedback_modal")
     async def on_submit(self, interaction: discord.Interaction):
         try:
-            # Tạo embed theo mẫu với màu #fc44c2
-            embed = discord.Embed(
-                title=f"Đã mua: {self.product}",
-                description=f"> • {self.feedback.value}",
-                color=0xfc44c2
-            )
-            embed.set_author(name="Cảm ơn quý khách đã ủng hộ !!!", icon_url=self.buyer.display_avatar.url)
-            embed.set_thumbnail(url=self.buyer.display_avatar.url)
-            
-            # Thêm phần đánh giá với emoji sao
-            star_icons = "<a:TwinklingStar:1388826311346356226>" * self.stars
-            embed.add_field(name="Đánh giá", value=star_icons, inline=False)
-            
-            # Sử dụng server avatar cho footer
+            # Người submit chính là buyer (đã kiểm tra khi bấm sao)
+            buyer = interaction.user
+            product = self.vouch_record.product
+
+            # Khung embed đã được dựng sẵn theo guild, chỉ điền nội dung
             server_icon = interaction.guild.icon.url if interaction.guild.icon else None
-            embed.set_footer(text="LewLewStore • discord.gg/lewlewstore", icon_url=server_icon)
+            embed = templates.get(interaction.guild_id).feedback_embed(
+                product, self.feedback.value, self.stars, buyer.display_avatar.url, server_icon
+            )
 
             # Xác định kênh feedback
             guild_cfg = config.get(str(interaction.guild_id), {})
             chan_id = guild_cfg.get("feedback_channel")
-            target = interaction.guild.get_channel(chan_id) if chan_id else self.origin_channel
+            target = interaction.guild.get_channel(chan_id) if chan_id else interaction.channel
+            if target is None and chan_id and bot.get_guild(interaction.guild_id) is None:
+                # Guild không có trong cache (chế độ HTTP interactions): gửi theo id kênh
+                target = bot.get_partial_messageable(chan_id, guild_id=interaction.guild_id)
 
-            if target:
-                await target.send(f"<:feedback1:1388824011617603689>•Feedback của {self.buyer.mention}:", embed=embed)
-                logger.info(f"Feedback sent for {self.buyer.id} with {self.stars} stars")
-                
-                # Cập nhật tin nhắn gốc
-                try:
-                    new_content = (
-                        "**LewLewStore** đã ghi nhận feedback của bạn\n\n"
-                        "Cảm ơn bạn đã tin tưởng và sử dụng dịch vụ tại **LewLewStore**"
-                    )
-                    await self.original_message.edit(content=new_content, view=None)
-                    logger.info(f"Original message updated for {self.buyer.id}")
-                except Exception as e:
-                    logger.error(f"Error updating original message: {e}")
-                
-                await interaction.response.send_message("✅ Cảm ơn feedback của bạn!", ephemeral=True)
-            else:
+            if not target:
                 logger.error(f"Could not find target channel for feedback")
-                await interaction.response.send_message("❌ Không thể gửi feedback, vui lòng thử lại!", ephemeral=True)
+                await scheduled("ack", interaction.response.send_message("❌ Không thể gửi feedback, vui lòng thử lại!", ephemeral=True))
+                return
+
+            # Ack ngay, các REST call chậm chạy nền sau đó
+            await scheduled("ack", interaction.response.defer(ephemeral=True, thinking=True))
+            spawn_background(
+                deliver_feedback(interaction, self.vouch_record, self.stars, target, embed, self.feedback.value),
+                name=f"feedback-{self.vouch_record.id}"
+            )
         except Exception as e:
             logger.error(f"Error submitting feedback: {e}")
-            await interaction.response.send_message("❌ Có lỗi xảy ra khi gửi feedback!", ephemeral=True)
+            try:
+                if not interaction.response.is_done():
+                    await scheduled("ack", interaction.response.send_message("❌ Có lỗi xảy ra khi gửi feedback!", ephemeral=True))
+                else:
+                    # Đã defer: buyer đang thấy "đang suy nghĩ…", phải trả lời bằng followup
+                    await scheduled("followup", interaction.followup.send(templates.get(interaction.guild_id).feedback_retry, ephemeral=True))
+            except Exception as e:
+                logger.error(f"Error reporting feedback failure: {e}")
+
+# Task nền đang chạy (giữ tham chiếu để task không bị GC, chờ khi tắt bot)
+background_tasks: set = set()
+
+def _background_done(task: asyncio.Task) -> None:
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed: {task.exception()}")
+
+def spawn_background(coro, name: Optional[str] = None) -> asyncio.Task:
+    """Run a coroutine as a tracked background task"""
+    task = asyncio.create_task(coro, name=name)
+    background_tasks.add(task)
+    task.add_done_callback(_background_done)
+    return task
 
-# Button 1-5 sao
-class StarButton(discord.ui.Button):
-    def __init__(self, stars: int):
-        super().__init__(label=f"{stars} sao", style=discord.ButtonStyle.primary, custom_id=f"star_{stars}")
+async def post_feedback(target: discord.abc.Messageable, buyer: discord.abc.User, embed: discord.Embed, vouch_record: PendingVouch, stars: int, guild_id: int, feedback: str = "") -> None:
+    """Post the feedback embed (through the guild's webhook pool when set up) and record the rating"""
+    header = templates.get(guild_id).feedback_header.render(buyer=buyer.mention)
+    pool = webhook_pools.get(guild_id)
+    if pool is not None and pool.channel_id == getattr(target, "id", None):
+        # Webhook có bucket rate-limit riêng; đăng dưới tên và avatar của bot
+        await pool.send(target, header, embed, username=bot.user.display_name, avatar_url=bot.user.display_avatar.url)
+    else:
+        await scheduled("send", target.send(header, embed=embed))
+    logger.info(f"Feedback sent for {buyer.id} with {stars} stars", extra=SAMPLED)
+    await asyncio.to_thread(record_feedback, vouch_record, buyer.id, stars, feedback)
+
+def record_feedback(vouch_record: PendingVouch, buyer_id: int, stars: int, feedback: str) -> None:
+    """Close the vouch, count the rating and log it in the history (runs in a worker thread)"""
+    if not vouch_store.mark_rated(vouch_record.id):
+        # Vouch đã được đánh giá (gửi modal hai lần): không cộng điểm lần nữa
+        logger.info(f"Vouch {vouch_record.id} already rated, rating not counted again")
+        return
+    rating_store.record(vouch_record.guild_id, vouch_record.id, buyer_id, vouch_record.product, stars)
+    history_store.record_feedback(
+        vouch_record.guild_id, vouch_record.id, buyer_id, vouch_record.product,
+        vouch_record.quantity, vouch_record.price, stars, feedback
+    )
+
+def record_vouch_posted(vouch_id: int, message_id: int, guild_id: int, buyer_id: int, staff_id: int, quantity: int, product: str, price: str,
+                        remind_at: Optional[float] = None) -> None:
+    """Attach the posted message to the vouch, log it in the history and schedule its first reminder (runs in a worker thread)"""
+    vouch_store.set_message(vouch_id, message_id)
+    history_store.record_vouch(guild_id, vouch_id, buyer_id, staff_id, product, quantity, price)
+    if remind_at is not None:
+        reminder_store.add(vouch_id, guild_id, remind_at)
+
+async def close_vouch_message(vouch_record: PendingVouch) -> None:
+    """Replace the original vouch message and drop its star buttons"""
+    new_content = templates.get(vouch_record.guild_id).feedback_done
+    # Chỉ cần id, không cần Message object
+    original_message = bot.get_partial_messageable(vouch_record.channel_id).get_partial_message(vouch_record.message_id)
+    await scheduled("edit", original_message.edit(content=new_content, view=None), key=original_message.id)
+    logger.info(f"Original message updated for vouch {vouch_record.id}", extra=SAMPLED)
+
+async def reopen_vouch_message(vouch_record: PendingVouch) -> None:
+    """Put the star buttons back after the feedback post failed"""
+    original_message = bot.get_partial_messageable(vouch_record.channel_id).get_partial_message(vouch_record.message_id)
+    await scheduled("edit", original_message.edit(
+        content=templates.get(vouch_record.guild_id).feedback_retry,
+        view=VouchView(vouch_record.id)
+    ), key=original_message.id)
+
+async def deliver_feedback(interaction: discord.Interaction, vouch_record: PendingVouch, stars: int, target: discord.abc.Messageable, embed: discord.Embed, feedback: str = "") -> None:
+    """Run the feedback side effects concurrently and report the outcome in a followup"""
+    buyer = interaction.user
+    posted, edited = await asyncio.gather(
+        post_feedback(target, buyer, embed, vouch_record, stars, interaction.guild_id, feedback),
+        close_vouch_message(vouch_record),
+        return_exceptions=True
+    )
+    if isinstance(edited, Exception):
+        logger.error(f"Error updating original message: {edited}")
+
+    if isinstance(posted, Exception):
+        logger.error(f"Error posting feedback for {buyer.id}: {posted}")
+        message = "❌ Không thể gửi feedback, vui lòng thử lại!"
+        if not isinstance(edited, Exception):
+            # Tin nhắn gốc đã bị đóng song song: gắn lại nút sao để buyer gửi lại
+            try:
+                await reopen_vouch_message(vouch_record)
+            except Exception as e:
+                logger.error(f"Error reopening vouch message {vouch_record.id}: {e}")
+    else:
+        message = "✅ Cảm ơn feedback của bạn!"
+        # Chỉ huỷ nhắc khi feedback đã được đăng: gửi lỗi thì buyer vẫn được nhắc
+        try:
+            await asyncio.to_thread(reminder_store.cancel, vouch_record.id)
+        except Exception as e:
+            logger.error(f"Error cancelling reminders for vouch {vouch_record.id}: {e}")
+    try:
+        await scheduled("followup", interaction.followup.send(message, ephemeral=True))
+    except Exception as e:
+        logger.error(f"Error sending feedback followup: {e}")
+
+def to_base36(number: int) -> str:
+    """Encode a non-negative integer in base 36 for compact custom_ids"""
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    encoded = ""
+    while True:
+        number, remainder = divmod(number, 36)
+        encoded = digits[remainder] + encoded
+        if number == 0:
+            return encoded
+
+# Button 1-5 sao. custom_id mang theo id vouch (base36), ví dụ "v:2s:5", nên
+# một dispatcher dynamic duy nhất xử lý click cho mọi vouch mà không cần giữ
+# view hay Member/Channel/Message nào trong bộ nhớ. "star_<n>" là custom_id
+# của các tin nhắn cũ, được tra theo message id.
+class StarButton(discord.ui.DynamicItem[discord.ui.Button], template=r"(?:v:(?P<vouch_id>[0-9a-z]+):|star_)(?P<stars>[1-5])"):
+    def __init__(self, vouch_id: int, stars: int):
+        super().__init__(
+            discord.ui.Button(
+                label=f"{stars} sao",
+                style=discord.ButtonStyle.primary,
+                custom_id=f"v:{to_base36(vouch_id)}:{stars}"
+            )
+        )
+        self.vouch_id = vouch_id
         self.stars = stars
 
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        vouch_id = int(match["vouch_id"], 36) if match["vouch_id"] else 0
+        return cls(vouch_id, int(match["stars"]))
+
+    @instrumented("star_button")
     async def callback(self, interaction: discord.Interaction):
         try:
+            # Lấy thông tin vouch từ store (theo id trong custom_id, hoặc message id với nút cũ)
+            if self.vouch_id:
+                vouch_record = await asyncio.to_thread(vouch_store.get, self.vouch_id)
+            else:
+                vouch_record = await asyncio.to_thread(vouch_store.get_by_message, interaction.message.id)
+            if vouch_record is None or vouch_record.rated_at is not None:
+                await scheduled("ack", interaction.response.send_message("❌ Vouch này không còn hiệu lực!", ephemeral=True))
+                return
+            if vouch_record.message_id is None:
+                vouch_record.message_id = interaction.message.id
+
             # Kiểm tra xem người click có phải là buyer không
-            view: VouchView = self.view  # type: ignore
-            if interaction.user.id != view.buyer.id:
-                await interaction.response.send_message("❌ Chỉ người mua mới có thể đánh giá!", ephemeral=True)
+            if interaction.user.id != vouch_record.buyer_id:
+                await scheduled("ack", interaction.response.send_message("❌ Chỉ người mua mới có thể đánh giá!", ephemeral=True))
                 return
                 
-            modal = FeedbackModal(
-                buyer=view.buyer,
-                stars=self.stars,
-                quantity=view.quantity,
-                product=view.product,
-                price=view.price,
-                origin_channel=view.origin_channel,
-                original_message=view.original_message
-            )
-            await interaction.response.send_modal(modal)
-            logger.info(f"Feedback modal opened for {view.buyer.id} with {self.stars} stars")
+            modal = FeedbackModal(vouch_record, self.stars)
+            await scheduled("ack", interaction.response.send_modal(modal))
+            logger.info(f"Feedback modal opened for {vouch_record.buyer_id} with {self.stars} stars", extra=SAMPLED)
         except Exception as e:
             logger.error(f"Error in star button callback: {e}")
-            await interaction.response.send_message("❌ Có lỗi xảy ra!", ephemeral=True)
+            await scheduled("ack", interaction.response.send_message("❌ Có lỗi xảy ra!", ephemeral=True))
 
-# View chứa các star button
+# View chứa các star button của một vouch. Chỉ dùng để render tin nhắn:
+# toàn bộ item là dynamic nên discord.py không lưu view này lại.
 class VouchView(discord.ui.View):
-    def __init__(self, buyer: discord.Member, quantity: int, product: str, price: str, origin_channel: discord.TextChannel):
+    def __init__(self, vouch_id: int):
         super().__init__(timeout=None)
-        self.buyer = buyer
-        self.quantity = quantity
-        self.product = product
-        self.price = price
-        self.origin_channel = origin_channel
-        self.original_message = None  # Sẽ được set sau khi gửi message
         for i in range(1, 6):
-            self.add_item(StarButton(i))
+            self.add_item(StarButton(vouch_id, i))
 
 # Khởi tạo bot với intents
-intents = discord.Intents.default()
-intents.message_content = False  # Không cần message content cho slash commands
-intents.guilds = True
-intents.guild_messages = True
-bot = commands.Bot(command_prefix="/", intents=intents)
+# MEMORY_PROFILE=low: chỉ giữ cache guild/channel, bỏ cache message/member
+bot_options = client_options(MEMORY_PROFILE)
+intents = bot_options["intents"]
+
+# SHARD_COUNT/SHARD_IDS (launcher.py đặt cho từng worker) hoặc SHARDED=true: nhiều shard trong một process
+class VouchBot(commands.AutoShardedBot if SHARDED else commands.Bot):
+    health_runner: Optional["web.AppRunner"] = None
+
+    async def setup_hook(self):
+        profiler.mark("login")
+        # Health check server chạy chung event loop với bot (for Railway)
+        if os.getenv('RAILWAY_ENVIRONMENT') or os.getenv('PORT') or interaction_endpoint is not None:
+            self.health_runner = await start_health_server()
+        await asyncio.to_thread(import_legacy_config)
+        if config_watcher.interval > 0:
+            await config_watcher.prime()
+            config_watcher.start()
+
+        # Dispatcher dynamic cho star button: còn hoạt động sau khi restart
+        self.add_dynamic_items(StarButton, HistoryPageButton)
+        dm_dispatcher.start()
+        # Nhắc nhở đã lên lịch trước khi restart vẫn được gửi
+        reminders.start()
+
+        # Railway dừng container bằng SIGTERM: đóng bot để kịp ghi config
+        try:
+            self.loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(self.close()))
+        except (NotImplementedError, RuntimeError):
+            pass
+        profiler.mark("setup_hook")
+
+    async def close(self):
+        # Cho các feedback đang gửi dở chạy xong
+        if background_tasks:
+            await asyncio.wait(set(background_tasks), timeout=5)
+        await reminders.stop()
+        await dm_dispatcher.stop()
+        await config_watcher.stop()
+        await config.flush()
+        if self.health_runner is not None:
+            await self.health_runner.cleanup()
+        await super().close()
+
+# FAST_STARTUP: chờ GUILD_CREATE ngắn hơn trước khi báo ready (mặc định của discord.py là 2 giây)
+if os.getenv('GUILD_READY_TIMEOUT'):
+    bot_options["guild_ready_timeout"] = float(os.getenv('GUILD_READY_TIMEOUT'))
+elif os.getenv('FAST_STARTUP', '').lower() in ('1', 'true', 'yes'):
+    bot_options["guild_ready_timeout"] = 0.5
+
+if SHARDED:
+    bot = VouchBot(command_prefix="/", shard_count=SHARD_COUNT, shard_ids=SHARD_IDS, **bot_options)
+else:
+    bot = VouchBot(command_prefix="/", **bot_options)
+shard_tracker = ShardTracker()
+profiler.mark("bot")
+
+@bot.event
+async def on_shard_ready(shard_id: int):
+    shard_tracker.mark(shard_id, True)
+    logger.info(f"Shard {shard_id} ready")
+
+@bot.event
+async def on_shard_resumed(shard_id: int):
+    shard_tracker.mark(shard_id, True)
+
+@bot.event
+async def on_shard_disconnect(shard_id: int):
+    shard_tracker.mark(shard_id, False)
+    logger.warning(f"Shard {shard_id} disconnected")
+
+# Chỉ sync slash commands khi command tree thay đổi (hoặc khi chạy với --force-sync)
+FORCE_SYNC = "--force-sync" in sys.argv or os.getenv('FORCE_SYNC', '').lower() in ('1', 'true', 'yes')
+_commands_synced = False
+
+def command_tree_hash(tree: app_commands.CommandTree) -> str:
+    """Stable hash of the serialized global command tree"""
+    payload = sorted((cmd.to_dict(tree) for cmd in tree.get_commands()), key=lambda cmd: cmd["name"])
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+async def sync_commands_if_changed() -> None:
+    """Sync the command tree only when its hash differs from the last synced one"""
+    global _commands_synced
+    # on_ready chạy lại sau mỗi lần reconnect: trong cùng process chỉ sync một lần
+    if _commands_synced:
+        return
+    # Nhiều worker của launcher: chỉ process giữ shard 0 sync
+    if bot.shard_ids is not None and 0 not in bot.shard_ids:
+        _commands_synced = True
+        return
+    tree_hash = command_tree_hash(bot.tree)
+    hash_key = f"command_tree_hash:{bot.application_id}"
+    if not FORCE_SYNC and meta_store.get(hash_key) == tree_hash:
+        _commands_synced = True
+        saved_ms = float(meta_store.get("command_sync_seconds", "0")) * 1000
+        logger.info(f"Command tree unchanged ({tree_hash[:12]}), skipped sync - saved ~{saved_ms:.0f}ms")
+        return
+    started = time.perf_counter()
+    synced = await bot.tree.sync()
+    elapsed = time.perf_counter() - started
+    meta_store.set(hash_key, tree_hash)
+    meta_store.set("command_sync_seconds", f"{elapsed:.3f}")
+    _commands_synced = True
+    logger.info(f"Đã sync {len(synced)} slash commands in {elapsed * 1000:.0f}ms ({tree_hash[:12]})")
 
 @bot.event
 async def on_ready():
     try:
-        # Sync tất cả slash commands
-        synced = await bot.tree.sync()
-        logger.info(f"Bot {bot.user} đã sẵn sàng! Đã sync {len(synced)} slash commands")
+        profiler.mark_once("ready")
+        await sync_commands_if_changed()
+        if not profiler.has("command_sync"):
+            profiler.mark("command_sync")
+            profiler.log()
+        logger.info(f"Bot {bot.user} đã sẵn sàng!")
         print(f"✅ Bot đang chạy: {bot.user}")
     except Exception as e:
         logger.error(f"Error during bot startup: {e}")
@@ -264,44 +642,169 @@ async def on_application_command_error(interaction: discord.Interaction, error):
 
 # /setupvouch: modal để nhập lời cảm ơn
 @bot.tree.command(name="setupvouch", description="Thiết lập lời cảm ơn cho lệnh vouch")
+@instrumented("setupvouch")
 async def setupvouch(interaction: discord.Interaction):
     try:
         # Kiểm tra quyền admin
-        if not interaction.user.guild_permissions.administrator:
-            await interaction.response.send_message("❌ Bạn cần quyền Administrator để sử dụng lệnh này!", ephemeral=True)
+        if not interaction.permissions.administrator:
+            await scheduled("ack", interaction.response.send_message("❌ Bạn cần quyền Administrator để sử dụng lệnh này!", ephemeral=True))
             return
             
-        await interaction.response.send_modal(ThankYouModal(interaction.guild_id))
+        await scheduled("ack", interaction.response.send_modal(ThankYouModal(interaction.guild_id)))
         logger.info(f"Setup vouch modal opened by {interaction.user.id} in guild {interaction.guild_id}")
     except Exception as e:
         logger.error(f"Error in setupvouch command: {e}")
-        await interaction.response.send_message("❌ Có lỗi xảy ra!", ephemeral=True)
+        await scheduled("ack", interaction.response.send_message("❌ Có lỗi xảy ra!", ephemeral=True))
 
-# /setupfeedback: chọn kênh nhận feedback
+# /setupfeedback: chọn kênh nhận feedback, tuỳ chọn gửi qua webhook pool
 @bot.tree.command(name="setupfeedback", description="Chọn kênh để gửi feedback")
-@app_commands.describe(channel="Kênh sẽ nhận feedback")
-async def setupfeedback(interaction: discord.Interaction, channel: discord.TextChannel):
+@app_commands.describe(
+    channel="Kênh sẽ nhận feedback",
+    webhooks=f"Số webhook dùng để gửi feedback (0-{MAX_FEEDBACK_WEBHOOKS}, 0 = gửi bằng bot)"
+)
+@instrumented("setupfeedback")
+async def setupfeedback(
+    interaction: discord.Interaction,
+    channel: app_commands.Transform[discord.TextChannel, TextChannelTransformer],
+    webhooks: app_commands.Range[int, 0, MAX_FEEDBACK_WEBHOOKS] = 0
+):
     try:
         # Kiểm tra quyền admin
-        if not interaction.user.guild_permissions.administrator:
-            await interaction.response.send_message("❌ Bạn cần quyền Administrator để sử dụng lệnh này!", ephemeral=True)
+        if not interaction.permissions.administrator:
+            await scheduled("ack", interaction.response.send_message("❌ Bạn cần quyền Administrator để sử dụng lệnh này!", ephemeral=True))
             return
             
-        # Kiểm tra bot có quyền gửi tin nhắn trong kênh không
-        if not channel.permissions_for(interaction.guild.me).send_messages:
-            await interaction.response.send_message(f"❌ Bot không có quyền gửi tin nhắn trong {channel.mention}!", ephemeral=True)
-            return
+        # Kiểm tra bot có quyền gửi tin nhắn trong kênh không. Chế độ HTTP
+        # interactions không có cache kênh/role: lỗi quyền sẽ lộ ra khi gửi
+        if isinstance(channel, discord.TextChannel):
+            permissions = channel.permissions_for(interaction.guild.me)
+            if not permissions.send_messages:
+                await scheduled("ack", interaction.response.send_message(f"❌ Bot không có quyền gửi tin nhắn trong {channel.mention}!", ephemeral=True))
+                return
+            if webhooks and not permissions.manage_webhooks:
+                await scheduled("ack", interaction.response.send_message(f"❌ Bot cần quyền Manage Webhooks trong {channel.mention} để dùng webhook!", ephemeral=True))
+                return
             
         guild_cfg = config.get(str(interaction.guild_id), {})
         guild_cfg["feedback_channel"] = channel.id
+        if webhooks:
+            # Tạo webhook là REST call: ack trước
+            await scheduled("ack", interaction.response.defer(ephemeral=True, thinking=True))
+            text_channel = channel if isinstance(channel, discord.TextChannel) else await scheduled("fetch_channel", channel.fetch())
+            pool = await provision_webhooks(text_channel, bot.user.id, webhooks)
+            guild_cfg["feedback_webhooks"] = [{"id": webhook.id, "token": webhook.token} for webhook in pool]
+        else:
+            guild_cfg.pop("feedback_webhooks", None)
         config[str(interaction.guild_id)] = guild_cfg
-        save_config(config)
+        webhook_pools.invalidate(interaction.guild_id)
         
-        logger.info(f"Feedback channel set to {channel.id} in guild {interaction.guild_id}")
-        await interaction.response.send_message(f"✅ Đã thiết lập kênh feedback: {channel.mention}", ephemeral=True)
+        logger.info(f"Feedback channel set to {channel.id} with {webhooks} webhook(s) in guild {interaction.guild_id}")
+        if webhooks:
+            await scheduled("followup", interaction.followup.send(f"✅ Đã thiết lập kênh feedback: {channel.mention} (gửi qua {webhooks} webhook)", ephemeral=True))
+        else:
+            await scheduled("ack", interaction.response.send_message(f"✅ Đã thiết lập kênh feedback: {channel.mention}", ephemeral=True))
     except Exception as e:
         logger.error(f"Error in setupfeedback command: {e}")
-        await interaction.response.send_message("❌ Có lỗi xảy ra!", ephemeral=True)
+        if not interaction.response.is_done():
+            await scheduled("ack", interaction.response.send_message("❌ Có lỗi xảy ra!", ephemeral=True))
+        else:
+            await scheduled("followup", interaction.followup.send("❌ Có lỗi xảy ra!", ephemeral=True))
+
+# /setupbrand: tên shop, link server, kênh vouch và emoji sao
+@bot.tree.command(name="setupbrand", description="Thiết lập tên shop và kênh vouch cho tin nhắn của bot")
+@app_commands.describe(
+    brand="Tên shop",
+    invite="Link server (hiện ở footer feedback)",
+    vouch_channel="Kênh khách dán lệnh +vouch",
+    star_emoji="Emoji dùng cho sao đánh giá"
+)
+@instrumented("setupbrand")
+async def setupbrand(
+    interaction: discord.Interaction,
+    brand: Optional[str] = None,
+    invite: Optional[str] = None,
+    vouch_channel: Optional[discord.TextChannel] = None,
+    star_emoji: Optional[str] = None
+):
+    try:
+        # Kiểm tra quyền admin
+        if not interaction.permissions.administrator:
+            await scheduled("ack", interaction.response.send_message("❌ Bạn cần quyền Administrator để sử dụng lệnh này!", ephemeral=True))
+            return
+
+        changes = {"brand": brand, "invite": invite, "emoji_star": star_emoji}
+        changes = {key: value.strip() for key, value in changes.items() if value and value.strip()}
+        if vouch_channel is not None:
+            changes["vouch_channel"] = vouch_channel.id
+        if not changes:
+            await scheduled("ack", interaction.response.send_message("❌ Vui lòng nhập ít nhất một giá trị!", ephemeral=True))
+            return
+
+        guild_cfg = config.get(str(interaction.guild_id), {})
+        guild_cfg.update(changes)
+        config[str(interaction.guild_id)] = guild_cfg
+        templates.invalidate(interaction.guild_id)
+
+        logger.info(f"Branding updated in guild {interaction.guild_id}: {', '.join(changes)}")
+        await scheduled("ack", interaction.response.send_message("✅ Đã cập nhật thông tin shop!", ephemeral=True))
+    except Exception as e:
+        logger.error(f"Error in setupbrand command: {e}")
+        await scheduled("ack", interaction.response.send_message("❌ Có lỗi xảy ra!", ephemeral=True))
+
+# /setupreminder: số lần nhắc buyer chưa đánh giá
+@bot.tree.command(name="setupreminder", description="Thiết lập số lần nhắc buyer chưa đánh giá")
+@app_commands.describe(limit=f"Số lần nhắc tối đa cho mỗi vouch (0-{MAX_REMINDERS}, 0 = tắt)")
+@instrumented("setupreminder")
+async def setupreminder(interaction: discord.Interaction, limit: app_commands.Range[int, 0, MAX_REMINDERS]):
+    try:
+        # Kiểm tra quyền admin
+        if not interaction.permissions.administrator:
+            await scheduled("ack", interaction.response.send_message("❌ Bạn cần quyền Administrator để sử dụng lệnh này!", ephemeral=True))
+            return
+        if not REMINDER_DELAYS:
+            await scheduled("ack", interaction.response.send_message("❌ Tính năng nhắc đánh giá đang tắt trên bot (REMINDER_DELAYS)!", ephemeral=True))
+            return
+
+        guild_cfg = config.get(str(interaction.guild_id), {})
+        guild_cfg["reminder_limit"] = limit
+        config[str(interaction.guild_id)] = guild_cfg
+        # Nhắc nhở đã lên lịch vượt giới hạn mới sẽ bị bỏ khi đến hạn
+        logger.info(f"Reminder limit set to {limit} in guild {interaction.guild_id}")
+        if limit:
+            hours = ", ".join(f"{delay / 3600:g}" for delay in reminder_delays(interaction.guild_id))
+            text = f"✅ Buyer chưa đánh giá sẽ được nhắc tối đa {limit} lần (sau {hours} giờ)."
+        else:
+            text = "✅ Đã tắt nhắc đánh giá cho server này."
+        await scheduled("ack", interaction.response.send_message(text, ephemeral=True))
+    except Exception as e:
+        logger.error(f"Error in setupreminder command: {e}")
+        await scheduled("ack", interaction.response.send_message("❌ Có lỗi xảy ra!", ephemeral=True))
+
+# --- Dùng chung cho /vouch và /vouchbulk ---
+def validate_vouch(buyer: discord.Member, quantity: int, product: str, price: str):
+    """Return an error message for invalid vouch input, or None when it is valid"""
+    if quantity <= 0:
+        return "❌ Số lượng phải lớn hơn 0!"
+    if len(product.strip()) == 0:
+        return "❌ Tên sản phẩm không được để trống!"
+    if len(price.strip()) == 0:
+        return "❌ Giá không được để trống!"
+    if buyer.bot:
+        return "❌ Không thể tạo vouch cho bot!"
+    return None
+
+def duplicate_vouch_text(buyer: discord.Member, quantity: int, product: str, claimed_at: float) -> str:
+    seconds = max(0, int(recent_vouches.clock() - claimed_at))
+    return f"⚠️ Đã vouch cho {buyer.mention} ({quantity} {product}) {seconds} giây trước, bỏ qua lần gửi trùng."
+
+def build_vouch_text(guild_id: int, buyer: discord.Member, quantity: int, product: str, price: str) -> str:
+    """Build the public vouch message from the guild's compiled template"""
+    # Tin nhắn thường thay vì embed
+    return templates.get(guild_id).vouch.render(buyer=buyer.mention, quantity=quantity, product=product, price=price)
+
+def build_dm_text(guild_id: int, product: str, channel: discord.abc.GuildChannel) -> str:
+    """Build the DM telling the buyer where to confirm and rate the order"""
+    return templates.get(guild_id).dm.render(product=product, channel=channel.mention)
 
 # /vouch: gửi thông báo và DM buyer
 @bot.tree.command(name="vouch", description="Gửi thông tin vouch và khởi tạo feedback")
@@ -311,6 +814,7 @@ async def setupfeedback(interaction: discord.Interaction, channel: discord.TextC
     product="Sản phẩm",
     price="Giá"
 )
+@instrumented("vouch")
 async def vouch(
     interaction: discord.Interaction,
     buyer: discord.Member,
@@ -318,74 +822,450 @@ async def vouch(
     product: str,
     price: str
 ):
+    key = None
     try:
         # Validation
-        if quantity <= 0:
-            await interaction.response.send_message("❌ Số lượng phải lớn hơn 0!", ephemeral=True)
-            return
-            
-        if len(product.strip()) == 0:
-            await interaction.response.send_message("❌ Tên sản phẩm không được để trống!", ephemeral=True)
-            return
-            
-        if len(price.strip()) == 0:
-            await interaction.response.send_message("❌ Giá không được để trống!", ephemeral=True)
+        error = validate_vouch(buyer, quantity, product, price)
+        if error:
+            await scheduled("ack", interaction.response.send_message(error, ephemeral=True))
             return
-            
-        if buyer.bot:
-            await interaction.response.send_message("❌ Không thể tạo vouch cho bot!", ephemeral=True)
+
+        # Gửi trùng trong cửa sổ dedupe: chỉ trả lời ephemeral, không lưu/gửi gì thêm
+        key = vouch_key(interaction.guild_id, buyer.id, product, quantity, price)
+        claimed_at = recent_vouches.claim(key)
+        if claimed_at is not None:
+            VOUCH_DUPLICATES.inc(command="vouch")
+            logger.info(f"Duplicate vouch for {buyer.id} by {interaction.user.id} in guild {interaction.guild_id} skipped", extra=SAMPLED)
+            await scheduled("ack", interaction.response.send_message(duplicate_vouch_text(buyer, quantity, product, claimed_at), ephemeral=True))
+            key = None
             return
             
-        guild_cfg = config.get(str(interaction.guild_id), {})
-        thankyou = guild_cfg.get("thankyou", "Cảm ơn")
-
-        # Tạo tin nhắn thường thay vì embed
-        vouch_text = (
-            f"<:giveaway1:1388824182237958155> **Giao dịch thành công!**\n\n"
-            f"{thankyou} {buyer.mention}\n\n"
-            f"<:Shop1:1388824257748013181>**LewLewStore** xin bạn một ít phút để đánh giá dịch vụ tại đây nhé !!! chúng mình luôn muốn lắng nghe góp ý của các bạn và cải thiện dịch vụ tại **LewLewStore**\n\n"
-            f"```+vouch {buyer.mention} x{quantity} {product} {price} vnd legit```\n"
-            f"- Mình xin chút ít thời gian của bạn để ủng hộ mình 1 vouch bằng cách sao chép nội dung ở trên và dán ở <#1294909151515774999> hoặc 1 feedback bằng nút bên dưới (có thể cả vừa vouch và feeddback nếu bạn muốn)"
-        )
+        vouch_text = build_vouch_text(interaction.guild_id, buyer, quantity, product, price)
         
+        # Lưu state vouch trước, id của nó được gắn vào custom_id của các nút
+        vouch_id = await asyncio.to_thread(
+            vouch_store.add,
+            interaction.guild_id, buyer.id, quantity, product, price, interaction.channel_id
+        )
+
         # Tạo view và gửi tin nhắn
-        view = VouchView(buyer, quantity, product, price, interaction.channel)
-        await interaction.response.send_message(
+        await scheduled("ack", interaction.response.send_message(
             content=vouch_text,
-            view=view
-        )
+            view=VouchView(vouch_id)
+        ))
         
-        # Lưu original message vào view
-        original_message = await interaction.original_response()
-        view.original_message = original_message
+        # Lưu message id để có thể sửa tin nhắn gốc sau khi nhận feedback
+        original_message = await scheduled("original_response", interaction.original_response())
+        remind_at = reminders.first_due(interaction.guild_id)
+        await asyncio.to_thread(
+            record_vouch_posted,
+            vouch_id, original_message.id, interaction.guild_id, buyer.id, interaction.user.id, quantity, product, price, remind_at
+        )
+        reminders.wake(remind_at)
         
-        logger.info(f"Vouch created for {buyer.id} by {interaction.user.id} in guild {interaction.guild_id}")
+        logger.info(f"Vouch created for {buyer.id} by {interaction.user.id} in guild {interaction.guild_id}", extra=SAMPLED)
 
         # Gửi DM cho buyer
-        dm_text = (
-            f"<:giveaway1:1388824182237958155>Đơn hàng **{product}** của bạn đã hoàn thành\n\n"
-            f"Bạn hãy vào {interaction.channel.mention} để xác nhận đơn hàng và dành chút ít thời gian để đánh giá, góp ý dịch vụ bên mình bạn nhé !!!"
-        )
-        try:
-            await buyer.send(dm_text)
-            logger.info(f"DM sent successfully to {buyer.id}")
-        except discord.Forbidden:
-            logger.warning(f"Could not send DM to {buyer.id} - DMs disabled")
+        dm_text = build_dm_text(interaction.guild_id, product, interaction.channel)
+
+        async def notify_dm_failed(error: Exception):
             # Thông báo trong channel nếu không gửi được DM
-            await interaction.followup.send(
-                f"⚠️ Không thể gửi tin nhắn riêng cho {buyer.mention}. "
-                "Vui lòng kiểm tra cài đặt tin nhắn riêng của bạn.",
-                ephemeral=True
-            )
-        except Exception as e:
-            logger.error(f"Error sending DM to {buyer.id}: {e}")
+            if isinstance(error, discord.Forbidden):
+                await scheduled("followup", interaction.followup.send(
+                    f"⚠️ Không thể gửi tin nhắn riêng cho {buyer.mention}. "
+                    "Vui lòng kiểm tra cài đặt tin nhắn riêng của bạn.",
+                    ephemeral=True
+                ))
+
+        # DM được gửi nền bởi dm_dispatcher, handler không phải chờ
+        if not dm_dispatcher.enqueue(buyer, dm_text, on_failure=notify_dm_failed):
+            logger.warning(f"Could not queue DM to {buyer.id}")
             
     except Exception as e:
         logger.error(f"Error in vouch command: {e}")
         if not interaction.response.is_done():
-            await interaction.response.send_message("❌ Có lỗi xảy ra khi tạo vouch!", ephemeral=True)
+            # Tin nhắn vouch chưa được gửi: cho phép gửi lại ngay
+            if key is not None:
+                recent_vouches.release(key)
+            await scheduled("ack", interaction.response.send_message("❌ Có lỗi xảy ra khi tạo vouch!", ephemeral=True))
+        else:
+            await scheduled("followup", interaction.followup.send("❌ Có lỗi xảy ra khi tạo vouch!", ephemeral=True))
+
+# /stats: thống kê đánh giá, đọc từ bộ đếm cộng dồn (O(1))
+@bot.tree.command(name="stats", description="Xem thống kê đánh giá của server hoặc một sản phẩm")
+@app_commands.describe(product="Sản phẩm (bỏ trống để xem toàn server)")
+@instrumented("stats")
+async def stats(interaction: discord.Interaction, product: Optional[str] = None):
+    try:
+        rating_stats = await asyncio.to_thread(rating_store.get_stats, interaction.guild_id, product)
+        if rating_stats is None:
+            await scheduled("ack", interaction.response.send_message("📭 Chưa có đánh giá nào!", ephemeral=True))
+            return
+
+        embed = discord.Embed(
+            title=f"Thống kê đánh giá: {product}" if product else "Thống kê đánh giá toàn server",
+            color=0xfc44c2
+        )
+        embed.add_field(name="Số đánh giá", value=str(rating_stats["count"]), inline=True)
+        embed.add_field(name="Điểm trung bình", value=f"{rating_stats['average']:.2f} / 5", inline=True)
+        histogram = "\n".join(
+            f"{stars} ⭐: {rating_stats['histogram'][stars]}" for stars in range(5, 0, -1)
+        )
+        embed.add_field(name="Phân bố", value=histogram, inline=False)
+        embed.set_footer(text="Cập nhật lần cuối")
+        embed.timestamp = datetime.fromtimestamp(rating_stats["updated_at"], tz=timezone.utc)
+
+        await scheduled("ack", interaction.response.send_message(embed=embed, ephemeral=True))
+    except Exception as e:
+        logger.error(f"Error in stats command: {e}")
+        await scheduled("ack", interaction.response.send_message("❌ Có lỗi xảy ra!", ephemeral=True))
+
+# /vouchhistory: tra lịch sử vouch/feedback, phân trang theo keyset (id sự kiện)
+HISTORY_PAGE_SIZE = 10
+# custom_id của nút chuyển trang tối đa 100 ký tự và mang theo bộ lọc sản phẩm
+HISTORY_PRODUCT_MAX = 60
+
+def history_product(product: Optional[str]) -> Optional[str]:
+    """Product filter as shown in the page title: the name as typed, with spaces collapsed"""
+    product = " ".join((product or "").split())
+    return product or None
+
+def format_history_event(event: HistoryEvent) -> str:
+    when = f"<t:{int(event.created_at)}:d>"
+    if event.kind == "vouch":
+        staff = f" (bởi <@{event.staff_id}>)" if event.staff_id else ""
+        return f"{when} 🛒 <@{event.buyer_id}> mua {event.quantity} {event.product} - {event.price}{staff}"
+    feedback = f": {event.feedback[:100]}" if event.feedback else ""
+    return f"{when} {'⭐' * event.stars} <@{event.buyer_id}> - {event.product}{feedback}"
+
+def build_history_page(guild_id: int, buyer_id: Optional[int], product: Optional[str],
+                       before: Optional[int] = None, after: Optional[int] = None):
+    """Embed and paging buttons for one page of the guild's history (runs in a worker thread)"""
+    events, has_older, has_newer = history_store.page(guild_id, buyer_id, product, before=before, after=after, limit=HISTORY_PAGE_SIZE)
+    if not events:
+        return None, None
+    title = "Lịch sử vouch"
+    if product:
+        title += f": {product}"
+    embed = discord.Embed(title=title, description="\n".join(format_history_event(event) for event in events), color=0xfc44c2)
+    if buyer_id is not None:
+        embed.add_field(name="Buyer", value=f"<@{buyer_id}>", inline=True)
+    view = discord.ui.View(timeout=None)
+    view.add_item(HistoryPageButton("n", events[0].id, buyer_id, product, disabled=not has_newer))
+    view.add_item(HistoryPageButton("o", events[-1].id, buyer_id, product, disabled=not has_older))
+    return embed, view
+
+# Nút chuyển trang. custom_id mang hướng, id sự kiện làm mốc và bộ lọc, ví dụ
+# "vh:o:2s:1a2b:Nitro 1 tháng", nên trang sau được đọc thẳng từ index mà không
+# cần giữ state, kể cả sau khi restart hoặc ở chế độ HTTP interactions
+class HistoryPageButton(discord.ui.DynamicItem[discord.ui.Button], template=r"vh:(?P<direction>[on]):(?P<cursor>[0-9a-z]{1,13}):(?P<buyer>[0-9a-z]{0,13}):(?P<product>.*)"):
+    def __init__(self, direction: str, cursor: int, buyer_id: Optional[int], product: Optional[str], disabled: bool = False):
+        buyer = to_base36(buyer_id) if buyer_id is not None else ""
+        super().__init__(
+            discord.ui.Button(
+                label="◀ Mới hơn" if direction == "n" else "Cũ hơn ▶",
+                style=discord.ButtonStyle.secondary,
+                custom_id=f"vh:{direction}:{to_base36(cursor)}:{buyer}:{product or ''}",
+                disabled=disabled
+            )
+        )
+        self.direction = direction
+        self.cursor = cursor
+        self.buyer_id = buyer_id
+        self.product = product
+        self.valid = True
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        buyer_id = int(match["buyer"], 36) if match["buyer"] else None
+        product = match["product"] or None
+        valid = product is None or (len(product) <= HISTORY_PRODUCT_MAX and history_product(product) == product)
+        button = cls(match["direction"], int(match["cursor"], 36), buyer_id, product if valid else None)
+        button.valid = valid
+        return button
+
+    @instrumented("history_page")
+    async def callback(self, interaction: discord.Interaction):
+        try:
+            if not interaction.permissions.manage_messages:
+                await scheduled("ack", interaction.response.send_message("❌ Bạn cần quyền Manage Messages để sử dụng lệnh này!", ephemeral=True))
+                return
+            if not self.valid:
+                # custom_id không do bot tạo ra: không đọc bộ lọc từ đó
+                logger.warning(f"Invalid history page custom_id from {interaction.user.id}")
+                await scheduled("ack", interaction.response.send_message("❌ Nút không hợp lệ, hãy dùng lại /vouchhistory!", ephemeral=True))
+                return
+            cursor = {"before": self.cursor} if self.direction == "o" else {"after": self.cursor}
+            embed, view = await asyncio.to_thread(build_history_page, interaction.guild_id, self.buyer_id, self.product, **cursor)
+            if embed is None:
+                await scheduled("ack", interaction.response.send_message("📭 Không còn lịch sử nào!", ephemeral=True))
+                return
+            await scheduled("ack", interaction.response.edit_message(embed=embed, view=view))
+        except Exception as e:
+            logger.error(f"Error in history page button: {e}")
+            await scheduled("ack", interaction.response.send_message("❌ Có lỗi xảy ra!", ephemeral=True))
+
+@bot.tree.command(name="vouchhistory", description="Xem lịch sử vouch và feedback theo buyer hoặc sản phẩm")
+@app_commands.describe(buyer="Người mua (bỏ trống để xem tất cả)", product="Sản phẩm (bỏ trống để xem tất cả)")
+@instrumented("vouchhistory")
+async def vouchhistory(interaction: discord.Interaction, buyer: Optional[discord.User] = None, product: Optional[str] = None):
+    try:
+        # Kiểm tra quyền quản lý tin nhắn
+        if not interaction.permissions.manage_messages:
+            await scheduled("ack", interaction.response.send_message("❌ Bạn cần quyền Manage Messages để sử dụng lệnh này!", ephemeral=True))
+            return
+        product = history_product(product)
+        if product and len(product) > HISTORY_PRODUCT_MAX:
+            await scheduled("ack", interaction.response.send_message(f"❌ Tên sản phẩm tối đa {HISTORY_PRODUCT_MAX} ký tự!", ephemeral=True))
+            return
+
+        embed, view = await asyncio.to_thread(build_history_page, interaction.guild_id, buyer.id if buyer else None, product)
+        if embed is None:
+            await scheduled("ack", interaction.response.send_message("📭 Chưa có lịch sử nào!", ephemeral=True))
+            return
+        await scheduled("ack", interaction.response.send_message(embed=embed, view=view, ephemeral=True))
+    except Exception as e:
+        logger.error(f"Error in vouchhistory command: {e}")
+        await scheduled("ack", interaction.response.send_message("❌ Có lỗi xảy ra!", ephemeral=True))
+
+# /vouchexport: xuất lịch sử ra file nén gzip, ghi từng batch qua file tạm trên đĩa
+def export_history_file(guild_id: int, file_format: str, since: Optional[float], until: Optional[float], product: Optional[str]):
+    """Write the guild's history to an anonymous temp file; returns (file, record count, size in bytes)"""
+    out = tempfile.TemporaryFile()
+    try:
+        count = write_events(history_store.iter_events(guild_id, since=since, until=until, product=product), out, file_format)
+        size = out.tell()
+        out.seek(0)
+    except BaseException:
+        out.close()
+        raise
+    return out, count, size
+
+# Giới hạn đính kèm mặc định của Discord; Interaction.filesize_limit chỉ có từ discord.py 2.6
+DEFAULT_FILESIZE_LIMIT = 8 * 1024 * 1024
+
+@bot.tree.command(name="vouchexport", description="Xuất lịch sử vouch và feedback ra file CSV/JSONL (nén gzip)")
+@app_commands.describe(
+    file_format="Định dạng file (mặc định CSV)",
+    since="Từ ngày, dạng YYYY-MM-DD (UTC)",
+    until="Đến hết ngày, dạng YYYY-MM-DD (UTC)",
+    product="Chỉ xuất một sản phẩm"
+)
+@app_commands.rename(file_format="format")
+@app_commands.choices(file_format=[app_commands.Choice(name=file_format.upper(), value=file_format) for file_format in EXPORT_FORMATS])
+@instrumented("vouchexport")
+async def vouchexport(
+    interaction: discord.Interaction,
+    file_format: str = "csv",
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    product: Optional[str] = None
+):
+    try:
+        # Kiểm tra quyền admin
+        if not interaction.permissions.administrator:
+            await scheduled("ack", interaction.response.send_message("❌ Bạn cần quyền Administrator để sử dụng lệnh này!", ephemeral=True))
+            return
+        try:
+            start, end = parse_date_range(since, until)
+        except ValueError:
+            await scheduled("ack", interaction.response.send_message("❌ Ngày không hợp lệ! Dùng dạng YYYY-MM-DD và `since` trước `until`.", ephemeral=True))
+            return
+
+        await scheduled("ack", interaction.response.defer(ephemeral=True, thinking=True))
+        out, count, size = await asyncio.to_thread(export_history_file, interaction.guild_id, file_format, start, end, product)
+        try:
+            if count == 0:
+                await scheduled("followup", interaction.followup.send("📭 Không có bản ghi nào khớp bộ lọc!", ephemeral=True))
+                return
+            if size > getattr(interaction, "filesize_limit", DEFAULT_FILESIZE_LIMIT):
+                await scheduled("followup", interaction.followup.send(
+                    f"❌ File xuất ({size / 1024 / 1024:.1f}MB) vượt giới hạn đính kèm. Hãy thu hẹp khoảng ngày, "
+                    "hoặc dùng `python export.py` trên server.",
+                    ephemeral=True
+                ))
+                return
+            filename = export_filename(interaction.guild_id, file_format, since, until)
+            await scheduled("followup", interaction.followup.send(
+                f"✅ Đã xuất {count} bản ghi.", file=discord.File(out, filename=filename), ephemeral=True
+            ))
+            logger.info(f"Exported {count} history record(s) ({size} bytes) for guild {interaction.guild_id}")
+        finally:
+            out.close()
+    except Exception as e:
+        logger.error(f"Error in vouchexport command: {e}")
+        if not interaction.response.is_done():
+            await scheduled("ack", interaction.response.send_message("❌ Có lỗi xảy ra khi xuất dữ liệu!", ephemeral=True))
+        else:
+            await scheduled("followup", interaction.followup.send("❌ Có lỗi xảy ra khi xuất dữ liệu!", ephemeral=True))
+
+# /vouchbulk: tạo nhiều vouch từ file CSV/JSONL
+VOUCHBULK_MAX_ROWS = int(os.getenv('VOUCHBULK_MAX_ROWS', '500'))
+VOUCHBULK_MAX_BYTES = 1024 * 1024
+VOUCHBULK_CONCURRENCY = int(os.getenv('VOUCHBULK_CONCURRENCY', '3'))
+PROGRESS_INTERVAL = 2.0
+
+def parse_member_id(value: str):
+    """Parse a user id from a raw id or a <@id>/<@!id> mention"""
+    value = value.strip().removeprefix("<@").removeprefix("!").removesuffix(">")
+    return int(value) if value.isdigit() else None
+
+def format_bulk_progress(progress: BulkProgress) -> str:
+    status = "✅ Hoàn tất" if progress.done else "⏳ Đang tạo vouch"
+    lines = [f"{status}: {progress.created} thành công, {progress.failed} lỗi / {progress.parsed} dòng đã đọc"]
+    lines.extend(f"- {error}" for error in progress.errors)
+    return "\n".join(lines)
+
+@bot.tree.command(name="vouchbulk", description="Tạo nhiều vouch từ file CSV/JSONL")
+@app_commands.describe(file="File CSV (có header) hoặc JSONL với các cột buyer, quantity, product, price")
+@instrumented("vouchbulk")
+async def vouchbulk(interaction: discord.Interaction, file: discord.Attachment):
+    try:
+        # Kiểm tra quyền quản lý tin nhắn
+        if not interaction.permissions.manage_messages:
+            await scheduled("ack", interaction.response.send_message("❌ Bạn cần quyền Manage Messages để sử dụng lệnh này!", ephemeral=True))
+            return
+
+        if file.size > VOUCHBULK_MAX_BYTES:
+            await scheduled("ack", interaction.response.send_message("❌ File quá lớn (tối đa 1MB)!", ephemeral=True))
+            return
+
+        await scheduled("ack", interaction.response.defer(ephemeral=True, thinking=True))
+        data = await timed("attachment", file.read())
+        channel = interaction.channel
+        # Giới hạn chủ động theo kênh để không chạm rate-limit (5 tin / 5 giây)
+        channel_bucket = TokenBucket(rate=5, per=5.0)
+        progress = BulkProgress()
+
+        async def create_from_row(row: BulkRow):
+            member_id = parse_member_id(row.buyer)
+            if member_id is None:
+                raise BulkRowError("buyer không hợp lệ")
+            try:
+                quantity = int(row.quantity)
+            except ValueError:
+                raise BulkRowError("số lượng không hợp lệ")
+            buyer = interaction.guild.get_member(member_id)
+            if buyer is None:
+                try:
+                    buyer = await scheduled("fetch_member", interaction.guild.fetch_member(member_id))
+                except discord.NotFound:
+                    raise BulkRowError("không tìm thấy buyer trong server")
+            # Dùng chung validation với /vouch
+            error = validate_vouch(buyer, quantity, row.product, row.price)
+            if error:
+                raise BulkRowError(error.removeprefix("❌ "))
+            key = vouch_key(interaction.guild_id, buyer.id, row.product, quantity, row.price)
+            if recent_vouches.claim(key) is not None:
+                VOUCH_DUPLICATES.inc(command="vouchbulk")
+                raise BulkRowError("trùng với vouch vừa tạo")
+
+            try:
+                vouch_id = await asyncio.to_thread(
+                    vouch_store.add,
+                    interaction.guild_id, buyer.id, quantity, row.product, row.price, channel.id
+                )
+                await channel_bucket.acquire()
+                message = await scheduled("send", channel.send(
+                    content=build_vouch_text(interaction.guild_id, buyer, quantity, row.product, row.price),
+                    view=VouchView(vouch_id)
+                ))
+            except BaseException:
+                recent_vouches.release(key)
+                raise
+            remind_at = reminders.first_due(interaction.guild_id)
+            await asyncio.to_thread(
+                record_vouch_posted,
+                vouch_id, message.id, interaction.guild_id, buyer.id, interaction.user.id, quantity, row.product, row.price, remind_at
+            )
+            reminders.wake(remind_at)
+            dm_dispatcher.enqueue(buyer, build_dm_text(interaction.guild_id, row.product, channel))
+
+        # Một tin nhắn tiến độ duy nhất, được sửa định kỳ
+        progress_message = await scheduled("followup", interaction.followup.send(format_bulk_progress(progress), ephemeral=True, wait=True))
+
+        async def report_progress():
+            while not progress.done:
+                await asyncio.sleep(PROGRESS_INTERVAL)
+                try:
+                    # Gộp với lần sửa trước nếu nó còn đang chờ
+                    await scheduled("edit", progress_message.edit(content=format_bulk_progress(progress)), key=progress_message.id)
+                except discord.HTTPException as e:
+                    logger.warning(f"Could not update bulk vouch progress: {e}")
+
+        reporter = asyncio.create_task(report_progress())
+        try:
+            await run_pipeline(
+                iter_rows(data, file.filename),
+                create_from_row,
+                progress,
+                concurrency=VOUCHBULK_CONCURRENCY,
+                max_rows=VOUCHBULK_MAX_ROWS
+            )
+        except ValueError as e:
+            progress.done = True
+            await scheduled("edit", progress_message.edit(content=f"❌ File không hợp lệ: {e}"), key=progress_message.id)
+            return
+        finally:
+            reporter.cancel()
+
+        await scheduled("edit", progress_message.edit(content=format_bulk_progress(progress)), key=progress_message.id)
+        logger.info(f"Bulk vouch by {interaction.user.id} in guild {interaction.guild_id}: {progress.created} created, {progress.failed} failed")
+
+    except Exception as e:
+        logger.error(f"Error in vouchbulk command: {e}")
+        if not interaction.response.is_done():
+            await scheduled("ack", interaction.response.send_message("❌ Có lỗi xảy ra khi tạo vouch!", ephemeral=True))
         else:
-            await interaction.followup.send("❌ Có lỗi xảy ra khi tạo vouch!", ephemeral=True)
+            await scheduled("followup", interaction.followup.send("❌ Có lỗi xảy ra khi tạo vouch!", ephemeral=True))
+
+# --- Chế độ HTTP interactions: Discord POST từng interaction tới /interactions ---
+# Không giữ kết nối gateway nên chạy được nhiều replica sau load balancer; mọi
+# state (vouch, config) đọc từ database dùng chung
+HTTP_INTERACTIONS = os.getenv('INTERACTIONS_MODE', 'gateway').lower() == 'http'
+interaction_endpoint: Optional[InteractionEndpoint] = None
+
+FEEDBACK_MODAL_ID = re.compile(r"fb:(?P<vouch_id>[0-9a-z]+):(?P<stars>[1-5])")
+THANKYOU_MODAL_ID = re.compile(r"ty:[0-9]+")
+
+async def feedback_modal_from_custom_id(interaction: discord.Interaction, match) -> Optional[FeedbackModal]:
+    """Rebuild the feedback modal of a vouch from its custom_id"""
+    vouch_record = await asyncio.to_thread(vouch_store.get, int(match["vouch_id"], 36))
+    if vouch_record is None or vouch_record.rated_at is not None or interaction.user.id != vouch_record.buyer_id:
+        await scheduled("ack", interaction.response.send_message("❌ Vouch này không còn hiệu lực!", ephemeral=True))
+        return None
+    return FeedbackModal(vouch_record, int(match["stars"]))
+
+async def thankyou_modal_from_custom_id(interaction: discord.Interaction, match) -> ThankYouModal:
+    return ThankYouModal(interaction.guild_id)
+
+def create_interaction_endpoint(public_key: str) -> InteractionEndpoint:
+    endpoint = InteractionEndpoint(bot, load_verify_key(public_key))
+    endpoint.add_dynamic_item(StarButton)
+    endpoint.add_dynamic_item(HistoryPageButton)
+    endpoint.add_modal(FEEDBACK_MODAL_ID, feedback_modal_from_custom_id)
+    endpoint.add_modal(THANKYOU_MODAL_ID, thankyou_modal_from_custom_id)
+    return endpoint
+
+async def run_http_interactions(token: str, public_key: str) -> None:
+    """Log in for REST only and serve interactions on the health server port until SIGTERM"""
+    global interaction_endpoint
+    interaction_endpoint = create_interaction_endpoint(public_key)
+    stop = asyncio.Event()
+    async with bot:
+        # login chạy setup_hook: health server được khởi động kèm /interactions
+        await bot.login(token)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        await sync_commands_if_changed()
+        profiler.mark_once("ready")
+        logger.info(f"Serving HTTP interactions for {bot.user}")
+        print(f"✅ Bot đang nhận interaction qua HTTP: {bot.user}")
+        await stop.wait()
 
 # Chạy bot
 if __name__ == "__main__":
@@ -400,15 +1280,18 @@ if __name__ == "__main__":
             print("   3. Hoặc đặt biến môi trường DISCORD_TOKEN")
             exit(1)
         
-        # Start health check server in background thread (for Railway)
-        if os.getenv('RAILWAY_ENVIRONMENT') or os.getenv('PORT'):
-            health_thread = Thread(target=start_health_server, daemon=True)
-            health_thread.start()
-            logger.info("Health check server started for Railway deployment")
-            
         logger.info("Starting VouchBot...")
         print("🚀 Đang khởi động VouchBot...")
-        bot.run(token)
+        if HTTP_INTERACTIONS:
+            public_key = os.getenv("DISCORD_PUBLIC_KEY")
+            if not public_key:
+                logger.error("INTERACTIONS_MODE=http requires DISCORD_PUBLIC_KEY")
+                print("❌ Lỗi: INTERACTIONS_MODE=http cần DISCORD_PUBLIC_KEY (Public Key của application)!")
+                exit(1)
+            asyncio.run(run_http_interactions(token, public_key))
+        else:
+            # log_handler=None: discord.py dùng chung cấu hình log qua queue ở trên
+            bot.run(token, log_handler=None)
         
     except discord.LoginFailure:
         logger.error("Invalid Discord token")
@@ -421,3 +1304,7 @@ if __name__ == "__main__":
         logger.error(f"Fatal error: {e}")
         print(f"❌ Lỗi nghiêm trọng: {e}")
         print("💡 Vui lòng kiểm tra log file 'bot.log' để biết thêm chi tiết")
+    finally:
+        # Đảm bảo không mất thay đổi config nào khi tắt bot
+        config.flush_sync()
+        stop_logging()
@@ -0,0 +1,153 @@
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Mapping, Optional
+
+import discord
+
+from metrics import FEEDBACK_POSTS
+from outbound import scheduled
+
+logger = logging.getLogger(__name__)
+
+# Discord cho phép tối đa 15 webhook mỗi kênh; giữ lại chỗ cho các bot khác
+MAX_FEEDBACK_WEBHOOKS = 5
+WEBHOOK_NAME = "VouchBot Feedback"
+
+# Webhook bị xoá hoặc token sai: bỏ khỏi pool
+GONE_STATUSES = (401, 404)
+# Mất quyền hoặc bị rate-limit: bài chắc chắn chưa được đăng, thử webhook khác
+RETRY_STATUSES = (403, 429)
+
+WebhookFactory = Callable[[int, str], discord.Webhook]
+RemovedCallback = Callable[[int, int], None]
+
+
+class WebhookPool:
+    """Spread feedback posts to one channel over several webhooks.
+
+    Each webhook has its own rate-limit bucket, separate from the bot user's
+    bucket for the channel. A post goes to the webhook with the fewest posts
+    in flight (round-robin on ties). A webhook that was deleted is dropped
+    and one that is forbidden or rate-limited is rested for ``cooldown``
+    seconds; in both cases the post was not made, so the next webhook is
+    tried. The post falls back to the bot user only when no webhook is
+    usable. Any other error (5xx) may come after the post went through: the
+    webhook is rested and the error is raised instead of posting again.
+    """
+
+    def __init__(self, guild_id: int, channel_id: int, webhooks: List[discord.Webhook],
+                 cooldown: float = 30.0, on_removed: Optional[RemovedCallback] = None):
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.webhooks = list(webhooks)
+        self.cooldown = cooldown
+        self.on_removed = on_removed
+        self._in_flight: Dict[int, int] = {webhook.id: 0 for webhook in self.webhooks}
+        self._resting_until: Dict[int, float] = {}
+        self._cursor = 0
+
+    def candidates(self) -> List[discord.Webhook]:
+        """Usable webhooks, least busy first"""
+        now = time.monotonic()
+        usable = [webhook for webhook in self.webhooks if self._resting_until.get(webhook.id, 0.0) <= now]
+        if not usable:
+            return []
+        start = self._cursor % len(usable)
+        self._cursor += 1
+        rotated = usable[start:] + usable[:start]
+        return sorted(rotated, key=lambda webhook: self._in_flight.get(webhook.id, 0))
+
+    def _remove(self, webhook: discord.Webhook) -> None:
+        if webhook in self.webhooks:
+            self.webhooks.remove(webhook)
+        self._in_flight.pop(webhook.id, None)
+        self._resting_until.pop(webhook.id, None)
+        logger.warning(f"Feedback webhook {webhook.id} in channel {self.channel_id} is gone or invalid, removed from pool")
+        if self.on_removed is not None:
+            self.on_removed(self.guild_id, webhook.id)
+
+    async def send(self, fallback: discord.abc.Messageable, content: str, embed: Optional[discord.Embed] = None,
+                   username: Optional[str] = None, avatar_url: Optional[str] = None) -> str:
+        """Post through a webhook, or through ``fallback`` when none is usable; returns ``"webhook"`` or ``"bot"``
+
+        Raises the ``discord.HTTPException`` of a webhook error that does not
+        rule out the post having been made.
+        """
+        for webhook in self.candidates():
+            self._in_flight[webhook.id] = self._in_flight.get(webhook.id, 0) + 1
+            try:
+                kwargs = {"embed": embed} if embed is not None else {}
+                await scheduled("webhook", webhook.send(content, username=username, avatar_url=avatar_url, **kwargs))
+                FEEDBACK_POSTS.inc(via="webhook")
+                return "webhook"
+            except discord.HTTPException as e:
+                if e.status in GONE_STATUSES:
+                    self._remove(webhook)
+                    continue
+                self._resting_until[webhook.id] = time.monotonic() + self.cooldown
+                if e.status in RETRY_STATUSES:
+                    logger.warning(f"Feedback webhook {webhook.id} failed ({e}), resting {self.cooldown:.0f}s")
+                    continue
+                # Lỗi 5xx: bài có thể đã lên, đăng lại sẽ bị trùng
+                logger.warning(f"Feedback webhook {webhook.id} failed ({e}), resting {self.cooldown:.0f}s, not posting again")
+                raise
+            finally:
+                if webhook.id in self._in_flight:
+                    self._in_flight[webhook.id] -= 1
+
+        await scheduled("send", fallback.send(content, embed=embed))
+        FEEDBACK_POSTS.inc(via="bot")
+        return "bot"
+
+    def __len__(self) -> int:
+        return len(self.webhooks)
+
+
+class WebhookPoolCache:
+    """Build each guild's feedback webhook pool from its config on first use"""
+
+    def __init__(self, loader: Callable[[int], Mapping[str, object]], factory: WebhookFactory,
+                 on_removed: Optional[RemovedCallback] = None):
+        self.loader = loader
+        self.factory = factory
+        self.on_removed = on_removed
+        self._cache: Dict[int, Optional[WebhookPool]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, guild_id: int) -> Optional[WebhookPool]:
+        """The guild's pool, or None when webhook mode is off"""
+        if guild_id in self._cache:
+            return self._cache[guild_id]
+        guild_cfg = self.loader(guild_id) or {}
+        entries = guild_cfg.get("feedback_webhooks") or []
+        channel_id = guild_cfg.get("feedback_channel")
+        pool = None
+        if entries and channel_id:
+            webhooks = [self.factory(int(entry["id"]), entry["token"]) for entry in entries]
+            pool = WebhookPool(guild_id, int(channel_id), webhooks, on_removed=self.on_removed)
+        with self._lock:
+            self._cache[guild_id] = pool
+        return pool
+
+    def invalidate(self, guild_id: Optional[int] = None) -> None:
+        """Drop one guild's pool, or all of them"""
+        with self._lock:
+            if guild_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(guild_id, None)
+
+
+async def provision_webhooks(channel: discord.TextChannel, owner_id: int, count: int) -> List[discord.Webhook]:
+    """Reuse the bot's existing webhooks in ``channel`` and create the missing ones, up to ``count``"""
+    existing = [
+        webhook for webhook in await scheduled("webhooks", channel.webhooks())
+        if webhook.user is not None and webhook.user.id == owner_id and webhook.token
+    ]
+    webhooks = existing[:count]
+    while len(webhooks) < count:
+        webhooks.append(await scheduled("create_webhook", channel.create_webhook(
+            name=WEBHOOK_NAME, reason="VouchBot feedback webhook pool"
+        )))
+    return webhooks